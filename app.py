@@ -1,16 +1,39 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, send_from_directory
 from flask_cors import CORS
 import requests
-from bs4 import BeautifulSoup
+from requests.structures import CaseInsensitiveDict
+from bs4 import BeautifulSoup, FeatureNotFound
+import soupsieve
 import re
 import json
 import time
 import random
 import hashlib
-from urllib.parse import urlparse
+import html
+import gzip
+import codecs
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 import os
+import socket
 import sqlite3
-from datetime import datetime
+import asyncio
+import threading
+import heapq
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from functools import lru_cache
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
@@ -31,11 +54,15 @@ def internal_error(error):
 
 # Database path
 DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
+# Seconds a connection waits for another process's write lock before failing
+DB_BUSY_TIMEOUT = float(os.environ.get('DB_BUSY_TIMEOUT', '30'))
 
 def get_db_connection():
     """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
+    # WAL lets the web, scheduler and worker processes read while one of them writes
+    conn.execute('PRAGMA journal_mode=WAL')
     return conn
 
 def init_db():
@@ -62,6 +89,7 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             url TEXT NOT NULL,
+            product_key TEXT,
             target_price REAL NOT NULL,
             site_name TEXT,
             product_name TEXT,
@@ -79,20 +107,56 @@ def init_db():
         CREATE TABLE IF NOT EXISTS price_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             alert_id INTEGER NOT NULL,
+            product_key TEXT,
             price REAL NOT NULL,
             recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (alert_id) REFERENCES alerts (id)
         )
     ''')
     
+    # Databases created before product keys get the column added
+    for table in ('alerts', 'price_history'):
+        columns = [column[1] for column in cursor.execute(f'PRAGMA table_info({table})')]
+        if 'product_key' not in columns:
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN product_key TEXT')
+            except sqlite3.OperationalError:
+                # Another worker process added it first
+                pass
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_product_key ON alerts (product_key)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_product_key ON price_history (product_key, recorded_at)')
+    
+    # Create scrape_jobs table (times are epoch seconds)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            product_key TEXT NOT NULL,
+            max_age REAL,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            run_after REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            price REAL,
+            site_name TEXT,
+            currency TEXT,
+            currency_symbol TEXT,
+            error TEXT,
+            finished_at REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, run_after)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_product_key ON scrape_jobs (product_key, status)')
+    
     conn.commit()
     conn.close()
 
 # Initialize database on startup
 init_db()
 
-http_session = requests.Session()
-
 # Comprehensive list of realistic browser user agents
 USER_AGENTS = [
     # Chrome on Windows
@@ -329,233 +393,814 @@ def get_random_headers(site=None, referer=None):
     
     return headers
 
+# Site registry: registered domain name (the label before the public suffix) -> site name
+SITE_LABELS = {
+    'amazon': 'amazon',
+    'flipkart': 'flipkart',
+    'myntra': 'myntra',
+    'ajio': 'ajio',
+    'meesho': 'meesho',
+    'snapdeal': 'snapdeal',
+    'tatacliq': 'tatacliq',
+    'reliancedigital': 'reliancedigital',
+    'croma': 'croma',
+    'shopsy': 'shopsy',
+    'nykaa': 'nykaa',
+    'firstcry': 'firstcry',
+    'pepperfry': 'pepperfry',
+    'urbanladder': 'urbanladder',
+    'bigbasket': 'bigbasket',
+    'jiomart': 'jiomart',
+    'oneplus': 'oneplus',
+    'vijaysales': 'vijaysales',
+    'ebay': 'ebay',
+    'aliexpress': 'aliexpress',
+    'walmart': 'walmart',
+    'bestbuy': 'bestbuy',
+    'target': 'target',
+    'etsy': 'etsy',
+    'newegg': 'newegg',
+    'shein': 'shein',
+    'zara': 'zara',
+    'hm': 'hm',
+    'adidas': 'adidas',
+    'nike': 'nike',
+    'samsung': 'samsung',
+    'apple': 'apple',
+    'mi': 'mi',
+    'xiaomi': 'mi',
+}
+
+# Short-link and other domains whose labels do not name the site
+SITE_DOMAINS = {
+    'amzn.in': 'amazon',
+    'amzn.to': 'amazon',
+    'amzn.eu': 'amazon',
+    'a.co': 'amazon',
+    'fkrt.it': 'flipkart',
+    'fkrt.cc': 'flipkart',
+    'myntr.it': 'myntra',
+}
+
+# Retailers that only sell in India, whatever domain they are reached on
+INR_SITES = {'flipkart', 'myntra', 'ajio', 'meesho', 'snapdeal', 'tatacliq', 'reliancedigital', 'croma', 'shopsy', 'nykaa', 'firstcry', 'pepperfry', 'urbanladder', 'bigbasket', 'jiomart', 'oneplus', 'vijaysales'}
+
+# Country top-level domain -> currency; everything else is priced in USD
+TLD_CURRENCIES = {
+    'in': ('INR', '₹'),
+    'uk': ('GBP', '£'),
+}
+
+# Second-level labels that country domains register names under (amazon.co.uk, amazon.com.au)
+COUNTRY_SECOND_LEVELS = {'co', 'com', 'net', 'org', 'ac'}
+
+def registered_label(labels):
+    """The label a hostname's owner registered: amazon in smile.amazon.co.uk"""
+    suffix = 1
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in COUNTRY_SECOND_LEVELS:
+        suffix = 2
+    return labels[-suffix - 1] if len(labels) > suffix else None
+
+@lru_cache(maxsize=4096)
+def resolve_site_host(host):
+    """Resolve a hostname to (site, currency, symbol), memoized per host"""
+    labels = host.split('.')
+    site = 'unknown'
+    # The host must be one of the site's domains or a subdomain of it, so
+    # amazon.evil.com and apple.stackexchange.com stay unknown
+    for i in range(len(labels) - 1):
+        suffix = '.'.join(labels[i:])
+        if suffix in SITE_DOMAINS:
+            site = SITE_DOMAINS[suffix]
+            break
+    else:
+        site = SITE_LABELS.get(registered_label(labels), 'unknown')
+    
+    if site in INR_SITES:
+        return site, 'INR', '₹'
+    currency, symbol = TLD_CURRENCIES.get(labels[-1], ('USD', '$'))
+    return site, currency, symbol
+
 def get_site_info(url):
     """Detect the e-commerce site from URL and return currency info"""
-    url_lower = url.lower()
-    
-    if 'amazon' in url_lower:
-        if '.in' in url_lower or 'amazon.in/' in url_lower:
-            return 'amazon', 'INR', '₹'
-        elif 'amazon.co.uk' in url_lower:
-            return 'amazon', 'GBP', '£'
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        host = (urlparse(url).hostname or '').rstrip('.')
+    except ValueError:
+        # Malformed URLs (e.g. an unclosed IPv6 bracket) name no known site
+        host = ''
+    return resolve_site_host(host)
+
+# Sites with strong anti-bot protection that need cookies from the homepage first
+ANTI_BOT_SITES = ['ajio', 'meesho', 'snapdeal', 'tatacliq', 'reliancedigital', 'croma', 'nykaa', 'shopsy', 'jio', 'firstcry', 'pepperfry', 'urbanladder', 'bigbasket', 'jiomart', 'oneplus', 'vijaysales', 'ebay', 'aliexpress', 'walmart', 'bestbuy', 'target', 'etsy', 'newegg', 'shein', 'zara', 'hm', 'adidas', 'nike', 'samsung', 'apple', 'mi']
+
+SITE_HOMEPAGES = {
+    'ajio': 'https://www.ajio.com/',
+    'meesho': 'https://www.meesho.com/',
+    'snapdeal': 'https://www.snapdeal.com/',
+    'firstcry': 'https://www.firstcry.com/',
+    'pepperfry': 'https://www.pepperfry.com/',
+    'urbanladder': 'https://www.urbanladder.com/',
+    'bigbasket': 'https://www.bigbasket.com/',
+    'jiomart': 'https://www.jiomart.com/',
+    'oneplus': 'https://www.oneplus.in/',
+    'vijaysales': 'https://www.vijaysales.com/',
+    'ebay': 'https://www.ebay.com/',
+    'aliexpress': 'https://www.aliexpress.com/',
+    'walmart': 'https://www.walmart.com/',
+    'bestbuy': 'https://www.bestbuy.com/',
+    'target': 'https://www.target.com/',
+    'etsy': 'https://www.etsy.com/',
+    'newegg': 'https://www.newegg.com/',
+    'shein': 'https://www.shein.com/',
+    'zara': 'https://www.zara.com/',
+    'hm': 'https://www.hm.com/',
+    'adidas': 'https://www.adidas.com/',
+    'nike': 'https://www.nike.com/',
+    'samsung': 'https://www.samsung.com/',
+    'apple': 'https://www.apple.com/',
+    'mi': 'https://www.mi.com/',
+}
+
+# Offline record/replay of fetched pages
+FETCH_MODE = os.environ.get('FETCH_MODE', 'live').lower()
+FETCH_CORPUS_DIR = os.environ.get('FETCH_CORPUS_DIR', os.path.join(os.path.dirname(__file__), 'fetch_corpus'))
+FETCH_REPLAY_LATENCY = float(os.environ.get('FETCH_REPLAY_LATENCY', '0'))
+FETCH_REPLAY_STATUS = os.environ.get('FETCH_REPLAY_STATUS', '')
+FETCH_REPLAY_SEED = int(os.environ.get('FETCH_REPLAY_SEED', '0'))
+
+class FetchRecorder:
+    """Records fetched responses to an on-disk corpus and replays them offline.
+    
+    FETCH_MODE=record saves the status, headers and gzipped body of every
+    product fetch, one entry per canonical URL. FETCH_MODE=replay serves those
+    entries instead of the network. FETCH_REPLAY_LATENCY adds a delay in
+    seconds, and FETCH_REPLAY_STATUS (e.g. "429:0.2,503:0.1") injects error
+    statuses with the given probabilities, seeded for repeatable runs.
+    """
+    
+    def __init__(self, mode=FETCH_MODE, corpus_dir=FETCH_CORPUS_DIR, latency=FETCH_REPLAY_LATENCY,
+                 inject_status=FETCH_REPLAY_STATUS, seed=FETCH_REPLAY_SEED):
+        self.mode = mode
+        self.corpus_dir = corpus_dir
+        self.latency = latency
+        self.inject_status = []
+        for part in inject_status.split(','):
+            if ':' in part:
+                status, probability = part.split(':', 1)
+                self.inject_status.append((int(status), float(probability)))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _paths(self, url):
+        key = hashlib.sha1(canonicalize_url(url).encode()).hexdigest()
+        return os.path.join(self.corpus_dir, key + '.json'), os.path.join(self.corpus_dir, key + '.html.gz')
+    
+    def get(self, http_session, url, **kwargs):
+        """Fetch url through http_session, or from the corpus in replay mode"""
+        if self.mode == 'replay':
+            return self.replay(url, kwargs.get('headers') or {})
+        response = http_session.get(url, **kwargs)
+        if self.mode == 'record':
+            self.save(url, response)
+        return response
+    
+    def save(self, url, response):
+        meta_path, body_path = self._paths(url)
+        os.makedirs(self.corpus_dir, exist_ok=True)
+        with gzip.open(body_path, 'wb') as f:
+            f.write(response.content)
+        with open(meta_path, 'w') as f:
+            json.dump({
+                'url': url,
+                'status': response.status_code,
+                'headers': dict(response.headers),
+                'recorded_at': datetime.now().isoformat(),
+            }, f)
+    
+    def replay(self, url, request_headers):
+        meta_path, body_path = self._paths(url)
+        if not os.path.exists(meta_path):
+            raise requests.exceptions.ConnectionError(f"No recorded response for {url}")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        
+        if self.latency:
+            time.sleep(self.latency)
+        
+        status = meta['status']
+        with self._lock:
+            for injected, probability in self.inject_status:
+                if self._random.random() < probability:
+                    status = injected
+                    break
+        
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        # The stored body is already decoded, so drop headers that describe the wire format
+        response.headers.pop('Content-Encoding', None)
+        response.headers.pop('Content-Length', None)
+        
+        etag = response.headers.get('ETag')
+        if status == 200 and etag and request_headers.get('If-None-Match') == etag:
+            response.status_code = 304
+            response._content = b''
+        elif status == 200:
+            with gzip.open(body_path, 'rb') as f:
+                response._content = f.read()
         else:
-            return 'amazon', 'USD', '$'
-    
-    if 'flipkart' in url_lower or 'fk' in url_lower:
-        return 'flipkart', 'INR', '₹'
-    
-    if 'myntra' in url_lower:
-        return 'myntra', 'INR', '₹'
-    
-    if 'ajio' in url_lower:
-        return 'ajio', 'INR', '₹'
-    
-    if 'meesho' in url_lower:
-        return 'meesho', 'INR', '₹'
-    
-    if 'snapdeal' in url_lower:
-        return 'snapdeal', 'INR', '₹'
-    
-    if 'tatacliq' in url_lower or 'tata' in url_lower:
-        return 'tatacliq', 'INR', '₹'
-    
-    if 'reliancedigital' in url_lower or 'reliance' in url_lower:
-        return 'reliancedigital', 'INR', '₹'
-    
-    if 'croma' in url_lower:
-        return 'croma', 'INR', '₹'
-    
-    if 'shopsy' in url_lower:
-        return 'shopsy', 'INR', '₹'
-    
-    if 'nykaa' in url_lower:
-        return 'nykaa', 'INR', '₹'
-    
-    if 'firstcry' in url_lower:
-        return 'firstcry', 'INR', '₹'
-    
-    if 'pepperfry' in url_lower:
-        return 'pepperfry', 'INR', '₹'
-    
-    if 'urbanladder' in url_lower:
-        return 'urbanladder', 'INR', '₹'
-    
-    if 'bigbasket' in url_lower:
-        return 'bigbasket', 'INR', '₹'
-    
-    if 'jiomart' in url_lower or 'jm' in url_lower:
-        return 'jiomart', 'INR', '₹'
-    
-    if 'oneplus' in url_lower:
-        return 'oneplus', 'INR', '₹'
-    
-    if 'vijaysales' in url_lower:
-        return 'vijaysales', 'INR', '₹'
-    
-    if '.in' in url_lower:
-        return 'unknown', 'INR', '₹'
-    
-    # Global sites
-    if 'ebay' in url_lower:
-        return 'ebay', 'USD', '$'
-    
-    if 'aliexpress' in url_lower:
-        return 'aliexpress', 'USD', '$'
-    
-    if 'walmart' in url_lower:
-        return 'walmart', 'USD', '$'
-    
-    if 'bestbuy' in url_lower:
-        return 'bestbuy', 'USD', '$'
-    
-    if 'target' in url_lower:
-        return 'target', 'USD', '$'
-    
-    if 'etsy' in url_lower:
-        return 'etsy', 'USD', '$'
-    
-    if 'newegg' in url_lower:
-        return 'newegg', 'USD', '$'
-    
-    if 'shein' in url_lower:
-        return 'shein', 'USD', '$'
-    
-    if 'zara' in url_lower:
-        return 'zara', 'USD', '$'
-    
-    if 'hm.com' in url_lower:
-        return 'hm', 'USD', '$'
-    
-    if 'adidas' in url_lower:
-        return 'adidas', 'USD', '$'
-    
-    if 'nike' in url_lower:
-        return 'nike', 'USD', '$'
-    
-    if 'samsung' in url_lower:
-        return 'samsung', 'USD', '$'
+            response._content = b''
+        response._content_consumed = True
+        return response
+    
+    def urls(self):
+        """List the original URLs recorded in the corpus"""
+        if not os.path.isdir(self.corpus_dir):
+            return []
+        urls = []
+        for name in sorted(os.listdir(self.corpus_dir)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.corpus_dir, name)) as f:
+                    urls.append(json.load(f)['url'])
+        return urls
+
+fetch_recorder = FetchRecorder()
+
+# Per-site request pacing
+SITE_RATE_PER_MINUTE = float(os.environ.get('SITE_RATE_PER_MINUTE', '30'))
+SITE_RATE_BURST = int(os.environ.get('SITE_RATE_BURST', '3'))
+RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', '60'))
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (ValueError, TypeError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (ValueError, TypeError):
+        return None
+
+class SiteRateLimiter:
+    """Token bucket per site that spaces out requests before they are sent.
+    
+    Callers reserve a token and wait out the returned delay. A 429, 503 or
+    timeout halves the site's refill rate and each success adds a tenth of the
+    base rate back. A Retry-After header puts the bucket into debt for that long.
+    """
+    
+    def __init__(self, rate_per_minute=SITE_RATE_PER_MINUTE, burst=SITE_RATE_BURST):
+        self.base_rate = rate_per_minute / 60.0
+        self.min_rate = self.base_rate / 16
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+    
+    def _bucket(self, site, now):
+        bucket = self._buckets.get(site)
+        if bucket is None:
+            bucket = self._buckets[site] = {
+                'tokens': float(self.burst),
+                'updated': now,
+                'rate': self.base_rate,
+                'requests': 0,
+                'throttled': 0,
+            }
+        else:
+            bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+        return bucket
     
-    if 'apple' in url_lower:
-        return 'apple', 'USD', '$'
+    def reserve(self, site, max_wait=RATE_LIMIT_MAX_WAIT):
+        """Take a token for site and return the seconds to wait before sending.
+        
+        Returns None without taking a token if the wait would exceed max_wait.
+        """
+        with self._lock:
+            bucket = self._bucket(site, time.monotonic())
+            delay = max(0.0, (1 - bucket['tokens']) / bucket['rate'])
+            if max_wait is not None and delay > max_wait:
+                return None
+            bucket['tokens'] -= 1
+            return delay
+    
+    def record(self, site, status, retry_after=None):
+        """Feed back the outcome of a request (status None for timeouts/errors)"""
+        with self._lock:
+            bucket = self._bucket(site, time.monotonic())
+            bucket['requests'] += 1
+            if status in (429, 503) or status is None:
+                bucket['throttled'] += 1
+                bucket['rate'] = max(self.min_rate, bucket['rate'] / 2)
+                pause = parse_retry_after(retry_after)
+                if pause:
+                    bucket['tokens'] = min(bucket['tokens'], 0.0) - pause * bucket['rate']
+            elif status in (200, 304):
+                bucket['rate'] = min(self.base_rate, bucket['rate'] + self.base_rate / 10)
+    
+    def wait(self, site):
+        """Block until a request to site may be sent. Returns False if the queue is too long"""
+        delay = self.reserve(site)
+        if delay is None:
+            return False
+        if delay:
+            time.sleep(delay)
+        return True
+    
+    async def wait_async(self, site):
+        """Async version of wait that queues on the event loop instead of a thread"""
+        delay = self.reserve(site)
+        if delay is None:
+            return False
+        if delay:
+            await asyncio.sleep(delay)
+        return True
+    
+    def stats(self):
+        with self._lock:
+            return {
+                site: {
+                    'rate_per_minute': round(bucket['rate'] * 60, 2),
+                    'requests': bucket['requests'],
+                    'throttled': bucket['throttled'],
+                }
+                for site, bucket in self._buckets.items()
+            }
+
+rate_limiter = SiteRateLimiter()
+
+# Per-site circuit breaker
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', '300'))
+BREAKER_WINDOW = 20
+
+class SiteCircuitBreaker:
+    """Stops sending requests to a site that keeps blocking us.
+    
+    The breaker opens after BREAKER_THRESHOLD consecutive 403/429/503 answers.
+    While it is open, fetches for that site fail fast. After BREAKER_COOLDOWN
+    one probe is let through (half-open). A success closes the breaker and any
+    other outcome opens it again. The rolling success rate over the last
+    BREAKER_WINDOW requests also sets how many retries a fetch may spend.
+    """
+    
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, window=BREAKER_WINDOW):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.window = window
+        self._lock = threading.Lock()
+        self._sites = {}
+    
+    def _site(self, site):
+        state = self._sites.get(site)
+        if state is None:
+            state = self._sites[site] = {
+                'state': 'closed',
+                'changed_at': 0.0,
+                'consecutive_blocks': 0,
+                'outcomes': deque(maxlen=self.window),
+                'latencies': deque(maxlen=self.window),
+            }
+        return state
+    
+    def allow(self, site):
+        """Return True if a fetch for site may start, letting a probe through when due"""
+        with self._lock:
+            state = self._site(site)
+            if state['state'] == 'closed':
+                return True
+            now = time.monotonic()
+            # Also re-probe if the last probe never reported back
+            if now - state['changed_at'] >= self.cooldown:
+                state['state'] = 'half_open'
+                state['changed_at'] = now
+                return True
+            return False
+    
+    def is_open(self, site):
+        with self._lock:
+            return self._site(site)['state'] != 'closed'
+    
+    def record(self, site, status, latency=None):
+        """Feed back the outcome of a request (status None for timeouts/errors)"""
+        with self._lock:
+            state = self._site(site)
+            success = status in (200, 304)
+            state['outcomes'].append(success)
+            if latency is not None:
+                state['latencies'].append(latency)
+            
+            if success:
+                state['consecutive_blocks'] = 0
+                if state['state'] != 'closed':
+                    print(f"Circuit for {site} closed again")
+                    state['state'] = 'closed'
+                    state['changed_at'] = time.monotonic()
+                return
+            
+            if status in (403, 429, 503):
+                state['consecutive_blocks'] += 1
+            if state['state'] == 'half_open' or (state['state'] == 'closed' and state['consecutive_blocks'] >= self.threshold):
+                print(f"Circuit for {site} opened after {state['consecutive_blocks']} blocked responses")
+                state['state'] = 'open'
+                state['changed_at'] = time.monotonic()
+    
+    def retry_budget(self, site, max_retries):
+        """Scale the number of attempts by the site's recent success rate"""
+        with self._lock:
+            outcomes = self._site(site)['outcomes']
+            if len(outcomes) < 5:
+                return max_retries
+            success_rate = sum(outcomes) / len(outcomes)
+            return max(1, min(max_retries, 1 + round((max_retries - 1) * success_rate)))
+    
+    def stats(self):
+        with self._lock:
+            return {
+                site: {
+                    'state': state['state'],
+                    'success_rate': round(sum(state['outcomes']) / len(state['outcomes']), 3) if state['outcomes'] else None,
+                    'avg_latency': round(sum(state['latencies']) / len(state['latencies']), 3) if state['latencies'] else None,
+                }
+                for site, state in self._sites.items()
+            }
+
+circuit_breaker = SiteCircuitBreaker()
+
+# Long-lived per-site sessions
+SESSION_POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', '4'))
+SESSION_COOKIE_TTL = float(os.environ.get('SESSION_COOKIE_TTL', '1800'))
+
+def warm_up_session(http_session, site, host):
+    """Visit the host's homepage so anti-bot sites see cookies from a browsing session.
     
-    if 'mi.com' in url_lower or 'xiaomi' in url_lower or 'mi.in' in url_lower:
-        return 'mi', 'USD', '$'
+    The caller waits for the site's rate limiter first; the visit is recorded
+    against it like any fetch.
+    """
+    homepage = SITE_HOMEPAGES[site]
+    if urlparse(homepage).hostname != host:
+        # Cookies for amazon.com come from amazon.com, not the site's main storefront
+        homepage = f'https://{host}/'
+    try:
+        headers = get_random_headers(site)
+        headers.update({
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/xhtml+xml,application/xml;q=0.8,*/*;q=0.7',
+            'Pragma': 'no-cache',
+        })
+        response = http_session.get(homepage, headers=headers, timeout=15)
+        rate_limiter.record(site, response.status_code, response.headers.get('Retry-After'))
+    except requests.exceptions.RequestException as e:
+        print(f"Cookie warm-up failed for {host}: {str(e)}")
+
+def session_key(url, site):
+    """Key for the session pool: the URL's hostname, so each host keeps its own cookies"""
+    try:
+        return (urlparse(url.strip()).hostname or site).rstrip('.')
+    except ValueError:
+        return site
+
+class SiteSessionPool:
+    """Pool of long-lived requests sessions per host, each with warmed cookies.
+    
+    A session is checked out by one fetch at a time, so a 403 on one host only
+    invalidates that session's cookies. Checking out never waits: when all of a
+    host's sessions are busy the fetch gets a one-off session that is closed on
+    checkin. Sessions are warmed by the fetch that checks them out, once it has
+    waited for the rate limiter, whenever they are new, marked stale or older
+    than SESSION_COOKIE_TTL.
+    """
+    
+    def __init__(self, size=SESSION_POOL_SIZE, ttl=SESSION_COOKIE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._count = {}
+        self._overflow = {}
+    
+    def checkout(self, key, site):
+        """Take an idle session for key, or a new one while the pool has room"""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            pooled = self._count.get(key, 0) < self.size
+            if pooled:
+                self._count[key] = self._count.get(key, 0) + 1
+            else:
+                self._overflow[key] = self._overflow.get(key, 0) + 1
+        return {'key': key, 'site': site, 'session': requests.Session(), 'warmed_at': None, 'pooled': pooled}
+    
+    def checkin(self, entry):
+        """Return a session to the pool, or close a one-off session"""
+        if not entry['pooled']:
+            entry['session'].close()
+            return
+        with self._lock:
+            self._idle.setdefault(entry['key'], []).append(entry)
+    
+    def needs_warm_up(self, entry):
+        if entry['site'] not in ANTI_BOT_SITES or entry['site'] not in SITE_HOMEPAGES or fetch_recorder.mode == 'replay':
+            return False
+        return entry['warmed_at'] is None or time.monotonic() - entry['warmed_at'] > self.ttl
+    
+    def warm_up(self, entry):
+        """Replace the session's cookies with fresh ones (blocking; wait for the rate limiter first)"""
+        entry['session'].cookies.clear()
+        warm_up_session(entry['session'], entry['site'], entry['key'])
+        entry['warmed_at'] = time.monotonic()
+    
+    def mark_stale(self, entry):
+        entry['warmed_at'] = None
+    
+    @contextmanager
+    def session(self, key, site):
+        entry = self.checkout(key, site)
+        try:
+            yield entry
+        finally:
+            self.checkin(entry)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                key: {'sessions': count, 'idle': len(self._idle.get(key, [])), 'one_off': self._overflow.get(key, 0)}
+                for key, count in self._count.items()
+            }
+
+session_pool = SiteSessionPool()
+
+# Streaming fetch with early termination
+STREAM_FETCH = os.environ.get('STREAM_FETCH', 'true').lower() == 'true'
+STREAM_MAX_BYTES = int(os.environ.get('STREAM_MAX_BYTES', str(1024 * 1024)))
+STREAM_MARKER_TAIL = int(os.environ.get('STREAM_MARKER_TAIL', str(32 * 1024)))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Byte strings that sit next to the main price on each site's product page
+STREAM_STOP_MARKERS = {
+    'amazon': [b'priceblock_ourprice', b'a-offscreen'],
+    'flipkart': [b'_30jeq3'],
+    'myntra': [b'sellingPrice'],
+    'bestbuy': [b'priceView-customer-price'],
+    'apple': [b'data-component="price"'],
+}
+
+class StreamingBodyReader:
+    """Reads a streamed response body only as far as price extraction needs.
+    
+    Stops at STREAM_MAX_BYTES, or STREAM_MARKER_TAIL bytes after the first of
+    the site's price markers, and leaves that prefix as response.content.
+    """
+    
+    def __init__(self, max_bytes=STREAM_MAX_BYTES, markers=STREAM_STOP_MARKERS, tail=STREAM_MARKER_TAIL):
+        self.max_bytes = max_bytes
+        self.markers = markers
+        self.tail = tail
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.stopped_early = 0
+        self.bytes_read = 0
+    
+    def read(self, response, site):
+        markers = self.markers.get(site, [])
+        overlap = max((len(marker) for marker in markers), default=0)
+        limit = self.max_bytes
+        marker_seen = False
+        stopped_early = False
+        body = bytearray()
+        
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                search_from = max(0, len(body) - overlap)
+                body.extend(chunk)
+                if markers and not marker_seen:
+                    for marker in markers:
+                        pos = body.find(marker, search_from)
+                        if pos != -1:
+                            marker_seen = True
+                            limit = min(limit, pos + len(marker) + self.tail)
+                            break
+                if len(body) >= limit:
+                    stopped_early = True
+                    break
+        finally:
+            response.close()
+        
+        # Store the prefix where requests keeps a fully read body
+        response._content = bytes(body[:limit])
+        response._content_consumed = True
+        
+        with self._lock:
+            self.pages += 1
+            self.bytes_read += len(response._content)
+            if stopped_early:
+                self.stopped_early += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': STREAM_FETCH,
+                'pages': self.pages,
+                'stopped_early': self.stopped_early,
+                'avg_bytes': int(self.bytes_read / self.pages) if self.pages else 0,
+            }
+
+body_reader = StreamingBodyReader()
+
+def limit_key(url, site):
+    """Key for the rate limiter and circuit breaker: the site, or the hostname of an unrecognised one"""
+    if site != 'unknown':
+        return site
+    try:
+        return (urlparse(url.strip()).hostname or site).rstrip('.')
+    except ValueError:
+        return site
+
+def fetch_attempt(url, site, pooled, attempt, max_retries, extra_headers=None):
+    """Make a single fetch attempt with a pooled session and report the outcome to the rate limiter.
     
-    if '.in' in url_lower:
-        # Check for global sites with .in presence
-        if 'ebay.in' in url_lower:
-            return 'ebay', 'INR', '₹'
-        if 'walmart.in' in url_lower:
-            return 'walmart', 'INR', '₹'
-        if 'bestbuy.in' in url_lower:
-            return 'bestbuy', 'INR', '₹'
-        if 'target.in' in url_lower:
-            return 'target', 'INR', '₹'
-        if 'etsy.in' in url_lower:
-            return 'etsy', 'INR', '₹'
-        if 'newegg.in' in url_lower:
-            return 'newegg', 'INR', '₹'
-        if 'shein.in' in url_lower:
-            return 'shein', 'INR', '₹'
-        if 'zara.in' in url_lower:
-            return 'zara', 'INR', '₹'
-        if 'hm.in' in url_lower:
-            return 'hm', 'INR', '₹'
-        if 'adidas.in' in url_lower:
-            return 'adidas', 'INR', '₹'
-        if 'nike.in' in url_lower:
-            return 'nike', 'INR', '₹'
-        if 'samsung.in' in url_lower:
-            return 'samsung', 'INR', '₹'
-        if 'apple.in' in url_lower:
-            return 'apple', 'INR', '₹'
+    Returns the response, or None when the attempt failed. A 304 Not Modified
+    response is returned as-is when extra_headers carried validators.
+    """
+    key = limit_key(url, site)
+    try:
+        # Generate fresh headers for each request
+        headers = get_random_headers(site)
+        if extra_headers:
+            headers.update(extra_headers)
         
-        return 'unknown', 'INR', '₹'
+        # The pooled session's warmed cookies are reused
+        started = time.monotonic()
+        response = fetch_recorder.get(pooled['session'], url, headers=headers, timeout=25, stream=STREAM_FETCH)
+        if STREAM_FETCH:
+            if response.status_code == 200:
+                # Download only as much of the page as price extraction needs
+                body_reader.read(response, site)
+            else:
+                response.close()
+        if response.status_code == 403:
+            # Re-warm only this session's cookies; other hosts keep theirs
+            session_pool.mark_stale(pooled)
+        rate_limiter.record(key, response.status_code, response.headers.get('Retry-After'))
+        circuit_breaker.record(key, response.status_code, time.monotonic() - started)
+        
+        if response.status_code == 200:
+            # Verify we got actual product page content
+            if len(response.content) < 500:
+                print(f"Warning: Response too small for {site}, might be blocking page")
+                return None
+            return response
+        elif response.status_code == 304 and extra_headers:
+            return response
+        elif response.status_code == 403:
+            print(f"Attempt {attempt + 1}/{max_retries}: Got 403 Forbidden for {site}")
+        elif response.status_code == 429:
+            print(f"Attempt {attempt + 1}/{max_retries}: Rate limited (429) for {site}, slowing down...")
+        elif response.status_code == 503:
+            print(f"Attempt {attempt + 1}/{max_retries}: Service unavailable for {site}")
+        else:
+            print(f"Attempt {attempt + 1}/{max_retries}: Got status {response.status_code} for {site}")
+            
+    except requests.exceptions.Timeout:
+        print(f"Attempt {attempt + 1}/{max_retries}: Timeout for {site}")
+        rate_limiter.record(key, None)
+        circuit_breaker.record(key, None)
+    except requests.exceptions.RequestException as e:
+        print(f"Attempt {attempt + 1}/{max_retries}: Request failed for {site}: {str(e)}")
+        rate_limiter.record(key, None)
+        circuit_breaker.record(key, None)
+    
+    return None
 
 def fetch_page_with_retry(url, site, max_retries=5):
     """Fetch a page with advanced retry logic for rate limiting and blocking"""
+    key = limit_key(url, site)
+    if not circuit_breaker.allow(key):
+        print(f"Circuit for {key} is open, skipping fetch")
+        return None
     
-    # For sites with strong anti-bot protection, try alternative methods
-    if site in ['ajio', 'meesho', 'snapdeal', 'tatacliq', 'reliancedigital', 'croma', 'nykaa', 'shopsy', 'jio', 'firstcry', 'pepperfry', 'urbanladder', 'bigbasket', 'jiomart', 'oneplus', 'vijaysales', 'ebay', 'aliexpress', 'walmart', 'bestbuy', 'target', 'etsy', 'newegg', 'shein', 'zara', 'hm', 'adidas', 'nike', 'samsung', 'apple', 'mi']:
-        # First try with a fresh session and cookies
-        try:
-            fresh_session = requests.Session()
-            fresh_headers = get_random_headers(site)
-            fresh_headers.update({
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/xhtml+xml,application/xml;q=0.8,*/*;q=0.7',
-                'Pragma': 'no-cache',
-            })
-            # First visit the homepage to get cookies
-            site_homepages = {
-                'ajio': 'https://www.ajio.com/',
-                'meesho': 'https://www.meesho.com/',
-                'snapdeal': 'https://www.snapdeal.com/',
-                'firstcry': 'https://www.firstcry.com/',
-                'pepperfry': 'https://www.pepperfry.com/',
-                'urbanladder': 'https://www.urbanladder.com/',
-                'bigbasket': 'https://www.bigbasket.com/',
-                'jiomart': 'https://www.jiomart.com/',
-                'oneplus': 'https://www.oneplus.in/',
-                'vijaysales': 'https://www.vijaysales.com/',
-                'ebay': 'https://www.ebay.com/',
-                'aliexpress': 'https://www.aliexpress.com/',
-                'walmart': 'https://www.walmart.com/',
-                'bestbuy': 'https://www.bestbuy.com/',
-                'target': 'https://www.target.com/',
-                'etsy': 'https://www.etsy.com/',
-                'newegg': 'https://www.newegg.com/',
-                'shein': 'https://www.shein.com/',
-                'zara': 'https://www.zara.com/',
-                'hm': 'https://www.hm.com/',
-                'adidas': 'https://www.adidas.com/',
-                'nike': 'https://www.nike.com/',
-                'samsung': 'https://www.samsung.com/',
-                'apple': 'https://www.apple.com/',
-                'mi': 'https://www.mi.com/',
-            }
-            if site in site_homepages:
-                fresh_session.get(site_homepages[site], headers=fresh_headers, timeout=15)
-        except:
-            pass
-    
+    max_retries = circuit_breaker.retry_budget(key, max_retries)
     for attempt in range(max_retries):
-        try:
-            # Generate fresh headers for each request
-            headers = get_random_headers(site)
+        if attempt > 0 and circuit_breaker.is_open(key):
+            break
+        
+        with session_pool.session(session_key(url, site), site) as pooled:
+            # The homepage visit waits for the rate limiter like any fetch
+            if session_pool.needs_warm_up(pooled):
+                if rate_limiter.wait(key):
+                    session_pool.warm_up(pooled)
+                else:
+                    print(f"Rate limit queue for {site} is too long, skipping cookie warm-up")
             
-            # Add random delay to mimic human behavior
-            if attempt > 0:
-                delay = random.uniform(3, 8) * (attempt + 1)
-                time.sleep(delay)
+            # Wait for the site's rate limiter instead of sleeping a fixed back-off
+            if not rate_limiter.wait(key):
+                print(f"Rate limit queue for {site} is too long, giving up")
+                break
             
-            # Use a session with cookies for better mimicry
-            response = http_session.get(url, headers=headers, timeout=25)
+            response = fetch_attempt(url, site, pooled, attempt, max_retries)
+        if response is not None:
+            return response
+    
+    print(f"All {max_retries} attempts failed for {site}")
+    return None
+
+# Async fetch engine
+FETCH_MAX_IN_FLIGHT = int(os.environ.get('FETCH_MAX_IN_FLIGHT', '200'))
+FETCH_MAX_PER_HOST = int(os.environ.get('FETCH_MAX_PER_HOST', '4'))
+
+class FetchEngine:
+    """Background asyncio loop that keeps many price fetches in flight.
+    
+    Each blocking requests call runs on a bounded thread pool, while the waits
+    between attempts are awaited on the loop so they do not tie up a thread.
+    Every host gets its own concurrency cap.
+    """
+    
+    def __init__(self, max_in_flight=FETCH_MAX_IN_FLIGHT, max_per_host=FETCH_MAX_PER_HOST):
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._executor = None
+        self._host_slots = {}
+    
+    def _ensure_started(self):
+        with self._lock:
+            # gunicorn forks workers after import, so each process needs its own loop
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._host_slots = {}
+                self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='fetch')
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(self._executor)
+                threading.Thread(target=self._loop.run_forever, name='fetch-engine', daemon=True).start()
+            return self._loop
+    
+    def submit(self, coro):
+        """Schedule a coroutine on the engine loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+    
+    def run(self, coro):
+        """Run a coroutine on the engine loop and block until it finishes"""
+        return self.submit(coro).result()
+    
+    def host_slot(self, url):
+        """Semaphore capping concurrent fetches to the URL's host (loop thread only)"""
+        try:
+            host = urlparse(url).netloc.lower()
+        except ValueError:
+            host = ''
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+    
+    async def run_blocking(self, func, *args):
+        """Run a blocking function on the engine thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+fetch_engine = FetchEngine()
+
+async def fetch_page_async(url, site, max_retries=5, extra_headers=None):
+    """Async twin of fetch_page_with_retry, run on the fetch engine loop"""
+    key = limit_key(url, site)
+    if not circuit_breaker.allow(key):
+        print(f"Circuit for {key} is open, skipping fetch")
+        return None
+    
+    max_retries = circuit_breaker.retry_budget(key, max_retries)
+    async with fetch_engine.host_slot(url):
+        for attempt in range(max_retries):
+            if attempt > 0 and circuit_breaker.is_open(key):
+                break
             
-            if response.status_code == 200:
-                # Verify we got actual product page content
-                if len(response.content) < 500:
-                    print(f"Warning: Response too small for {site}, might be blocking page")
-                    continue
-                return response
-            elif response.status_code == 403:
-                print(f"Attempt {attempt + 1}/{max_retries}: Got 403 Forbidden for {site}")
-                # Try clearing and getting new cookies
-                http_session.cookies.clear()
-            elif response.status_code == 429:
-                print(f"Attempt {attempt + 1}/{max_retries}: Rate limited (429) for {site}, waiting longer...")
-                time.sleep(15 * (attempt + 1))
-            elif response.status_code == 503:
-                print(f"Attempt {attempt + 1}/{max_retries}: Service unavailable for {site}")
-                time.sleep(10 * (attempt + 1))
-            else:
-                print(f"Attempt {attempt + 1}/{max_retries}: Got status {response.status_code} for {site}")
+            with session_pool.session(session_key(url, site), site) as pooled:
+                # Queue on the loop for the site's rate limiter, not on a fetch thread,
+                # before the homepage visit as well as before the fetch itself
+                if session_pool.needs_warm_up(pooled):
+                    if await rate_limiter.wait_async(key):
+                        await fetch_engine.run_blocking(session_pool.warm_up, pooled)
+                    else:
+                        print(f"Rate limit queue for {site} is too long, skipping cookie warm-up")
                 
-        except requests.exceptions.Timeout:
-            print(f"Attempt {attempt + 1}/{max_retries}: Timeout for {site}")
-            time.sleep(5 * (attempt + 1))
-        except requests.exceptions.RequestException as e:
-            print(f"Attempt {attempt + 1}/{max_retries}: Request failed for {site}: {str(e)}")
-            time.sleep(2)
+                if not await rate_limiter.wait_async(key):
+                    print(f"Rate limit queue for {site} is too long, giving up")
+                    break
+                
+                response = await fetch_engine.run_blocking(fetch_attempt, url, site, pooled, attempt, max_retries, extra_headers)
+            if response is not None:
+                return response
     
     print(f"All {max_retries} attempts failed for {site}")
     return None
@@ -575,1157 +1220,2427 @@ def parse_price(price_str):
         pass
     return None
 
-def get_product_name(soup, site):
-    """Extract product name from page"""
-    selectors = {
-        'amazon': ['#productTitle', '.a-size-extra-large', 'h1#title'],
-        'flipkart': ['h1._30jeq3', 'span.B_NuCI', '[data-testid="product-title"]'],
-        'myntra': ['h1.pdp-title', '.pdp-name', '[class*="pdp-title"]'],
-        'ajio': ['.prod-name', 'h1[itemprop="name"]', '.product-title'],
-        'meesho': ['h2.sc-fznxsB', '[class*="product-name"]', 'h1'],
-        'snapdeal': ['.pdp-e-i-name', 'h1[itemprop="name"]'],
-        'tatacliq': ['.pdp-title', 'h1[class*="title"]'],
-        'reliancedigital': ['.pdp__productName', 'h1[itemprop="name"]'],
-        'croma': ['.pdp__productName', 'h1[itemprop="name"]'],
-        'nykaa': ['.pdp-name', 'h1[itemprop="name"]'],
-        'shopsy': ['.product-name', 'h2[class*="name"]'],
-        # New sites
-        'firstcry': ['.pdp_product_name', 'h1[class*="product-name"]', '.product-title'],
-        'pepperfry': ['.prod-title', 'h1[class*="title"]', '.product-name'],
-        'urbanladder': ['.product-title', 'h1[class*="product"]', '.product-name'],
-        'bigbasket': ['.product-title', 'h1[class*="product"]', '.product-name'],
-        'jiomart': ['.prod-name', 'h1[class*="product"]', '.product-title'],
-        'oneplus': ['.product-name', 'h1[class*="product"]', '.name'],
-        'vijaysales': ['.product-name', 'h1[class*="product"]', '.prod-name'],
-        'ebay': ['.x-item-title', 'h1[itemprop="name"]', '.product-title'],
-        'aliexpress': ['.product-name', 'h1[class*="product"]', '.title'],
-        'walmart': ['.product-title', 'h1[class*="product"]', '.prod-title'],
-        'bestbuy': ['.sku-title', 'h1[itemprop="name"]', '.product-name'],
-        'target': ['.product-title', 'h1[class*="product"]', '.prod-name'],
-        'etsy': ['.product-title', 'h1[itemprop="name"]', '.title'],
-        'newegg': ['.product-title', 'h1[itemprop="name"]', '.title'],
-        'shein': ['.goods-title', 'h1[class*="product"]', '.product-name'],
-        'zara': ['.product-name', 'h1[class*="product"]', '.name'],
-        'hm': ['.product-name', 'h1[itemprop="name"]', '.title'],
-        'adidas': ['.product-name', 'h1[itemprop="name"]', '.title'],
-        'nike': ['.product-name', 'h1[itemprop="name"]', '.title'],
-        'samsung': ['.product-name', 'h1[itemprop="name"]', '.title'],
-        'apple': ['.product-name', 'h1[itemprop="name"]', '.section__title'],
-        'mi': ['.product-name', 'h1[itemprop="name"]', '.title'],
-    }
-    
-    site_selectors = selectors.get(site, selectors['amazon'])
-    
-    for selector in site_selectors:
-        element = soup.select_one(selector)
-        if element:
-            text = element.get_text().strip()
-            if text and len(text) > 5:
-                text = re.sub(r'\s+', ' ', text)
-                return text[:100]
-    
-    # Fallback to any h1
-    h1 = soup.find('h1')
-    if h1:
-        text = h1.get_text().strip()
-        if text and len(text) > 5:
-            return text[:100]
-    
-    return "Unknown Product"
-
-def scrape_amazon_price(soup, url):
-    """Scrape price from Amazon pages - get actual product price"""
-    
-    # Strategy: Look for the ACTUAL product price, not delivery
-    
-    # 1. Try the main product price block - this is the most reliable
-    price_elem = soup.select_one('#priceblock_ourprice')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:  # Real product prices
-            print(f"  → Found price from #priceblock_ourprice: ₹{price}")
-            return price
-    
-    # 2. Try deal price
-    price_elem = soup.select_one('#priceblock_dealprice')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from #priceblock_dealprice: ₹{price}")
-            return price
+@lru_cache(maxsize=None)
+def compile_selector(selector):
+    """Compile a CSS selector once and reuse it for every page"""
+    return soupsieve.compile(selector)
+
+# Candidate price scoring shared by every site's fallback steps
+STRUCK_TAGS = {'s', 'del', 'strike'}
+STRUCK_CLASS_HINTS = ('strike', 'line-through', 'a-text-price', 'mrp', 'was-price', 'old-price', 'original-price', 'list-price')
+TITLE_DISTANCE_SCALE = 2000     # characters of page text over which nearness to the title fades out
+CANDIDATE_WEIGHTS = {'frequency': 1.0, 'title': 0.3, 'struck': 1.0, 'depth': 0.05}
+
+def is_struck_element(tag, classes, style):
+    """Whether an element typically shows a crossed-out list price or MRP"""
+    if tag in STRUCK_TAGS or 'line-through' in style:
+        return True
+    classes = classes.lower()
+    return any(hint in classes for hint in STRUCK_CLASS_HINTS)
+
+def findall_value(match):
+    """What re.findall would return for this match"""
+    groups = match.groups()
+    if not groups:
+        return match.group(0)
+    return groups[0] if len(groups) == 1 else groups
+
+def score_candidates(candidates, title_offset=None, weights=CANDIDATE_WEIGHTS):
+    """Rank candidate prices, returning [(price, score)] best first.
+    
+    candidates are (price, depth, struck, offset) tuples in document order,
+    where offset is the position in the page text (None when not visible).
+    Each distinct price scores on how often it appears relative to the most
+    frequent one, how near its closest occurrence is to the product title,
+    the share of its occurrences that are struck through, and its mean DOM
+    depth. Ties go to the price seen first, as Counter.most_common did.
+    Uses NumPy when installed; the pure Python path gives the same ranking.
+    """
+    if not candidates:
+        return []
+    if np is not None:
+        prices = np.array([candidate[0] for candidate in candidates], dtype=float)
+        depths = np.array([candidate[1] for candidate in candidates], dtype=float)
+        struck = np.array([candidate[2] for candidate in candidates], dtype=float)
+        uniques, first_index, inverse, counts = np.unique(prices, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        frequency = counts / counts.max()
+        struck_share = np.bincount(inverse, weights=struck) / counts
+        depth_share = np.bincount(inverse, weights=depths) / counts / max(depths.max(), 1)
+        closeness = np.zeros(len(uniques))
+        if title_offset is not None:
+            offsets = np.array([np.nan if candidate[3] is None else candidate[3] for candidate in candidates], dtype=float)
+            near = np.nan_to_num(np.clip(1 - np.abs(offsets - title_offset) / TITLE_DISTANCE_SCALE, 0, 1))
+            np.maximum.at(closeness, inverse, near)
+        scores = weights['frequency'] * frequency + weights['title'] * closeness - weights['struck'] * struck_share + weights['depth'] * depth_share
+        order = np.lexsort((first_index, -scores))
+        return [(float(uniques[i]), round(float(scores[i]), 3)) for i in order]
+    
+    totals = {}
+    for index, (price, depth, is_struck, offset) in enumerate(candidates):
+        entry = totals.setdefault(price, {'first': index, 'count': 0, 'struck': 0.0, 'depth': 0.0, 'closeness': 0.0})
+        entry['count'] += 1
+        entry['struck'] += is_struck
+        entry['depth'] += depth
+        if title_offset is not None and offset is not None:
+            entry['closeness'] = max(entry['closeness'], min(max(1 - abs(offset - title_offset) / TITLE_DISTANCE_SCALE, 0), 1))
+    max_count = max(entry['count'] for entry in totals.values())
+    max_depth = max(max(candidate[1] for candidate in candidates), 1)
+    ranked = []
+    for price, entry in totals.items():
+        score = (weights['frequency'] * (entry['count'] / max_count)
+                 + weights['title'] * entry['closeness']
+                 - weights['struck'] * (entry['struck'] / entry['count'])
+                 + weights['depth'] * (entry['depth'] / entry['count'] / max_depth))
+        ranked.append((-score, entry['first'], price, score))
+    return [(float(price), round(score, 3)) for _, _, price, score in sorted(ranked)]
+
+class PageView:
+    """Lazily computed views of one parsed page, shared by every scraper that reads it.
+    
+    Wraps the BeautifulSoup tree so the full text, the script texts, regex
+    matches over the text and select_one lookups are each computed at most once.
+    Anything else falls through to the underlying soup.
+    """
+    
+    _MISSING = object()
+    
+    def __init__(self, soup):
+        self.soup = soup
+        self._text = None
+        self._script_texts = None
+        self._matches = {}
+        self._script_matches = {}
+        self._text_nodes = {}
+        self._candidates = {}
+        self._offsets = None
+        self._selected = {}
+    
+    def get_text(self):
+        if self._text is None:
+            self._text = self.soup.get_text()
+        return self._text
+    
+    @property
+    def script_texts(self):
+        if self._script_texts is None:
+            self._script_texts = [script.get_text() for script in self.soup.find_all('script')]
+        return self._script_texts
+    
+    def find_prices(self, pattern):
+        """findall of a compiled pattern over the page text, cached per pattern"""
+        matches = self._matches.get(pattern)
+        if matches is None:
+            matches = self._matches[pattern] = pattern.findall(self.get_text())
+        return matches
+    
+    def script_matches(self, pattern):
+        """findall of a compiled pattern over each <script> text, one list per script"""
+        matches = self._script_matches.get(pattern)
+        if matches is None:
+            matches = self._script_matches[pattern] = [pattern.findall(text) for text in self.script_texts]
+        return matches
+    
+    def _string_offsets(self):
+        """Start offset in get_text() of every visible string, in document order"""
+        if self._offsets is None:
+            starts, strings, by_id = [], [], {}
+            offset = 0
+            for string in self.soup.strings:
+                by_id[id(string)] = offset
+                if string:
+                    starts.append(offset)
+                    strings.append(string)
+                    offset += len(string)
+            self._offsets = (starts, strings, by_id)
+        return self._offsets
+    
+    @staticmethod
+    def _node_features(node):
+        """(depth, struck) of a string from its enclosing elements"""
+        parents = [parent for parent in node.parents if parent.parent is not None]
+        struck = any(is_struck_element(parent.name, ' '.join(parent.get('class', [])), parent.get('style', '')) for parent in parents)
+        return len(parents), struck
+    
+    def price_candidates(self, pattern):
+        """find_prices with (match, depth, struck, offset) for each match, cached per pattern"""
+        candidates = self._candidates.get(pattern)
+        if candidates is None:
+            starts, strings, _ = self._string_offsets()
+            candidates = []
+            for match in pattern.finditer(self.get_text()):
+                node = strings[bisect_right(starts, match.start()) - 1]
+                candidates.append((findall_value(match),) + self._node_features(node) + (match.start(),))
+            self._candidates[pattern] = candidates
+        return candidates
+    
+    def text_nodes(self, contains):
+        """(text, depth, struck, offset) for every string containing a substring.
+        
+        Script, style and comment strings are included, with offset None.
+        """
+        nodes = self._text_nodes.get(contains)
+        if nodes is None:
+            by_id = self._string_offsets()[2]
+            nodes = self._text_nodes[contains] = [
+                (str(text),) + self._node_features(text) + (by_id.get(id(text)),)
+                for text in self.soup.find_all(string=lambda t: t and contains in t)
+            ]
+        return nodes
+    
+    def title_offset(self, selectors):
+        """Offset in the page text of the first title element with text, or None"""
+        by_id = self._string_offsets()[2]
+        for selector in selectors:
+            element = self.select_one(selector)
+            if element is not None and element.get_text().strip():
+                return by_id.get(id(next(iter(element.strings))))
+        return None
     
-    # 3. Try sale price
-    price_elem = soup.select_one('#priceblock_saleprice')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from #priceblock_saleprice: ₹{price}")
-            return price
+    def select_one(self, selector):
+        element = self._selected.get(selector, self._MISSING)
+        if element is self._MISSING:
+            element = self._selected[selector] = compile_selector(selector).select_one(self.soup)
+        return element
     
-    # 4. Try the inline price element
-    inline_price = soup.select_one('.a-price .a-offscreen')
-    if inline_price:
-        text = inline_price.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from .a-offscreen: ₹{price}")
-            return price
+    def select(self, selector):
+        return compile_selector(selector).select(self.soup)
     
-    # 5. Look for price in the product buying section
-    price_section = soup.select_one('#ppd') or soup.select_one('#centerCol') or soup.select_one('#twotabsearchtextgrid')
-    if price_section:
-        section_text = price_section.get_text()
-        # Look for main product price pattern
-        prices = re.findall(r'₹[\s,]*([\d,]+\.?\d*)', section_text)
-        for p in prices:
-            price = parse_price(p)
-            # Skip small delivery-like prices
-            if price and 200 <= price <= 100000:
-                # Make sure it's not a common delivery price
-                if price not in [250, 350, 450, 500, 550, 650, 750]:
-                    print(f"  → Found price from product section: ₹{price}")
-                    return price
-    
-    # 6. Fallback - search entire page but be smarter
-    all_text = soup.get_text()
-    prices = re.findall(r'₹[\s,]*([\d,]+\.?\d*)', all_text)
-    
-    # Count frequency and filter
-    price_counts = {}
-    for p in prices:
-        price = parse_price(p)
-        if price and 200 <= price <= 100000:
-            # Skip common non-product prices
-            skip_prices = [49, 50, 99, 100, 150, 199, 250, 299, 350, 399, 450, 499, 500, 550, 599, 650, 699, 750, 799, 850, 899, 950, 999]
-            if price not in skip_prices:
-                if price not in price_counts:
-                    price_counts[price] = 0
-                price_counts[price] += 1
-    
-    if price_counts:
-        # Return the most frequently occurring reasonable price
-        sorted_prices = sorted(price_counts.items(), key=lambda x: x[1], reverse=True)
-        print(f"  → Top prices found: {sorted_prices[:3]}")
-        # Return the most common price
-        return sorted_prices[0][0]
-    
-    print("  → No valid price found")
-    return None
+    def __getattr__(self, name):
+        return getattr(self.soup, name)
 
-def scrape_flipkart_price(soup, url):
-    """Scrape price from Flipkart pages - get actual product price"""
-    
-    # 1. Try the main price element first (most reliable)
-    price_elem = soup.select_one('div._30jeq3')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from div._30jeq3: ₹{price}")
-            return price
-    
-    # 2. Try data-testid price
-    price_elem = soup.select_one('[data-testid="price"]')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from [data-testid='price']: ₹{price}")
-            return price
-    
-    # 3. Try the discount price block
-    price_elem = soup.select_one('div._16P6d')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from div._16P6d: ₹{price}")
-            return price
-    
-    # 4. Try original price (MRP)
-    price_elem = soup.select_one('div._3I9_wc') or soup.select_one('._3OtPd')
-    if price_elem:
-        text = price_elem.get_text().strip()
-        price = parse_price(text)
-        if price and price >= 200:
-            print(f"  → Found price from MRP block: ₹{price}")
-            return price
-    
-    # 5. Look for prices in the product container
-    product_elem = soup.select_one('div._1Yok6V') or soup.select_one('div._2B099h')
-    if product_elem:
-        elem_text = product_elem.get_text()
-        prices = re.findall(r'₹[\s,]*([\d,]+\.?\d*)', elem_text)
-        for p in prices:
-            price = parse_price(p)
-            if price and 200 <= price <= 100000:
-                if price not in [250, 350, 450, 500, 550, 650, 750]:
-                    print(f"  → Found price from product container: ₹{price}")
-                    return price
-    
-    # 6. Fallback - search all text
-    all_text = soup.get_text()
-    prices = re.findall(r'₹[\s,]*([\d,]+\.?\d*)', all_text)
-    
-    price_counts = {}
-    for p in prices:
-        price = parse_price(p)
-        if price and 200 <= price <= 100000:
-            skip_prices = [49, 50, 99, 100, 150, 199, 250, 299, 350, 399, 450, 499, 500, 550, 599, 650, 699, 750, 799, 850, 899, 950, 999]
-            if price not in skip_prices:
-                if price not in price_counts:
-                    price_counts[price] = 0
-                price_counts[price] += 1
-    
-    if price_counts:
-        sorted_prices = sorted(price_counts.items(), key=lambda x: x[1], reverse=True)
-        print(f"  → Top prices found: {sorted_prices[:3]}")
-        return sorted_prices[0][0]
-    
-    print("  → No valid price found")
-    return None
+# Declarative price extraction rules
+RUPEE_PATTERN = r'₹[\s,]*([\d,]+\.?\d*)'
+ANY_CURRENCY_PATTERN = r'[\₹$£€]\s*([\d,]+\.?\d*)'
 
-def scrape_myntra_price(soup, url):
-    """Scrape price from Myntra pages - prioritize the main selling price (not original price)"""
-    
-    # Method 1: Try to find the selling price in script tags with product data
-    # Myntra often embeds product data in scripts with "sellingPrice" or "finalPrice"
-    all_scripts = soup.find_all("script")
-    for script in all_scripts:
-        script_text = script.get_text() if script else ""
-        if script_text:
-            # Look for sellingPrice or discounted price patterns
-            selling_matches = re.findall(r'sellingPrice["\']?\s*:\s*([\d.]+)', script_text)
-            for match in selling_matches:
-                try:
-                    val = float(match)
-                    if 200 < val < 100000:
-                        return val
-                except ValueError:
-                    continue
-            
-            # Look for "sp" (common abbreviation for selling price in Myntra)
-            sp_matches = re.findall(r'"sp"\s*:\s*([\d.]+)', script_text)
-            for match in sp_matches:
-                try:
-                    val = float(match)
-                    if 200 < val < 100000:
-                        return val
-                except ValueError:
-                    continue
-            
-            # Look for "discountedPrice" or "offerPrice" or "fp" (final price)
-            discount_matches = re.findall(r'(?:discountedPrice|offerPrice|finalPrice|fp)["\']?\s*:\s*([\d.]+)', script_text, re.IGNORECASE)
-            for match in discount_matches:
-                try:
-                    val = float(match)
-                    if 200 < val < 100000:
-                        return val
-                except ValueError:
-                    continue
-    
-    # Method 2: Look for price-info containers (modern Myntra layout)
-    price_info = soup.find_all(class_=lambda x: x and 'pdp-pricing-container' in str(x).lower() if x else False)
-    for container in price_info:
-        text = container.get_text()
-        nums = re.findall(r'₹\s*([\d,]+\.?\d*)', text)
-        for match in nums:
-            try:
-                val = float(match.replace(",", ""))
-                if 100 < val < 100000:
-                    return val
-            except ValueError:
-                continue
-    
-    # Method 3: Try specific Myntra selectors - prioritize selling price selectors
-    selling_price_selectors = [
-        "[class*='selling-price']",
-        "[class*='sellingPrice']",
-        "[class*='final-price']",
-        "[class*='current-price']",
-        ".pdp__selling-price",
-        ".pdp-selling-price",
-        "span.discounted-price",
-        ".pdp-price-info",
-        ".pdp-pricing",
-        ".PriceCard",
-        "[data-testid='pdp-price']"
-    ]
-    
-    for selector in selling_price_selectors:
-        price_element = soup.select_one(selector)
-        if price_element:
-            text = price_element.get_text().strip()
-            nums = re.findall(r'[\d,]+\.?\d*', text.replace(",", ""))
-            for num_str in nums:
-                try:
-                    val = float(num_str.replace(",", ""))
-                    if 100 < val < 100000:
-                        return val
-                except ValueError:
-                    continue
-    
-    # Method 4: Look for the most common reasonable price
-    all_prices = []
-    all_elements = soup.find_all(string=lambda t: t and '₹' in t if t else False)
-    
-    for elem_text in all_elements:
-        upper_text = elem_text.upper()
-        skip_words = ['FREE', 'DELIVERY', 'SHIPPING', 'DELIVERY FEE', 'SHIPPING FEE',
+# Round prices that usually belong to delivery fees, add-ons or banners
+DELIVERY_PRICES = [250, 350, 450, 500, 550, 650, 750]
+COMMON_PRICE_POINTS = [49, 50, 99, 100, 150, 199, 250, 299, 350, 399, 450, 499, 500, 550, 599, 650, 699, 750, 799, 850, 899, 950, 999]
+
+MYNTRA_SKIP_WORDS = ['FREE', 'DELIVERY', 'SHIPPING', 'DELIVERY FEE', 'SHIPPING FEE',
                      '₹0', '₹10', '₹20', '₹30', '₹40', '₹49', '₹50',
                      '₹60', '₹70', '₹80', '₹90', '₹99', '₹100',
                      '₹150', '₹199', '₹250']
+
+# Each site has name selectors and an ordered list of price extraction steps.
+# The first step that yields a price wins. Ranges are exclusive (low, high)
+# bounds, with None meaning unbounded, unless the step sets 'inclusive'.
+# Step types:
+#   selectors   - price from the text of the first matching element, tried per selector
+#   section     - first in-range price inside the first section that exists
+#   scripts     - first in-range value matched by the patterns in <script> text
+#   most_common - most frequent in-range price matched anywhere in the page text
+#   text_nodes  - most frequent in-range price in text nodes without skip words
+#   first_match - first in-range price matched anywhere in the page text
+SITE_RULES = {
+    'amazon': {
+        'name_selectors': ['#productTitle', '.a-size-extra-large', 'h1#title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['#priceblock_ourprice', '#priceblock_dealprice', '#priceblock_saleprice', '.a-price .a-offscreen'], 'range': (200, None), 'inclusive': True},
+            {'type': 'section', 'selectors': ['#ppd', '#centerCol', '#twotabsearchtextgrid'], 'pattern': RUPEE_PATTERN, 'range': (200, 100000), 'inclusive': True, 'skip': DELIVERY_PRICES},
+            {'type': 'most_common', 'pattern': RUPEE_PATTERN, 'range': (200, 100000), 'inclusive': True, 'skip': COMMON_PRICE_POINTS},
+        ],
+    },
+    'flipkart': {
+        'name_selectors': ['h1._30jeq3', 'span.B_NuCI', '[data-testid="product-title"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['div._30jeq3', '[data-testid="price"]', 'div._16P6d', 'div._3I9_wc', '._3OtPd'], 'range': (200, None), 'inclusive': True},
+            {'type': 'section', 'selectors': ['div._1Yok6V', 'div._2B099h'], 'pattern': RUPEE_PATTERN, 'range': (200, 100000), 'inclusive': True, 'skip': DELIVERY_PRICES},
+            {'type': 'most_common', 'pattern': RUPEE_PATTERN, 'range': (200, 100000), 'inclusive': True, 'skip': COMMON_PRICE_POINTS},
+        ],
+    },
+    'myntra': {
+        'name_selectors': ['h1.pdp-title', '.pdp-name', '[class*="pdp-title"]'],
+        'steps': [
+            # Myntra embeds the selling price in its product data scripts
+            {'type': 'scripts', 'patterns': [r'sellingPrice["\']?\s*:\s*([\d.]+)', r'"sp"\s*:\s*([\d.]+)', r'(?i)(?:discountedPrice|offerPrice|finalPrice|fp)["\']?\s*:\s*([\d.]+)'], 'range': (200, 100000)},
+            {'type': 'section', 'selectors': ['[class*="pdp-pricing-container" i]'], 'all_elements': True, 'pattern': r'₹\s*([\d,]+\.?\d*)', 'range': (100, 100000)},
+            {'type': 'selectors', 'selectors': ["[class*='selling-price']", "[class*='sellingPrice']", "[class*='final-price']", "[class*='current-price']", '.pdp__selling-price', '.pdp-selling-price', 'span.discounted-price', '.pdp-price-info', '.pdp-pricing', '.PriceCard', "[data-testid='pdp-price']"], 'parse': 'numbers', 'range': (100, 100000)},
+            {'type': 'text_nodes', 'contains': '₹', 'skip_words': MYNTRA_SKIP_WORDS, 'pattern': r'₹\s*([\d,]+\.?\d*)', 'range': (100, 100000)},
+        ],
+    },
+    'ajio': {
+        'name_selectors': ['.prod-name', 'h1[itemprop="name"]', '.product-title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['.prod-sp', '.price', '[class*="current-price"]']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 100000)},
+        ],
+    },
+    'meesho': {
+        'name_selectors': ['h2.sc-fznxsB', '[class*="product-name"]', 'h1'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="Price"]', '[class*="price"]']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 50000)},
+        ],
+    },
+    'snapdeal': {
+        'name_selectors': ['.pdp-e-i-name', 'h1[itemprop="name"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['.pdp-final-price', '[class*="price"]', '.sp-info']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 100000)},
+        ],
+    },
+    'tatacliq': {
+        'name_selectors': ['.pdp-title', 'h1[class*="title"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="pdp-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'reliancedigital': {
+        'name_selectors': ['.pdp__productName', 'h1[itemprop="name"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="pdp__price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'croma': {
+        'name_selectors': ['.pdp__productName', 'h1[itemprop="name"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="pdp-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'nykaa': {
+        'name_selectors': ['.pdp-name', 'h1[itemprop="name"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="pdp-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 100000)},
+        ],
+    },
+    'shopsy': {
+        'name_selectors': ['.product-name', 'h2[class*="name"]'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.final-price', '[class*="Price"]']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 50000)},
+        ],
+    },
+    'firstcry': {
+        'name_selectors': ['.pdp_product_name', 'h1[class*="product-name"]', '.product-title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="selling-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 50000)},
+        ],
+    },
+    'pepperfry': {
+        'name_selectors': ['.prod-title', 'h1[class*="title"]', '.product-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="selling-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'urbanladder': {
+        'name_selectors': ['.product-title', 'h1[class*="product"]', '.product-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="selling-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'bigbasket': {
+        'name_selectors': ['.product-title', 'h1[class*="product"]', '.product-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="sp"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (10, 10000)},
+        ],
+    },
+    'jiomart': {
+        'name_selectors': ['.prod-name', 'h1[class*="product"]', '.product-title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="selling-price"]', '[class*="price"]', '.final-price']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 100000)},
+        ],
+    },
+    'oneplus': {
+        'name_selectors': ['.product-name', 'h1[class*="product"]', '.name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.final-price', '[class*="Price"]']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (500, 100000)},
+        ],
+    },
+    'vijaysales': {
+        'name_selectors': ['.product-name', 'h1[class*="product"]', '.prod-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.final-price', '[class*="Price"]']},
+            {'type': 'most_common', 'pattern': ANY_CURRENCY_PATTERN, 'range': (100, 100000)},
+        ],
+    },
+    'ebay': {
+        'name_selectors': ['.x-item-title', 'h1[itemprop="name"]', '.product-title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.vi-price', '[itemprop="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€₹]\s*([\d,]+\.?\d*)', 'range': (None, 10000)},
+        ],
+    },
+    'aliexpress': {
+        'name_selectors': ['.product-name', 'h1[class*="product"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.product-price', '[class*="current-price"]']},
+            {'type': 'most_common', 'pattern': r'[\$€£]\s*([\d,]+\.?\d*)', 'range': (None, 1000)},
+        ],
+    },
+    'walmart': {
+        'name_selectors': ['.product-title', 'h1[class*="product"]', '.prod-title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '[data-automation="product-price"]', '.price-characteristic']},
+            {'type': 'most_common', 'pattern': r'\$\s*([\d,]+\.?\d*)', 'range': (None, 10000)},
+        ],
+    },
+    'bestbuy': {
+        'name_selectors': ['.sku-title', 'h1[itemprop="name"]', '.product-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[data-automation="buybox-price"]', '.priceView-customer-price span', '.priceView-price', '[itemprop="price"]', '.price'], 'range': (10, 10000)},
+            {'type': 'most_common', 'pattern': r'\$[\s,]*([\d,]+\.?\d*)', 'range': (50, 10000)},
+        ],
+    },
+    'target': {
+        'name_selectors': ['.product-title', 'h1[class*="product"]', '.prod-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '[data-test="product-price"]', '.price']},
+            {'type': 'most_common', 'pattern': r'\$\s*([\d,]+\.?\d*)', 'range': (None, 10000)},
+        ],
+    },
+    'etsy': {
+        'name_selectors': ['.product-title', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '[itemprop="price"]', '.currency-value']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 5000)},
+        ],
+    },
+    'newegg': {
+        'name_selectors': ['.product-title', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[itemprop="price"]']},
+            {'type': 'most_common', 'pattern': r'\$\s*([\d,]+\.?\d*)', 'range': (None, 10000)},
+        ],
+    },
+    'shein': {
+        'name_selectors': ['.goods-title', 'h1[class*="product"]', '.product-name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.salePrice', '[class*="current-price"]']},
+            {'type': 'most_common', 'pattern': r'[\$€£]\s*([\d,]+\.?\d*)', 'range': (None, 500)},
+        ],
+    },
+    'zara': {
+        'name_selectors': ['.product-name', 'h1[class*="product"]', '.name'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[data-testid="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 1000)},
+        ],
+    },
+    'hm': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[data-testid="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 1000)},
+        ],
+    },
+    'adidas': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[itemprop="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 1000)},
+        ],
+    },
+    'nike': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[itemprop="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 1000)},
+        ],
+    },
+    'samsung': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[class*="price"]', '.price', '[itemprop="price"]']},
+            {'type': 'most_common', 'pattern': r'[\$£€]\s*([\d,]+\.?\d*)', 'range': (None, 10000)},
+        ],
+    },
+    'apple': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.section__title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[data-component="price"]', '.as-priceprice', '.price-value', '[itemprop="price"]', '[class*="price"]'], 'range': (50, 10000)},
+            {'type': 'most_common', 'pattern': r'\$[\s,]*([\d,]+\.?\d*)', 'range': (100, 10000)},
+        ],
+    },
+    'mi': {
+        'name_selectors': ['.product-name', 'h1[itemprop="name"]', '.title'],
+        'steps': [
+            {'type': 'selectors', 'selectors': ['[data-price]', '.price', '.product-price', '[itemprop="price"]', '[class*="price"]'], 'range': (20, 5000)},
+            {'type': 'most_common', 'pattern': r'[\$€£₹][\s,]*([\d,]+\.?\d*)', 'range': (30, 5000)},
+        ],
+    },
+    'unknown': {
+        'name_selectors': ['#productTitle', '.a-size-extra-large', 'h1#title'],
+        'steps': [
+            {'type': 'first_match', 'pattern': ANY_CURRENCY_PATTERN, 'range': (50, 100000)},
+        ],
+    },
+}
+
+NUMBER_PATTERN = re.compile(r'[\d,]+\.?\d*')
+
+# Adaptive ordering of the selectors within a 'selectors' step
+SELECTOR_WINDOW = 50
+SELECTOR_DEMOTE_AFTER = int(os.environ.get('SELECTOR_DEMOTE_AFTER', '20'))
+
+def price_in_range(price, price_range, inclusive=False):
+    low, high = price_range
+    if price is None:
+        return False
+    if inclusive:
+        return (low is None or price >= low) and (high is None or price <= high)
+    return (low is None or price > low) and (high is None or price < high)
+
+class SiteRuleEngine:
+    """Runs the SITE_RULES extraction steps against a parsed page.
+    
+    Selectors and patterns are compiled once when the engine is built, and
+    every selector and step keeps tried/hit counters so the stats show which
+    rules actually find prices. Within a 'selectors' step, selectors are
+    tried in order of their hit rate over the last SELECTOR_WINDOW tries,
+    and one that has missed SELECTOR_DEMOTE_AFTER times in a row goes to the
+    back until it hits again. Steps themselves always run in rule order.
+    """
+    
+    def __init__(self, rules=SITE_RULES):
+        self.rules = {}
+        for site, rule in rules.items():
+            self.rules[site] = {
+                'name_selectors': rule.get('name_selectors', []),
+                'steps': [self._compile_step(step) for step in rule['steps']],
+            }
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._recent = {}
+    
+    @staticmethod
+    def _compile_step(step):
+        compiled = dict(step)
+        for selector in step.get('selectors', []):
+            compile_selector(selector)
+        if 'pattern' in step:
+            compiled['pattern'] = re.compile(step['pattern'])
+        if 'patterns' in step:
+            compiled['patterns'] = [re.compile(pattern) for pattern in step['patterns']]
+        compiled['skip'] = frozenset(step.get('skip', []))
+        compiled['range'] = step.get('range', (None, None))
+        compiled['inclusive'] = step.get('inclusive', False)
+        return compiled
+    
+    def name_selectors(self, site):
+        return self.rules.get(site, self.rules['amazon'])['name_selectors']
+    
+    def extract(self, page, site):
+        """Return the first price produced by the site's steps, or None"""
+        return self.extract_step(page, site)[0]
+    
+    def extract_step(self, page, site):
+        """Return (price, type of the step that found it), or (None, None)"""
+        rule = self.rules.get(site, self.rules['unknown'])
+        for step in rule['steps']:
+            price, label = getattr(self, '_run_' + step['type'])(page, site, step)
+            if price is not None:
+                print(f"  → Found price from {label}: {price}")
+                return price, step['type']
         
-        if any(word in upper_text for word in skip_words):
-            continue
-        
-        nums = re.findall(r'₹\s*([\d,]+\.?\d*)', elem_text)
-        for match in nums:
-            try:
-                val = float(match.replace(",", ""))
-                if 100 < val < 100000:
-                    all_prices.append(val)
-            except ValueError:
+        print("  → No valid price found")
+        return None, None
+    
+    def _record(self, site, label, hit):
+        with self._lock:
+            counts = self._stats.setdefault(site, {}).setdefault(label, {'tried': 0, 'hits': 0})
+            counts['tried'] += 1
+            if hit:
+                counts['hits'] += 1
+    
+    def _record_selector(self, site, selector, hit):
+        with self._lock:
+            recent = self._recent.setdefault((site, selector), {'window': deque(maxlen=SELECTOR_WINDOW), 'misses_in_row': 0})
+            recent['window'].append(hit)
+            recent['misses_in_row'] = 0 if hit else recent['misses_in_row'] + 1
+    
+    def _recent_rate(self, site, selector):
+        recent = self._recent.get((site, selector))
+        if not recent:
+            return None, False
+        window = recent['window']
+        return sum(window) / len(window), recent['misses_in_row'] >= SELECTOR_DEMOTE_AFTER
+    
+    def ordered_selectors(self, site, step):
+        """The step's selectors, best recent hit rate first and dead ones last"""
+        with self._lock:
+            ranked = []
+            for position, selector in enumerate(step['selectors']):
+                rate, demoted = self._recent_rate(site, selector)
+                # Untried selectors keep their rule position among the tried ones that never hit
+                ranked.append((demoted, -(rate or 0.0), position, selector))
+        return [selector for _, _, _, selector in sorted(ranked)]
+    
+    def _run_selectors(self, page, site, step):
+        for selector in self.ordered_selectors(site, step):
+            price = None
+            element = page.select_one(selector)
+            if element:
+                text = element.get_text().strip()
+                if step.get('parse') == 'numbers':
+                    for number in NUMBER_PATTERN.findall(text.replace(',', '')):
+                        value = float(number)
+                        if price_in_range(value, step['range'], step['inclusive']):
+                            price = value
+                            break
+                else:
+                    price = parse_price(text)
+                    if not price_in_range(price, step['range'], step['inclusive']):
+                        price = None
+            label = f'selector {selector}'
+            self._record(site, label, price is not None)
+            self._record_selector(site, selector, price is not None)
+            if price is not None:
+                return price, label
+        return None, None
+    
+    def _run_section(self, page, site, step):
+        for selector in step['selectors']:
+            label = f'section {selector}'
+            elements = page.select(selector) if step.get('all_elements') else [page.select_one(selector)]
+            elements = [element for element in elements if element]
+            if not elements:
+                self._record(site, label, False)
                 continue
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+            for element in elements:
+                for match in step['pattern'].findall(element.get_text()):
+                    price = parse_price(match)
+                    if price_in_range(price, step['range'], step['inclusive']) and price not in step['skip']:
+                        self._record(site, label, True)
+                        return price, label
+            # Only the first section that exists is searched
+            self._record(site, label, False)
+            break
+        return None, None
+    
+    def _run_scripts(self, page, site, step):
+        per_pattern = [page.script_matches(pattern) for pattern in step['patterns']]
+        # Scripts in document order, then each pattern in rule order
+        for script_matches in zip(*per_pattern):
+            for matches in script_matches:
+                for match in matches:
+                    try:
+                        value = float(match)
+                    except ValueError:
+                        continue
+                    if price_in_range(value, step['range'], step['inclusive']):
+                        self._record(site, 'scripts', True)
+                        return value, 'scripts'
+        self._record(site, 'scripts', False)
+        return None, None
+    
+    def _best_candidate(self, page, site, label, candidates):
+        self._record(site, label, bool(candidates))
+        if not candidates:
+            return None, None
+        ranked = score_candidates(candidates, page.title_offset(self.name_selectors(site) + ['h1']))
+        print(f"  → Top prices found: {ranked[:3]}")
+        return ranked[0][0], label
+    
+    def _run_most_common(self, page, site, step):
+        candidates = []
+        for match, depth, struck, offset in page.price_candidates(step['pattern']):
+            price = parse_price(match)
+            if price_in_range(price, step['range'], step['inclusive']) and price not in step['skip']:
+                candidates.append((price, depth, struck, offset))
+        return self._best_candidate(page, site, 'fallback most_common', candidates)
+    
+    def _run_text_nodes(self, page, site, step):
+        candidates = []
+        for text, depth, struck, offset in page.text_nodes(step['contains']):
+            upper_text = text.upper()
+            if any(word in upper_text for word in step['skip_words']):
+                continue
+            for match in step['pattern'].findall(text):
+                price = parse_price(match)
+                if price_in_range(price, step['range'], step['inclusive']):
+                    candidates.append((price, depth, struck, offset))
+        return self._best_candidate(page, site, 'fallback text_nodes', candidates)
+    
+    def _run_first_match(self, page, site, step):
+        for match in page.find_prices(step['pattern']):
+            price = parse_price(match)
+            if price_in_range(price, step['range'], step['inclusive']):
+                self._record(site, 'fallback first_match', True)
+                return price, 'fallback first_match'
+        self._record(site, 'fallback first_match', False)
+        return None, None
+    
+    def stats(self):
+        with self._lock:
+            stats = {
+                site: {
+                    label: dict(counts, hit_rate=round(counts['hits'] / counts['tried'], 3))
+                    for label, counts in labels.items()
+                }
+                for site, labels in self._stats.items()
+            }
+            for (site, selector), recent in self._recent.items():
+                rate, demoted = self._recent_rate(site, selector)
+                stats[site][f'selector {selector}'].update(recent_hit_rate=round(rate, 3), demoted=demoted)
+            return stats
+
+rule_engine = SiteRuleEngine()
+
+# Single-pass streaming extraction (PARSER_BACKEND=stream)
+STREAM_BACKEND = 'stream'
+SCAN_CAPTURE_LIMIT = 64 * 1024   # characters kept from one matched element
+SCAN_MATCH_TAIL = 256            # characters held back so a price split across text nodes still matches
+
+# Elements html.parser closes as soon as they open
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr'}
+# Strings get_text() leaves out: script and style bodies, and anything inside <template>
+HIDDEN_TEXT_ELEMENTS = {'script', 'style', 'template'}
+
+SIMPLE_COMPOUND = re.compile(r'([a-zA-Z][\w-]*|\*)?((?:#[\w-]+|\.[\w-]+|\[[^\]]+\])*)$')
+SIMPLE_PART = re.compile(r'#([\w-]+)|\.([\w-]+)|\[\s*([\w-]+)\s*(?:([*^$~]?=)\s*(?:"([^"]*)"|\'([^\']*)\'|([\w-]+))\s*(i)?\s*)?\]')
+SIMPLE_PARTS = re.compile(f'(?:{SIMPLE_PART.pattern})*')
+
+@lru_cache(maxsize=None)
+def parse_simple_selector(selector):
+    """Split a CSS selector into compounds joined by descendant combinators.
+    
+    Each compound is (tag, [(kind, name, op, value, ignore_case)]). Only the
+    tag/#id/.class/[attr] forms used in SITE_RULES are understood; anything
+    else raises ValueError so the page is parsed normally.
+    """
+    compounds = []
+    for part in re.findall(r'(?:[^\s\[]|\[[^\]]*\])+', selector):
+        match = SIMPLE_COMPOUND.match(part)
+        if not match or not SIMPLE_PARTS.fullmatch(match.group(2)):
+            raise ValueError(f"Unsupported selector for streaming: {selector}")
+        checks = []
+        for id_name, class_name, attr, op, double, single, bare, flag in SIMPLE_PART.findall(match.group(2)):
+            if id_name:
+                checks.append(('attr', 'id', '=', id_name, False))
+            elif class_name:
+                checks.append(('class', class_name, None, None, False))
+            else:
+                checks.append(('attr', attr.lower(), op or None, double or single or bare, bool(flag)))
+        tag = match.group(1)
+        compounds.append((None if tag in (None, '*') else tag.lower(), checks))
+    if not compounds:
+        raise ValueError(f"Unsupported selector for streaming: {selector}")
+    return compounds
+
+def compound_matches(compound, tag, attrs):
+    name, checks = compound
+    if name is not None and name != tag:
+        return False
+    for kind, attr, op, value, ignore_case in checks:
+        if kind == 'class':
+            if attr not in attrs.get('class', '').split():
+                return False
+            continue
+        actual = attrs.get(attr)
+        if actual is None:
+            return False
+        if op is None:
+            continue
+        if ignore_case:
+            actual, value = actual.lower(), value.lower()
+        if op == '=' and actual != value:
+            return False
+        if op == '*=' and (not value or value not in actual):
+            return False
+        if op == '^=' and (not value or not actual.startswith(value)):
+            return False
+        if op == '$=' and (not value or not actual.endswith(value)):
+            return False
+        if op == '~=' and value not in actual.split():
+            return False
+    return True
+
+class ScannedElement:
+    """The text of one element captured during a streaming scan, and where it starts in the page text"""
+    
+    def __init__(self, text, offset):
+        self.text = text
+        self.offset = offset
+    
+    def get_text(self):
+        return self.text
+
+class ScannedPage:
+    """What a PageScanner collected, answering the same lookups as PageView.
+    
+    Only the selectors, patterns and text-node filters in the site's scan plan
+    are available; anything else was never collected.
+    """
+    
+    def __init__(self, selected, candidates, script_matches, text_nodes):
+        self._selected = selected
+        self._candidates = candidates
+        self._matches = {pattern: [candidate[0] for candidate in found] for pattern, found in candidates.items()}
+        self._script_matches = script_matches
+        self._text_nodes = text_nodes
+    
+    def select_one(self, selector):
+        elements = self._selected[selector]
+        return elements[0] if elements else None
+    
+    def select(self, selector):
+        return self._selected[selector]
+    
+    def find_prices(self, pattern):
+        return self._matches[pattern]
+    
+    def price_candidates(self, pattern):
+        return self._candidates[pattern]
+    
+    def script_matches(self, pattern):
+        return self._script_matches[pattern]
+    
+    def text_nodes(self, contains):
+        return self._text_nodes[contains]
+    
+    def title_offset(self, selectors):
+        for selector in selectors:
+            element = self.select_one(selector)
+            if element is not None and element.get_text().strip():
+                return element.offset
+        return None
 
-def scrape_ajio_price(soup, url):
-    """Scrape price from AJIO pages"""
-    price_elem = soup.select_one('.prod-sp') or soup.select_one('.price') or soup.select_one('[class*="current-price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+@lru_cache(maxsize=None)
+def scan_plan(site):
+    """Collect the selectors, patterns and text filters a site's rules will ask for"""
+    rule = rule_engine.rules.get(site, rule_engine.rules['unknown'])
+    plan = {'selectors': {}, 'patterns': set(), 'script_patterns': set(), 'text_nodes': set()}
+    for selector in list(rule_engine.name_selectors(site)) + ['h1']:
+        plan['selectors'].setdefault(selector, False)
+    for step in rule['steps']:
+        for selector in step.get('selectors', []):
+            # select() needs every match, select_one() only the first
+            plan['selectors'][selector] = plan['selectors'].get(selector, False) or bool(step.get('all_elements'))
+        if step['type'] in ('most_common', 'first_match'):
+            plan['patterns'].add(step['pattern'])
+        elif step['type'] == 'scripts':
+            plan['script_patterns'].update(step['patterns'])
+        elif step['type'] == 'text_nodes':
+            plan['text_nodes'].add(step['contains'])
+    plan['compiled'] = [(selector, parse_simple_selector(selector), find_all) for selector, find_all in plan['selectors'].items()]
+    return plan
+
+class PageScanner(HTMLParser):
+    """Collects everything a site's rules need from a page in one streaming pass.
+    
+    Feed it bytes as they arrive and call finish() for a ScannedPage. Only
+    the open-element stack, the text of elements matched by the site's
+    selectors, candidate prices with their depth, strike-through and offset,
+    and the current script body are kept, never the page itself. Tag and
+    end-tag handling follows html.parser, so results match that backend.
+    That includes <template>: its text is left out of the page text and of
+    every element's text except the <template> element's own, which has no
+    offset in the page text. Pages are decoded as UTF-8.
+    """
+    
+    def __init__(self, site):
+        super().__init__(convert_charrefs=True)
+        self.plan = scan_plan(site)
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._stack = []
+        self._hidden = 0
+        self._captures = []
+        self._offset = 0
+        self._span_starts = []
+        self._span_features = []
+        self._selected = {selector: [] for selector in self.plan['selectors']}
+        self._pending = {pattern: '' for pattern in self.plan['patterns']}
+        self._candidates = {pattern: [] for pattern in self.plan['patterns']}
+        self._script_matches = {pattern: [] for pattern in self.plan['script_patterns']}
+        self._text_nodes = {contains: [] for contains in self.plan['text_nodes']}
+        self._script = None
+    
+    def feed_bytes(self, chunk):
+        self.feed(self._decoder.decode(chunk))
+    
+    def finish(self):
+        self.feed(self._decoder.decode(b'', final=True))
+        self.close()
+        while self._stack:
+            self._pop()
+        for pattern in self._pending:
+            self._match_text(pattern, '', final=True)
+        return ScannedPage(self._selected, self._candidates, self._script_matches, self._text_nodes)
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        captures = []
+        for selector, compounds, find_all in self.plan['compiled']:
+            if (find_all or not self._selected[selector]) and self._matches_selector(compounds, tag, attrs):
+                # Reserve the slot now so select_one keeps the first match in document order
+                capture = {
+                    'selector': selector, 'index': len(self._selected[selector]), 'parts': [], 'size': 0,
+                    'template': tag == 'template', 'offset': None if tag == 'template' else self._offset,
+                }
+                self._selected[selector].append(capture)
+                captures.append(capture)
+        struck = (self._stack and self._stack[-1][3]) or is_struck_element(tag, attrs.get('class', ''), attrs.get('style', ''))
+        self._stack.append((tag, attrs, captures, struck))
+        self._captures.extend(captures)
+        if tag == 'template':
+            self._hidden += 1
+        if tag in ('script', 'style'):
+            self._script = []
+        if tag in VOID_ELEMENTS:
+            self._pop()
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        # Close up to the most recent open element with this name; stray end tags are ignored
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                while len(self._stack) > index:
+                    self._pop()
+                return
+    
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script.append(data)
+            return
+        if self._hidden:
+            self._text_node(data, None)
+            # Only a <template> element's own get_text() includes what is inside it
+            self._capture_text(data, [capture for capture in self._captures if capture['template']])
+            return
+        if not data:
+            return
+        self._text_node(data, self._offset)
+        self._capture_text(data, self._captures)
+        if self._pending:
+            self._span_starts.append(self._offset)
+            self._span_features.append(self._features())
+            self._offset += len(data)
+            for pattern in self._pending:
+                self._match_text(pattern, data)
+            if len(self._span_starts) > 1024:
+                self._prune_spans()
+        else:
+            self._offset += len(data)
+    
+    def handle_comment(self, data):
+        self._text_node(data, None)
+    
+    def _capture_text(self, data, captures):
+        for capture in captures:
+            if capture['size'] < SCAN_CAPTURE_LIMIT:
+                capture['parts'].append(data[:SCAN_CAPTURE_LIMIT - capture['size']])
+                capture['size'] += len(capture['parts'][-1])
+    
+    def _features(self):
+        """(depth, struck) of text at the current position"""
+        return len(self._stack), bool(self._stack and self._stack[-1][3])
+    
+    def _matches_selector(self, compounds, tag, attrs):
+        if not compound_matches(compounds[-1], tag, attrs):
+            return False
+        # Remaining compounds must match ancestors, nearest first
+        remaining = len(compounds) - 2
+        for ancestor_tag, ancestor_attrs, _, _ in reversed(self._stack):
+            if remaining < 0:
+                break
+            if compound_matches(compounds[remaining], ancestor_tag, ancestor_attrs):
+                remaining -= 1
+        return remaining < 0
+    
+    def _pop(self):
+        tag, _, captures, struck = self._stack.pop()
+        if captures:
+            closing = {id(capture) for capture in captures}
+            self._captures = [capture for capture in self._captures if id(capture) not in closing]
+        for capture in captures:
+            self._selected[capture['selector']][capture['index']] = ScannedElement(''.join(capture['parts']), capture['offset'])
+        if tag == 'template':
+            self._hidden -= 1
+        if tag in ('script', 'style') and self._script is not None:
+            text, self._script = ''.join(self._script), None
+            # The body's own element has already been popped
+            self._text_node(text, None, (len(self._stack) + 1, struck))
+            if tag == 'script':
+                for pattern, per_script in self._script_matches.items():
+                    per_script.append(pattern.findall(text))
+    
+    def _text_node(self, text, offset, features=None):
+        for contains, nodes in self._text_nodes.items():
+            if text and contains in text:
+                nodes.append((text,) + (features or self._features()) + (offset,))
+    
+    def _match_text(self, pattern, data, final=False):
+        """Run findall over the page text incrementally, holding back a short tail"""
+        pending = self._pending[pattern] + data
+        base = self._offset - len(pending)
+        limit = len(pending) if final else len(pending) - SCAN_MATCH_TAIL
+        keep_from = 0
+        for match in pattern.finditer(pending):
+            if match.end() > limit:
+                # May still grow with the next text; look at it again then
+                keep_from = match.start()
+                break
+            start = base + match.start()
+            depth, struck = self._span_features[bisect_right(self._span_starts, start) - 1]
+            self._candidates[pattern].append((findall_value(match), depth, struck, start))
+            keep_from = match.end()
+        else:
+            keep_from = max(keep_from, limit)
+        self._pending[pattern] = pending[keep_from:]
+    
+    def _prune_spans(self):
+        """Forget text spans that every pattern has already scanned past"""
+        oldest = min(self._offset - len(pending) for pending in self._pending.values())
+        cut = bisect_right(self._span_starts, oldest) - 1
+        if cut > 0:
+            del self._span_starts[:cut]
+            del self._span_features[:cut]
+
+def scan_page(content, site):
+    """Stream page bytes through a PageScanner in fetch-sized chunks"""
+    scanner = PageScanner(site)
+    for start in range(0, len(content), STREAM_CHUNK_SIZE):
+        scanner.feed_bytes(content[start:start + STREAM_CHUNK_SIZE])
+    return scanner.finish()
+
+# HTML parser backends
+PARSER_FALLBACK = 'html.parser'
+PARSER_BACKEND = os.environ.get('PARSER_BACKEND', 'lxml')
+PARSER_DEMOTE_AFTER = 3
+
+# Sites whose selectors only hold up under a particular parser
+SITE_PARSER_BACKENDS = {}
+
+class ParserBackends:
+    """Chooses the BeautifulSoup tree builder used to parse each site's pages.
+    
+    Pages are parsed with PARSER_BACKEND (lxml when installed) unless the site
+    has an override. The 'stream' backend skips the tree entirely and scans
+    the page in one pass with a PageScanner. When the chosen backend finds no
+    price, or only a page-wide guess from the site's fallback steps, html.parser
+    gives the answer instead; each time the two differ the rescue is counted,
+    and after PARSER_DEMOTE_AFTER rescues the site is switched to html.parser
+    for good.
+    """
+    
+    def __init__(self, default=PARSER_BACKEND, site_backends=SITE_PARSER_BACKENDS):
+        self.default = default if self.is_available(default) else PARSER_FALLBACK
+        self.site_backends = dict(site_backends)
+        self._lock = threading.Lock()
+        self._parses = {}
+        self._rescues = {}
+        self._skipped = {}
+    
+    @staticmethod
+    def is_available(backend):
+        if backend == STREAM_BACKEND:
+            return True
+        try:
+            BeautifulSoup('<html></html>', backend)
+            return True
+        except FeatureNotFound:
+            return False
+    
+    def choose(self, site):
+        with self._lock:
+            return self.site_backends.get(site, self.default)
+    
+    def parse(self, content, backend):
+        with self._lock:
+            self._parses[backend] = self._parses.get(backend, 0) + 1
+        return BeautifulSoup(content, backend)
+    
+    def page(self, content, backend, site):
+        """Parse content into the page object the site rules read"""
+        if backend != STREAM_BACKEND:
+            return PageView(self.parse(content, backend))
+        with self._lock:
+            self._parses[backend] = self._parses.get(backend, 0) + 1
+        return scan_page(content, site)
+    
+    def record_skip(self, source):
+        """Note a page answered from its raw bytes without being parsed"""
+        with self._lock:
+            self._skipped[source] = self._skipped.get(source, 0) + 1
+    
+    def record_rescue(self, site):
+        """Note that html.parser's price differed from the one the site's backend found"""
+        with self._lock:
+            rescues = self._rescues[site] = self._rescues.get(site, 0) + 1
+            if rescues >= PARSER_DEMOTE_AFTER and self.site_backends.get(site) != PARSER_FALLBACK:
+                print(f"Switching {site} to {PARSER_FALLBACK} after {rescues} parser fallbacks")
+                self.site_backends[site] = PARSER_FALLBACK
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'default': self.default,
+                'site_overrides': dict(self.site_backends),
+                'parses': dict(self._parses),
+                'rescues': dict(self._rescues),
+                'skipped': dict(self._skipped),
+            }
 
-def scrape_meesho_price(soup, url):
-    """Scrape price from Meesho pages"""
-    price_elem = soup.select_one('[class*="Price"]') or soup.select_one('[class*="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 50000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+parser_backends = ParserBackends()
 
-def scrape_snapdeal_price(soup, url):
-    """Scrape price from Snapdeal pages"""
-    price_elem = soup.select_one('.pdp-final-price') or soup.select_one('[class*="price"]') or soup.select_one('.sp-info')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+# Structured product data (JSON-LD, OpenGraph/product meta tags, microdata)
+STRUCTURED_DATA = os.environ.get('STRUCTURED_DATA', 'true').lower() == 'true'
 
-def scrape_tatacliq_price(soup, url):
-    """Scrape price from Tata CLiQ pages"""
-    price_elem = soup.select_one('[class*="pdp-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+CURRENCY_SYMBOLS = {'INR': '₹', 'USD': '$', 'GBP': '£', 'EUR': '€'}
 
-def scrape_reliancedigital_price(soup, url):
-    """Scrape price from Reliance Digital pages"""
-    price_elem = soup.select_one('[class*="pdp__price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+class StructuredDataExtractor:
+    """Reads price and currency from a page's structured product data.
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
+    Works on the raw response bytes with a few regexes, so pages that publish
+    a schema.org Product/Offer block, product:price meta tags or an
+    itemprop="price" attribute are answered without building a soup.
+    Sources are tried in that order and each hit or miss is counted per site.
+    """
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
-
-def scrape_croma_price(soup, url):
-    """Scrape price from Croma pages"""
-    price_elem = soup.select_one('[class*="pdp-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    LD_JSON_PATTERN = re.compile(rb'<script[^>]+type\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script>', re.I | re.S)
+    META_TAG_PATTERN = re.compile(rb'<meta\b[^>]*>', re.I)
+    ITEMPROP_PATTERN = re.compile(rb'<[a-z][^>]*\bitemprop\s*=\s*["\']?(price|priceCurrency)\b[^>]*>([^<]*)', re.I)
+    ATTR_PATTERN = re.compile(rb'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+    HEAD_END = re.compile(rb'</head\s*>', re.I)
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
+    PRICE_META = (b'product:price:amount', b'og:price:amount')
+    CURRENCY_META = (b'product:price:currency', b'og:price:currency')
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
     
-    return None
-
-def scrape_nykaa_price(soup, url):
-    """Scrape price from Nykaa pages"""
-    price_elem = soup.select_one('[class*="pdp-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    def extract(self, content, site):
+        """Return (price, currency or None, source) or None when the page has no usable data"""
+        for source, reader in (('json-ld', self._from_json_ld), ('meta', self._from_meta), ('microdata', self._from_microdata)):
+            try:
+                found = reader(content)
+            except Exception as e:
+                print(f"Structured data ({source}) failed for {site}: {str(e)}")
+                found = None
+            if found and found[0] is not None:
+                self._record(site, source)
+                return found + (source,)
+        self._record(site, 'none')
+        return None
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 100000:
-            all_prices.append(price)
+    def _record(self, site, source):
+        with self._lock:
+            counts = self._stats.setdefault(site, {})
+            counts[source] = counts.get(source, 0) + 1
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    @classmethod
+    def _attrs(cls, tag):
+        return {
+            name.decode().lower(): html.unescape((double or single or bare).decode('utf-8', 'replace'))
+            for name, double, single, bare in cls.ATTR_PATTERN.findall(tag)
+        }
     
-    return None
-
-def scrape_shopsy_price(soup, url):
-    """Scrape price from Shopsy pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.final-price') or soup.select_one('[class*="Price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    @staticmethod
+    def _types(node):
+        types = node.get('@type', [])
+        return types if isinstance(types, list) else [types]
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 50000:
-            all_prices.append(price)
+    def _from_json_ld(self, content):
+        for payload in self.LD_JSON_PATTERN.findall(content):
+            try:
+                data = json.loads(payload.decode('utf-8', 'replace'), strict=False)
+            except ValueError:
+                continue
+            # Only top-level nodes and @graph members; nested lists hold related products
+            nodes = data if isinstance(data, list) else [data]
+            nodes = [node for node in nodes if isinstance(node, dict)]
+            for node in list(nodes):
+                if isinstance(node.get('@graph'), list):
+                    nodes.extend(member for member in node['@graph'] if isinstance(member, dict))
+            for node in nodes:
+                types = self._types(node)
+                if 'Product' in types or 'ProductGroup' in types:
+                    offers = node.get('offers')
+                elif 'Offer' in types or 'AggregateOffer' in types:
+                    offers = node
+                else:
+                    continue
+                for offer in offers if isinstance(offers, list) else [offers]:
+                    if not isinstance(offer, dict):
+                        continue
+                    spec = offer.get('priceSpecification')
+                    spec = spec[0] if isinstance(spec, list) and spec else spec
+                    spec = spec if isinstance(spec, dict) else {}
+                    price = parse_price(offer.get('price') or offer.get('lowPrice') or spec.get('price'))
+                    if price is not None:
+                        currency = offer.get('priceCurrency') or spec.get('priceCurrency')
+                        return price, currency
+        return None
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def _from_meta(self, content):
+        head_end = self.HEAD_END.search(content)
+        head = content[:head_end.start()] if head_end else content
+        values = {}
+        for tag in self.META_TAG_PATTERN.findall(head):
+            attrs = self._attrs(tag)
+            key = (attrs.get('property') or attrs.get('name') or '').encode()
+            if key and 'content' in attrs:
+                values.setdefault(key, attrs['content'])
+        price = next((parse_price(values[key]) for key in self.PRICE_META if key in values), None)
+        if price is None:
+            return None
+        currency = next((values[key] for key in self.CURRENCY_META if key in values), None)
+        return price, currency
+    
+    def _from_microdata(self, content):
+        price = currency = None
+        for tag_match in self.ITEMPROP_PATTERN.finditer(content):
+            prop = tag_match.group(1).lower()
+            attrs = self._attrs(tag_match.group(0)[:tag_match.start(2) - tag_match.start()])
+            value = attrs.get('content') or html.unescape(tag_match.group(2).decode('utf-8', 'replace')).strip()
+            if prop == b'price' and price is None:
+                price = parse_price(value)
+            elif prop == b'pricecurrency' and currency is None:
+                currency = value or None
+            if price is not None and currency is not None:
+                break
+        return (price, currency) if price is not None else None
+    
+    def stats(self):
+        with self._lock:
+            return {site: dict(counts) for site, counts in self._stats.items()}
+
+structured_data = StructuredDataExtractor()
+
+# Byte patterns that pin down the main price on pages whose markup is stable.
+# Each site's 'markers' match every element or script value its first
+# SITE_RULES step could read, and the prescan only answers when exactly one
+# marker occurs in the page: with a single candidate, neither the selector
+# order (which adapts to recent hits) nor document order can change what the
+# rules pick. 'patterns' then read that candidate the way the rule does, so
+# an element only counts when its whole text sits directly inside it.
+# Ranges read as in SITE_RULES; 'in_script' requires the match to be inside
+# a <script>, and 'parse': 'float' reads the value the way the scripts step does.
+SITE_PRESCAN_PATTERNS = {
+    'amazon': {
+        'markers': [rb'priceblock_(?:our|deal|sale)price\b', rb'a-offscreen'],
+        'patterns': [
+            rb'<(?P<tag>\w+)[^>]*\sid="priceblock_(?:our|deal|sale)price"[^>]*>(?P<price>[^<]+)</(?P=tag)>',
+            rb'\sclass="(?:[^"]*\s)?a-price(?:\s[^"]*)?"[^>]*>\s*<span class="a-offscreen">(?P<price>[^<]+)</span>',
+        ],
+        'range': (200, None), 'inclusive': True,
+    },
+    'flipkart': {
+        'markers': [rb'_30jeq3\b', rb'(?i:data-testid)=["\']?price\b', rb'_16P6d\b', rb'_3I9_wc\b', rb'_3OtPd\b'],
+        'patterns': [rb'<div class="(?:[^"]*\s)?_30jeq3(?:\s[^"]*)?"[^>]*>(?P<price>[^<]+)</div>'],
+        'range': (200, None), 'inclusive': True,
+    },
+    'myntra': {
+        'markers': [rb'sellingPrice["\']?\s*:\s*[\d.]+', rb'"sp"\s*:\s*[\d.]+', rb'(?i:discountedPrice|offerPrice|finalPrice|fp)["\']?\s*:\s*[\d.]+'],
+        'patterns': [rb'sellingPrice["\']?\s*:\s*(?P<price>[\d.]+)'],
+        'range': (200, 100000), 'in_script': True, 'parse': 'float',
+    },
+    'bestbuy': {
+        'markers': [rb'buybox-price', rb'priceView-customer-price', rb'priceView-price', rb'(?i:itemprop)=["\']?price\b', rb'(?i:class)=["\']?(?:[^"\'>]*\s)?price[\s"\'>]'],
+        'patterns': [rb'\sclass="(?:[^"]*\s)?priceView-customer-price(?:\s[^"]*)?"[^>]*>\s*<span[^>]*>(?P<price>[^<]+)</span>'],
+        'range': (10, 10000),
+    },
+}
+
+class PricePrescan:
+    """Looks for a site's price marker in the raw bytes before any parsing.
+    
+    Markers and patterns are compiled once per site. A page is only read
+    when exactly one marker occurs in it, and a match only counts when the
+    value parses and falls in the site's range; anything else moves on to
+    the structured data and DOM stages.
+    """
+    
+    def __init__(self, patterns=SITE_PRESCAN_PATTERNS):
+        self.patterns = {
+            site: dict(
+                entry,
+                markers=re.compile(b'|'.join(b'(?:' + marker + b')' for marker in entry['markers'])),
+                patterns=[re.compile(pattern) for pattern in entry['patterns']],
+            )
+            for site, entry in patterns.items()
+        }
+        self._lock = threading.Lock()
+        self._stats = {}
+    
+    @staticmethod
+    def _single_marker(entry, content):
+        markers = entry['markers'].finditer(content)
+        return next(markers, None) is not None and next(markers, None) is None
+    
+    @staticmethod
+    def _in_script(content, position):
+        return content.rfind(b'<script', 0, position) > content.rfind(b'</script', 0, position)
+    
+    def _read(self, entry, content):
+        for pattern in entry['patterns']:
+            match = pattern.search(content)
+            if not match:
+                continue
+            if entry.get('in_script') and not self._in_script(content, match.start()):
+                return None
+            text = html.unescape(match.group('price').decode('utf-8', 'replace'))
+            if entry.get('parse') == 'float':
+                try:
+                    value = float(text)
+                except ValueError:
+                    return None
+            else:
+                value = parse_price(text.strip())
+            return value if price_in_range(value, entry['range'], entry.get('inclusive', False)) else None
+        return None
     
-    return None
+    def scan(self, content, site):
+        """Return the price found next to a page's only marker, or None"""
+        entry = self.patterns.get(site)
+        if not entry:
+            return None
+        price = self._read(entry, content) if self._single_marker(entry, content) else None
+        with self._lock:
+            counts = self._stats.setdefault(site, {'scanned': 0, 'hits': 0})
+            counts['scanned'] += 1
+            if price is not None:
+                counts['hits'] += 1
+        return price
+    
+    def stats(self):
+        with self._lock:
+            return {
+                site: dict(counts, hit_rate=round(counts['hits'] / counts['scanned'], 3))
+                for site, counts in self._stats.items()
+            }
 
-def scrape_firstcry_price(soup, url):
-    """Scrape price from FirstCry pages"""
-    price_elem = soup.select_one('[class*="selling-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 50000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+price_prescan = PricePrescan()
 
-def scrape_pepperfry_price(soup, url):
-    """Scrape price from Pepperfry pages"""
-    price_elem = soup.select_one('[class*="selling-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+# Rule steps that guess from the whole page rather than a known price element
+PAGE_WIDE_STEPS = {'most_common', 'text_nodes', 'first_match'}
 
-def scrape_urbanladder_price(soup, url):
-    """Scrape price from Urban Ladder pages"""
-    price_elem = soup.select_one('[class*="selling-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+def extract_price(content, url, site, currency, symbol):
+    """Parse a fetched page and extract the price, returning the scrape_price tuple"""
+    price = price_prescan.scan(content, site)
+    if price is not None:
+        print(f"  → Found price from prescan: {price}")
+        parser_backends.record_skip('prescan')
+        return price, site, currency, symbol, None
     
-    return None
-
-def scrape_bigbasket_price(soup, url):
-    """Scrape price from BigBasket pages"""
-    price_elem = soup.select_one('[class*="sp"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    if STRUCTURED_DATA:
+        found = structured_data.extract(content, site)
+        if found:
+            price, page_currency, source = found
+            page_currency = (page_currency or '').upper()
+            if page_currency in CURRENCY_SYMBOLS:
+                currency, symbol = page_currency, CURRENCY_SYMBOLS[page_currency]
+            print(f"  → Found price from {source}: {price}")
+            parser_backends.record_skip('structured_data')
+            return price, site, currency, symbol, None
+    
+    backend = parser_backends.choose(site)
+    price = step = None
+    try:
+        page = parser_backends.page(content, backend, site)
+        price, step = rule_engine.extract_step(page, site)
+    except Exception as e:
+        if backend == PARSER_FALLBACK:
+            return None, site, currency, symbol, f"Failed to parse page: {str(e)}"
+        print(f"Parser {backend} failed for {site}: {str(e)}")
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 10 < price < 10000:
-            all_prices.append(price)
+    if backend != PARSER_FALLBACK and (not price or step in PAGE_WIDE_STEPS):
+        # Faster parsers can build a slightly different tree, so a price missed by
+        # the site's targeted steps gets html.parser's answer instead of a page-wide guess
+        try:
+            page = parser_backends.page(content, PARSER_FALLBACK, site)
+        except Exception as e:
+            if price:
+                return price, site, currency, symbol, None
+            return None, site, currency, symbol, f"Failed to parse page: {str(e)}"
+        reference = scrape_site_price(page, url, site)
+        if reference != price:
+            parser_backends.record_rescue(site)
+        price = reference
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    if price:
+        return price, site, currency, symbol, None
     
-    return None
+    return None, site, currency, symbol, f"Could not extract price from {site}. The site may have changed its structure."
 
-def scrape_jiomart_price(soup, url):
-    """Scrape price from JioMart pages"""
-    price_elem = soup.select_one('[class*="selling-price"]') or soup.select_one('[class*="price"]') or soup.select_one('.final-price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+def scrape_site_price(page, url, site):
+    """Run the site's price extraction rules over a parsed page"""
+    return rule_engine.extract(page, site)
 
-def scrape_oneplus_price(soup, url):
-    """Scrape price from OnePlus pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.final-price') or soup.select_one('[class*="Price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 500 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+# Scrape result cache
+PRICE_CACHE_SIZE = int(os.environ.get('PRICE_CACHE_SIZE', '2000'))
+PRICE_CACHE_TTL = float(os.environ.get('PRICE_CACHE_TTL', '900'))
 
-def scrape_vijaysales_price(soup, url):
-    """Scrape price from Vijay Sales pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.final-price') or soup.select_one('[class*="Price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 100000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+# Sites whose prices move often enough to need a shorter cache lifetime
+PRICE_CACHE_SITE_TTL = {
+    'amazon': 300,
+    'flipkart': 300,
+    'myntra': 600,
+    'ajio': 600,
+}
 
-def scrape_ebay_price(soup, url):
-    """Scrape price from eBay pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.vi-price') or soup.select_one('[itemprop="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€₹]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+# Query parameters that only track the visitor and never change the product
+TRACKING_PARAMS = {'tag', 'ref', 'ref_', 'affid', 'affextparam1', 'gclid', 'fbclid', 'srsltid', 'psc', 'smid', 'linkcode', 'cmpid', 'otracker', 'lid', 'marketplace', 'store', 'spm'}
 
-def scrape_aliexpress_price(soup, url):
-    """Scrape price from AliExpress pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.product-price') or soup.select_one('[class*="current-price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$€£]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 1000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+def canonicalize_url(url):
+    """Normalize a product URL so the same product always maps to the same key"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        # Malformed; the URL as given is the best key there is
+        return url.strip()
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+    path = parsed.path.rstrip('/') or '/'
+    return urlunparse((parsed.scheme.lower() or 'https', parsed.netloc.lower(), path, '', urlencode(query), ''))
+
+# Where each site keeps its product id in a URL's path or query. Every group a
+# pattern captures goes into the key, so Flipkart variants (pid) stay apart.
+PRODUCT_ID_PATTERNS = {
+    site: [re.compile(pattern, re.I) for pattern in patterns]
+    for site, patterns in {
+        'amazon': [r'/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|o/asin)/([A-Z0-9]{10})(?:[/?]|$)'],
+        'flipkart': [r'/p/(itm[a-z0-9]+)(?:\?(?:.*&)?pid=([A-Z0-9]{16})(?:&|$))?'],
+        'shopsy': [r'/p/(itm[a-z0-9]+)(?:\?(?:.*&)?pid=([A-Z0-9]{16})(?:&|$))?'],
+        'myntra': [r'/(\d{5,})(?:/buy)?(?:\?|$)'],
+        'ajio': [r'/p/(\w+)'],
+        'meesho': [r'/p/(\w+)'],
+        'snapdeal': [r'/product/[^/]+/(\d+)'],
+        'tatacliq': [r'/p-(mp\d+)'],
+        'nykaa': [r'/p/(\d+)'],
+        'ebay': [r'/itm/(?:[^/?]+/)?(\d+)'],
+        'aliexpress': [r'/item/(\d+)\.html'],
+        'walmart': [r'/ip/(?:[^/?]+/)?(\d+)'],
+        'bestbuy': [r'[?&]skuid=(\d+)', r'/(\d{7})\.p'],
+        'target': [r'/a-(\d+)'],
+        'etsy': [r'/listing/(\d+)'],
+    }.items()
+}
+
+@lru_cache(maxsize=4096)
+def product_key(url):
+    """Stable identity of the product a URL points to, e.g. 'amazon.in:B09G9HD6GF'.
+    
+    Different URL shapes, tracking parameters and affiliate tags for one
+    product give the same key. URLs without a recognised product id (short
+    links, unknown sites) fall back to their canonical URL.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    canonical = canonicalize_url(url)
+    try:
+        parsed = urlparse(canonical)
+        host = (parsed.hostname or '').rstrip('.')
+    except ValueError:
+        return canonical
+    site = resolve_site_host(host)[0]
+    target = parsed.path + ('?' + parsed.query if parsed.query else '')
+    for pattern in PRODUCT_ID_PATTERNS.get(site, []):
+        match = pattern.search(target)
+        if match:
+            # Keep the marketplace: amazon.in and amazon.com list the same ASIN at different prices
+            labels = host.split('.')
+            start = next((i for i, label in enumerate(labels) if SITE_LABELS.get(label) == site), 0)
+            product_id = ':'.join(group for group in match.groups() if group)
+            if site == 'amazon':
+                product_id = product_id.upper()
+            return f"{'.'.join(labels[start:])}:{product_id}"
+    return canonical
+
+def rekey_products(conn):
+    """Recompute the product keys stored with alerts and their price history"""
+    for alert in conn.execute('SELECT id, url, product_key FROM alerts').fetchall():
+        key = product_key(alert['url'])
+        if key != alert['product_key']:
+            conn.execute('UPDATE alerts SET product_key = ? WHERE id = ?', (key, alert['id']))
+            conn.execute('UPDATE price_history SET product_key = ? WHERE alert_id = ?', (key, alert['id']))
+
+# Data migrations, applied in order and once per database; PRAGMA user_version counts those applied
+DB_MIGRATIONS = [
+    # Flipkart and Shopsy keys gained the variant's pid
+    rekey_products,
+]
 
-def scrape_walmart_price(soup, url):
-    """Scrape price from Walmart pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('[data-automation="product-price"]') or soup.select_one('.price-characteristic')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'\$\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+def migrate_db():
+    """Apply the DB_MIGRATIONS this database has not had yet"""
+    conn = get_db_connection()
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(DB_MIGRATIONS):
+            return
+        # Another process may be migrating too; look again holding the write lock
+        conn.execute('BEGIN IMMEDIATE')
+        applied = conn.execute('PRAGMA user_version').fetchone()[0]
+        for version, migration in enumerate(DB_MIGRATIONS[applied:], start=applied + 1):
+            print(f"Applying database migration {version}: {migration.__name__}")
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    finally:
+        conn.close()
 
-def scrape_bestbuy_price(soup, url):
-    """Scrape price from BestBuy pages"""
-    # Try multiple specific selectors for BestBuy
-    price_elem = soup.select_one('[data-automation="buybox-price"]') or \
-                 soup.select_one('.priceView-customer-price span') or \
-                 soup.select_one('.priceView-price') or \
-                 soup.select_one('[itemprop="price"]') or \
-                 soup.select_one('.price')
-    
-    if price_elem:
-        price_text = price_elem.get_text().strip()
-        price = parse_price(price_text)
-        if price and price > 10 and price < 10000:  # Reasonable range for electronics
-            print(f"  → Found price from BestBuy: ${price}")
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'\$[\s,]*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 50 < price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        price_counts = Counter(all_prices)
-        # Return most common price that's reasonable
-        for p, count in price_counts.most_common(5):
-            if 50 < p < 10000:
-                print(f"  → BestBuy fallback price: ${p}")
-                return p
-    
-    print("  → No valid price found for BestBuy")
-    return None
+migrate_db()
+
+class PriceCache:
+    """Size-bounded LRU cache of scrape_price results keyed on product_key.
+    
+    Entries expire after the site's TTL, but are kept until evicted so callers
+    that pass a larger max_age can still accept a slightly stale price.
+    Only successful scrapes are cached.
+    """
+    
+    def __init__(self, size=PRICE_CACHE_SIZE, default_ttl=PRICE_CACHE_TTL, site_ttl=PRICE_CACHE_SITE_TTL):
+        self.size = size
+        self.default_ttl = default_ttl
+        self.site_ttl = site_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, url, max_age=None):
+        key = product_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, stored_at = entry
+                allowed_age = max_age if max_age is not None else self.site_ttl.get(result[1], self.default_ttl)
+                if time.time() - stored_at <= allowed_age:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+    
+    def peek(self, url):
+        """Return the cached result for url regardless of age, without counting a lookup"""
+        with self._lock:
+            entry = self._entries.get(product_key(url))
+            return entry[0] if entry else None
+    
+    def put(self, url, result):
+        # Failures and last-known fallbacks (which carry an error notice) are not cached
+        if result[0] is None or result[4]:
+            return
+        key = product_key(url)
+        with self._lock:
+            self._entries[key] = (result, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
 
-def scrape_target_price(soup, url):
-    """Scrape price from Target pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('[data-test="product-price"]') or soup.select_one('.price')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'\$\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+price_cache = PriceCache()
+
+VALIDATOR_CACHE_SIZE = int(os.environ.get('VALIDATOR_CACHE_SIZE', '5000'))
+
+class ValidatorCache:
+    """Remembers ETag/Last-Modified validators and the last extracted result per URL.
+    
+    Rechecks send them as If-None-Match/If-Modified-Since, and a 304 answer
+    reuses the stored result without downloading or parsing the page.
+    """
+    
+    def __init__(self, size=VALIDATOR_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.not_modified = 0
+        self.full_fetches = 0
+    
+    def get(self, url):
+        """Return {'headers': conditional request headers, 'result': last result} or None"""
+        with self._lock:
+            return self._entries.get(canonicalize_url(url))
+    
+    def store(self, url, response, result):
+        if result[0] is None:
+            return
+        headers = {}
+        if response.headers.get('ETag'):
+            headers['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        if not headers:
+            return
+        key = canonicalize_url(url)
+        with self._lock:
+            self._entries[key] = {'headers': headers, 'result': result}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+    
+    def record(self, not_modified):
+        with self._lock:
+            if not_modified:
+                self.not_modified += 1
+            else:
+                self.full_fetches += 1
     
-    return None
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'not_modified': self.not_modified, 'full_fetches': self.full_fetches}
 
-def scrape_etsy_price(soup, url):
-    """Scrape price from Etsy pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('[itemprop="price"]') or soup.select_one('.currency-value')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 5000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+validator_cache = ValidatorCache()
 
-def scrape_newegg_price(soup, url):
-    """Scrape price from Newegg pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[itemprop="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'\$\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
-    
-    return None
+EXTRACT_MEMO_SIZE = int(os.environ.get('EXTRACT_MEMO_SIZE', '5000'))
 
-def scrape_shein_price(soup, url):
-    """Scrape price from Shein pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.salePrice') or soup.select_one('[class*="current-price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+# Per-request tokens that change on every load without changing the product
+VOLATILE_PATTERNS = [
+    rb'nonce="[^"]*"',
+    rb'(?i)(name="(?:csrf[-_]?token|_csrf|authenticity_token)"\s+(?:content|value)=")[^"]*"',
+    rb'(?i)("(?:csrfToken|requestId|traceId)"\s*:\s*")[^"]*"',
+]
+
+SITE_VOLATILE_PATTERNS = {
+    'amazon': [rb"ue_id\s*=\s*'[^']*'", rb'ue_sid\s*=\s*\'[^\']*\'', rb'"sessionId"\s*:\s*"[^"]*"'],
+    'flipkart': [rb'"(?:visitId|requestId)"\s*:\s*"[^"]*"'],
+    'myntra': [rb'"(?:x-request-id|serverTime)"\s*:\s*"?[\w.:-]*"?'],
+}
+
+class ExtractionMemo:
+    """Remembers the extraction result for each page body fingerprint.
+    
+    The fingerprint is a BLAKE2 hash of the body after volatile tokens are
+    blanked out, so a page that comes back unchanged skips parsing even when
+    its URL's price cache entry has expired. Bounded LRU; only successful
+    extractions are kept.
+    """
+    
+    def __init__(self, size=EXTRACT_MEMO_SIZE, common=VOLATILE_PATTERNS, site_patterns=SITE_VOLATILE_PATTERNS):
+        self.size = size
+        self.common = [re.compile(pattern) for pattern in common]
+        self.site_patterns = {
+            site: [re.compile(pattern) for pattern in patterns]
+            for site, patterns in site_patterns.items()
+        }
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {}
+    
+    def fingerprint(self, content, site):
+        for pattern in self.common + self.site_patterns.get(site, []):
+            # Keep any prefix group so the attribute name still counts
+            content = pattern.sub(lambda m: m.group(1) if pattern.groups else b'', content)
+        return site, hashlib.blake2b(content, digest_size=16).digest()
+    
+    def get(self, fingerprint):
+        site = fingerprint[0]
+        with self._lock:
+            counts = self._stats.setdefault(site, {'hits': 0, 'misses': 0})
+            result = self._entries.get(fingerprint)
+            if result is None:
+                counts['misses'] += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            counts['hits'] += 1
+            return result
+    
+    def put(self, fingerprint, result):
+        if result[0] is None:
+            return
+        with self._lock:
+            self._entries[fingerprint] = result
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'sites': {
+                    site: dict(counts, hit_rate=round(counts['hits'] / (counts['hits'] + counts['misses']), 3))
+                    for site, counts in self._stats.items()
+                },
+            }
+
+extraction_memo = ExtractionMemo()
+
+class SingleFlight:
+    """Coalesces concurrent scrapes of the same key into one in-flight task.
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$€£]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 500:
-            all_prices.append(price)
+    Used only from the fetch engine loop, so it needs no locking. Every caller
+    gets the shared task's result or exception.
+    """
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def __init__(self):
+        self._in_flight = {}
+        self.started = 0
+        self.merged = 0
     
-    return None
+    async def run(self, key, coro_factory):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.started += 1
+        else:
+            self.merged += 1
+        # Shield so one caller giving up does not cancel the scrape for the rest
+        return await asyncio.shield(task)
+    
+    def stats(self):
+        return {'started': self.started, 'merged': self.merged, 'in_flight': len(self._in_flight)}
+
+single_flight = SingleFlight()
+
+# Optional worker processes for parsing and extraction
+PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', '0'))
+PARSE_QUEUE_LIMIT = int(os.environ.get('PARSE_QUEUE_LIMIT', str(max(PARSE_PROCESSES, 1) * 2)))
+
+class ParsePool:
+    """Runs page extraction in worker processes so it does not hold this process's GIL.
+    
+    With PARSE_PROCESSES=0 pages are parsed on the fetch engine thread pool
+    as before. Otherwise at most PARSE_QUEUE_LIMIT pages are queued or being
+    parsed at once; further scrapes wait on the engine loop for a slot, which
+    holds back their callers instead of piling page bodies up in memory.
+    Only the small result tuple comes back, so the parser and rule counters
+    kept by the workers do not show up in this process's stats.
+    Used only from the fetch engine loop.
+    """
+    
+    def __init__(self, processes=PARSE_PROCESSES, queue_limit=PARSE_QUEUE_LIMIT):
+        self.processes = processes
+        self.queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self.active = 0
+        self.submitted = 0
+        self.waited = 0
+        self.failures = 0
+    
+    def _ensure_started(self):
+        with self._lock:
+            # A forked process cannot use its parent's pool or loop-bound semaphore
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = None
+                self._slots = asyncio.Semaphore(self.queue_limit)
+            if self._executor is None:
+                # spawn, not fork: the parent is running the fetch engine's threads
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+    
+    async def run(self, func, *args):
+        """Run a picklable function on a worker process, or on the engine thread pool when disabled"""
+        if self.processes <= 0:
+            return await fetch_engine.run_blocking(func, *args)
+        
+        executor = self._ensure_started()
+        if self._slots.locked():
+            self.waited += 1
+        async with self._slots:
+            self.active += 1
+            self.submitted += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            except BrokenProcessPool as e:
+                # A worker died (killed or out of memory); start a fresh pool for later pages
+                print(f"Parse worker pool broke: {str(e)}")
+                self.failures += 1
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+            finally:
+                self.active -= 1
+        return await fetch_engine.run_blocking(func, *args)
+    
+    def stats(self):
+        return {
+            'processes': self.processes,
+            'queue_limit': self.queue_limit,
+            'active': self.active,
+            'submitted': self.submitted,
+            'waited': self.waited,
+            'failures': self.failures,
+        }
 
-def scrape_zara_price(soup, url):
-    """Scrape price from Zara pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[data-testid="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 1000:
-            all_prices.append(price)
+parse_pool = ParsePool()
+
+async def fetch_and_extract_price(url):
+    """Fetch a product page and extract its price, bypassing the result cache"""
+    site, currency, symbol = get_site_info(url)
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    # Revalidate instead of re-downloading when the last fetch gave us validators
+    validators = validator_cache.get(url)
+    response = await fetch_page_async(url, site, extra_headers=validators and validators['headers'])
     
-    return None
-
-def scrape_hm_price(soup, url):
-    """Scrape price from H&M pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[data-testid="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    if not response:
+        if circuit_breaker.is_open(limit_key(url, site)):
+            # The site is blocking us right now; fall back to the last price we saw,
+            # with a notice in the error slot so it is never taken for a fresh one
+            last_known = price_cache.peek(url) or (validators and validators['result'])
+            if last_known and last_known[0] is not None:
+                return last_known[0], site, currency, symbol, f"{site} is temporarily blocking price checks; this is the last price we saw."
+            return None, site, currency, symbol, f"{site} is temporarily blocking price checks. Please try again in a few minutes."
+        return None, site, currency, symbol, "Failed to fetch page after multiple attempts"
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 1000:
-            all_prices.append(price)
+    if response.status_code == 304:
+        validator_cache.record(not_modified=True)
+        return validators['result']
+    
+    validator_cache.record(not_modified=False)
+    # An unchanged page gives the same answer; skip parsing it again
+    fingerprint = await fetch_engine.run_blocking(extraction_memo.fingerprint, response.content, site)
+    result = extraction_memo.get(fingerprint)
+    if result is None:
+        result = await parse_pool.run(extract_price, response.content, url, site, currency, symbol)
+        extraction_memo.put(fingerprint, result)
+    validator_cache.store(url, response, result)
+    return result
+
+async def scrape_price_async(url, max_age=None):
+    """Async twin of scrape_price, run on the fetch engine loop"""
+    cached = price_cache.get(url, max_age)
+    if cached is not None:
+        return cached
+    
+    async def scrape_and_cache():
+        result = await fetch_and_extract_price(url)
+        price_cache.put(url, result)
+        return result
+    
+    # Concurrent checks of the same product share one fetch and parse
+    return await single_flight.run(product_key(url), scrape_and_cache)
+
+def scrape_price(url, max_age=None):
+    """Main function to scrape price from a URL.
+    
+    max_age (seconds) lets the caller accept a cached price up to that old
+    instead of the site's default cache lifetime; pass 0 to force a fresh fetch.
+    """
+    return fetch_engine.run(scrape_price_async(url, max_age))
+
+def record_product_price(conn, key, price):
+    """Write a scraped price to every active alert for the product.
+    
+    price_history gets a row for each alert whose price changed. Returns the
+    number of alerts updated; the caller commits.
+    """
+    alerts = conn.execute(
+        "SELECT id, current_price FROM alerts WHERE product_key = ? AND status = 'active'", (key,)
+    ).fetchall()
+    for alert in alerts:
+        conn.execute('UPDATE alerts SET current_price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (price, alert['id']))
+        if alert['current_price'] != price:
+            conn.execute('INSERT INTO price_history (alert_id, product_key, price) VALUES (?, ?, ?)', (alert['id'], key, price))
+    return len(alerts)
+
+# Background price checks for saved alerts
+ALERT_CHECK_INTERVAL = float(os.environ.get('ALERT_CHECK_INTERVAL', '900'))
+ALERT_MIN_INTERVAL = float(os.environ.get('ALERT_MIN_INTERVAL', '300'))
+ALERT_MAX_INTERVAL = float(os.environ.get('ALERT_MAX_INTERVAL', str(6 * 3600)))
+ALERT_CHECK_CONCURRENCY = int(os.environ.get('ALERT_CHECK_CONCURRENCY', '8'))
+ALERT_FETCHES_PER_MINUTE = float(os.environ.get('ALERT_FETCHES_PER_MINUTE', '30'))
+ALERT_SCHEDULER_TICK = 30
+# A price fetched this recently, by this process or (with SCRAPE_JOBS) by a worker, is good enough for a scheduled check
+ALERT_CHECK_MAX_AGE = 60
+# Days of price_history used to judge how often a product's price moves
+ALERT_VOLATILITY_DAYS = 7
+# Within this fraction above a target price, checks speed up (up to 4x at the target)
+ALERT_NEAR_TARGET = 0.10
+
+# Relative cost of one fetch per site; costly sites are checked less often
+SITE_FETCH_COST = {site: 2.0 for site in ANTI_BOT_SITES}
+
+class AlertScheduler:
+    """Keeps current_price of active alerts fresh without a browser tab open.
+    
+    Alerts are grouped by product_key so each product is scraped once, and
+    products wait in a priority queue keyed on their next due time. Each
+    product's interval starts at ALERT_CHECK_INTERVAL and is shortened when
+    its price_history shows frequent changes or its price is close to one of
+    its alerts' targets, and lengthened for sites in SITE_FETCH_COST, within
+    ALERT_MIN_INTERVAL..ALERT_MAX_INTERVAL. At most ALERT_FETCHES_PER_MINUTE
+    products are checked per minute overall, most overdue first, and at most
+    ALERT_CHECK_CONCURRENCY at a time. With SCRAPE_JOBS the checks are
+    queued for the scrape workers instead. Run one instance, via scheduler.py.
+    Its results reach the web service through the alerts table only; the
+    web process's price cache is separate.
+    """
+    
+    def __init__(self, interval=ALERT_CHECK_INTERVAL, concurrency=ALERT_CHECK_CONCURRENCY, fetches_per_minute=ALERT_FETCHES_PER_MINUTE):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.fetches_per_minute = fetches_per_minute
+        self._lock = threading.Lock()
+        self._queue = []
+        self._products = {}
+        self._tokens = fetches_per_minute
+        self._refilled = time.monotonic()
+        self.checked = 0
+        self.updated = 0
+        self.failed = 0
+        self.queued = 0
+    
+    def refresh(self):
+        """Bring the queue in line with the active rows of the alerts table"""
+        conn = get_db_connection()
+        try:
+            rows = conn.execute('''
+                SELECT id, url, product_key, target_price, current_price, CAST(strftime('%s', updated_at) AS REAL) AS updated_epoch
+                FROM alerts WHERE status = 'active'
+            ''').fetchall()
+            groups = {}
+            for row in rows:
+                key = row['product_key']
+                if key is None:
+                    # Alerts saved before product keys existed, and their history
+                    key = product_key(row['url'])
+                    conn.execute('UPDATE alerts SET product_key = ? WHERE id = ?', (key, row['id']))
+                    conn.execute('UPDATE price_history SET product_key = ? WHERE alert_id = ? AND product_key IS NULL', (key, row['id']))
+                groups.setdefault(key, []).append(row)
+            conn.commit()
+            with self._lock:
+                for key in list(self._products):
+                    if key not in groups:
+                        # Its queue entries are skipped when popped
+                        del self._products[key]
+                for key, alerts in groups.items():
+                    product = self._products.get(key)
+                    if product is not None:
+                        product['alerts'] = alerts
+                        continue
+                    product = self._products[key] = {'key': key, 'url': alerts[0]['url'], 'alerts': alerts}
+                    last_checked = max(alert['updated_epoch'] or 0 for alert in alerts)
+                    self._schedule(product, last_checked + self.interval_for(product, conn))
+        finally:
+            conn.close()
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def interval_for(self, product, conn):
+        """Seconds until the product should be checked again"""
+        # price_history gets rows per price change, so distinct change times per day measure volatility
+        changes = conn.execute('''
+            SELECT COUNT(DISTINCT recorded_at) FROM price_history
+            WHERE product_key = ? AND recorded_at >= datetime('now', ?)
+        ''', (product['key'], f'-{ALERT_VOLATILITY_DAYS} days')).fetchone()[0]
+        # The first recorded price is not a change
+        changes_per_day = max(changes - 1, 0) / ALERT_VOLATILITY_DAYS
+        
+        urgency = 1.0
+        for alert in product['alerts']:
+            price, target = alert['current_price'], alert['target_price']
+            if price and target and price > 0:
+                gap = max(price - target, 0) / price
+                urgency = max(urgency, 1 + 3 * max(0.0, 1 - gap / ALERT_NEAR_TARGET))
+        
+        cost = SITE_FETCH_COST.get(get_site_info(product['url'])[0], 1.0)
+        interval = self.interval * cost / ((1 + min(changes_per_day, 4)) * urgency)
+        return min(max(interval, ALERT_MIN_INTERVAL), ALERT_MAX_INTERVAL)
+    
+    def _schedule(self, product, due_at):
+        product['due_at'] = due_at
+        heapq.heappush(self._queue, (due_at, product['key']))
+    
+    def take_due(self):
+        """Pop the products that are due, as far as the fetch budget allows"""
+        now = time.monotonic()
+        with self._lock:
+            self._tokens = min(self.fetches_per_minute, self._tokens + (now - self._refilled) * self.fetches_per_minute / 60)
+            self._refilled = now
+            due = []
+            wall_now = time.time()
+            while self._queue and self._queue[0][0] <= wall_now and self._tokens >= 1:
+                due_at, key = heapq.heappop(self._queue)
+                product = self._products.get(key)
+                if product is None or product['due_at'] != due_at:
+                    continue
+                self._tokens -= 1
+                due.append(product)
+            return due
     
-    return None
-
-def scrape_adidas_price(soup, url):
-    """Scrape price from Adidas pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[itemprop="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    async def check_products(self, products):
+        slots = asyncio.Semaphore(self.concurrency)
+        
+        async def check(product):
+            async with slots:
+                try:
+                    result = await scrape_price_async(product['url'], ALERT_CHECK_MAX_AGE)
+                except Exception as e:
+                    result = (None, None, None, None, str(e))
+            await fetch_engine.run_blocking(self.store, product, result)
+        
+        await asyncio.gather(*(check(product) for product in products))
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 1000:
-            all_prices.append(price)
+    def store(self, product, result):
+        price, error = result[0], result[4]
+        conn = get_db_connection()
+        try:
+            if error or price is None:
+                print(f"Scheduled check failed for {product['url']}: {error}")
+                retry_in = max(ALERT_MIN_INTERVAL, self.interval_for(product, conn) / 4)
+                with self._lock:
+                    self.checked += 1
+                    self.failed += 1
+                    self._schedule(product, time.time() + retry_in)
+                return
+            
+            record_product_price(conn, product['key'], price)
+            conn.commit()
+            product['alerts'] = [dict(alert, current_price=price) for alert in product['alerts']]
+            interval = self.interval_for(product, conn)
+        finally:
+            conn.close()
+        with self._lock:
+            self.checked += 1
+            self.updated += 1
+            self._schedule(product, time.time() + interval)
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def queue_products(self, products):
+        """Hand products to the scrape workers, which write their prices back to the alerts"""
+        conn = get_db_connection()
+        try:
+            for product in products:
+                job_queue.enqueue(product['url'], ALERT_CHECK_MAX_AGE)
+                # Failed jobs are retried by the queue; the next refresh() sees the new prices
+                interval = self.interval_for(product, conn)
+                with self._lock:
+                    self.queued += 1
+                    self._schedule(product, time.time() + interval)
+        finally:
+            conn.close()
     
-    return None
-
-def scrape_nike_price(soup, url):
-    """Scrape price from Nike pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[itemprop="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    def run_once(self):
+        self.refresh()
+        products = self.take_due()
+        if products and SCRAPE_JOBS:
+            self.queue_products(products)
+            print(f"Queued {len(products)} products (tracking {len(self._products)}, total queued {self.queued})")
+        elif products:
+            started = time.monotonic()
+            fetch_engine.run(self.check_products(products))
+            print(f"Checked {len(products)} products in {time.monotonic() - started:.1f}s "
+                  f"(tracking {len(self._products)}, total checked {self.checked}, updated {self.updated}, failed {self.failed})")
+        return len(products)
+    
+    def run_forever(self):
+        print(f"Alert scheduler started: about every {self.interval:.0f}s per product, "
+              f"at most {self.fetches_per_minute:.0f} fetches a minute, {self.concurrency} at a time")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Alert scheduler error: {str(e)}")
+            time.sleep(ALERT_SCHEDULER_TICK)
+
+alert_scheduler = AlertScheduler()
+
+# Durable scrape jobs, run by worker.py processes
+SCRAPE_JOBS = os.environ.get('SCRAPE_JOBS', 'false').lower() == 'true'
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE = float(os.environ.get('JOB_RETRY_BASE', '30'))
+JOB_RETRY_MAX = 3600
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '8'))
+# How long /get-price waits for a worker before answering with the job id
+JOB_WAIT_SECONDS = float(os.environ.get('JOB_WAIT_SECONDS', '20'))
+JOB_POLL_INTERVAL = 0.25
+JOB_IDLE_SLEEP = 1.0
+# Finished jobs are kept this long, for status lookups and as a shared recent-price cache
+JOB_KEEP_SECONDS = 24 * 3600
+
+class JobQueue:
+    """Persistent queue of scrape jobs in the scrape_jobs table.
+    
+    Any number of worker processes on the database's machine claim due jobs
+    with a lease of JOB_LEASE_SECONDS and extend it while they work. A job
+    whose worker dies is claimed again once its lease expires. Failed scrapes
+    are retried with exponential backoff from JOB_RETRY_BASE, up to
+    JOB_MAX_ATTEMPTS claims. Successful results are written back to every
+    active alert for the job's product.
+    """
+    
+    def __init__(self, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS, retry_base=JOB_RETRY_BASE):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.claimed = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost_leases = 0
+    
+    def enqueue(self, url, max_age=None):
+        """Queue a scrape of url and return the job id.
+        
+        A product already queued or being scraped is not queued twice, and a
+        job finished within max_age seconds is returned as it is.
+        """
+        key = product_key(url)
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            # Take the write lock before looking, so two processes cannot both queue the product
+            conn.execute('BEGIN IMMEDIATE')
+            existing = conn.execute('''
+                SELECT id FROM scrape_jobs WHERE product_key = ? AND status IN ('queued', 'running')
+                ORDER BY id LIMIT 1
+            ''', (key,)).fetchone()
+            if existing is None and max_age is not None:
+                existing = conn.execute('''
+                    SELECT id FROM scrape_jobs WHERE product_key = ? AND status = 'done' AND finished_at >= ?
+                    ORDER BY finished_at DESC LIMIT 1
+                ''', (key, now - max_age)).fetchone()
+            if existing is not None:
+                with self._lock:
+                    self.deduplicated += 1
+                return existing['id']
+            cursor = conn.execute(
+                'INSERT INTO scrape_jobs (url, product_key, max_age, run_after) VALUES (?, ?, ?, ?)',
+                (url, key, max_age, now)
+            )
+            conn.commit()
+            with self._lock:
+                self.enqueued += 1
+            return cursor.lastrowid
+        finally:
+            conn.close()
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 1000:
-            all_prices.append(price)
+    def get(self, job_id):
+        conn = get_db_connection()
+        try:
+            return conn.execute('SELECT * FROM scrape_jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def wait(self, job_id, timeout):
+        """Poll a job until it is done or failed; return its row, or None after timeout"""
+        for _, job in self.wait_many([job_id], timeout):
+            return job
+    
+    def wait_many(self, job_ids, timeout):
+        """Yield (job_id, row) as each job is done or failed, then (job_id, None) for any unfinished at timeout"""
+        deadline = time.monotonic() + timeout
+        waiting = list(dict.fromkeys(job_ids))
+        while waiting:
+            conn = get_db_connection()
+            try:
+                placeholders = ','.join('?' * len(waiting))
+                rows = {row['id']: row for row in conn.execute(f'SELECT * FROM scrape_jobs WHERE id IN ({placeholders})', waiting)}
+            finally:
+                conn.close()
+            for job_id in list(waiting):
+                job = rows.get(job_id)
+                if job is None or job['status'] in ('done', 'failed'):
+                    waiting.remove(job_id)
+                    yield job_id, job
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(JOB_POLL_INTERVAL)
+        for job_id in waiting:
+            yield job_id, None
     
-    return None
-
-def scrape_samsung_price(soup, url):
-    """Scrape price from Samsung pages"""
-    price_elem = soup.select_one('[class*="price"]') or soup.select_one('.price') or soup.select_one('[itemprop="price"]')
-    if price_elem:
-        price = parse_price(price_elem.get_text())
-        if price:
-            return price
+    def claim(self, worker_id, limit):
+        """Lease up to limit due jobs to worker_id and return them"""
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            # Hold the write lock throughout, so two workers can never claim the same job
+            conn.execute('BEGIN IMMEDIATE')
+            # Jobs whose last lease expired with no attempts left are given up
+            conn.execute('''
+                UPDATE scrape_jobs SET status = 'failed', error = 'Worker lease expired', lease_owner = NULL, finished_at = ?
+                WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+            ''', (now, now, self.max_attempts))
+            ids = [row['id'] for row in conn.execute('''
+                SELECT id FROM scrape_jobs
+                WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_expires < ?)
+                ORDER BY run_after LIMIT ?
+            ''', (now, now, limit))]
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(
+                f"UPDATE scrape_jobs SET status = 'running', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id IN ({placeholders})",
+                [worker_id, now + self.lease_seconds] + ids
+            )
+            # Only the jobs claimed now; the worker may still be running earlier ones
+            jobs = conn.execute(f'SELECT * FROM scrape_jobs WHERE id IN ({placeholders}) ORDER BY run_after', ids).fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.claimed += len(jobs)
+        return jobs
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$£€]\s*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and price < 10000:
-            all_prices.append(price)
+    def heartbeat(self, worker_id):
+        """Extend the leases of every job worker_id is running"""
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                "UPDATE scrape_jobs SET lease_expires = ? WHERE lease_owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, worker_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
     
-    if all_prices:
-        from collections import Counter
-        return Counter(all_prices).most_common(1)[0][0]
+    def finish(self, job, worker_id, result):
+        """Record a scrape result, write it back to alerts, or schedule a retry"""
+        price, site_name, currency, currency_symbol, error = result
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            if error or price is None:
+                if job['attempts'] >= self.max_attempts:
+                    cursor = conn.execute('''
+                        UPDATE scrape_jobs SET status = 'failed', error = ?, lease_owner = NULL, finished_at = ?
+                        WHERE id = ? AND lease_owner = ? AND status = 'running'
+                    ''', (error, now, job['id'], worker_id))
+                    outcome = 'failed'
+                else:
+                    backoff = min(self.retry_base * 2 ** (job['attempts'] - 1), JOB_RETRY_MAX)
+                    cursor = conn.execute('''
+                        UPDATE scrape_jobs SET status = 'queued', error = ?, lease_owner = NULL, run_after = ?
+                        WHERE id = ? AND lease_owner = ? AND status = 'running'
+                    ''', (error, now + backoff * random.uniform(0.5, 1.5), job['id'], worker_id))
+                    outcome = 'retried'
+            else:
+                cursor = conn.execute('''
+                    UPDATE scrape_jobs SET status = 'done', price = ?, site_name = ?, currency = ?, currency_symbol = ?,
+                        error = NULL, lease_owner = NULL, finished_at = ?
+                    WHERE id = ? AND lease_owner = ? AND status = 'running'
+                ''', (price, site_name, currency, currency_symbol, now, job['id'], worker_id))
+                outcome = 'completed'
+                if cursor.rowcount:
+                    record_product_price(conn, job['product_key'], price)
+            if not cursor.rowcount:
+                # The lease ran out and another worker owns the job now
+                outcome = 'lost_leases'
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
     
-    return None
-
-def scrape_apple_price(soup, url):
-    """Scrape price from Apple pages"""
-    # Try multiple specific selectors for Apple
-    price_elem = soup.select_one('[data-component="price"]') or \
-                 soup.select_one('.as-priceprice') or \
-                 soup.select_one('.price-value') or \
-                 soup.select_one('[itemprop="price"]') or \
-                 soup.select_one('[class*="price"]')
-    
-    if price_elem:
-        price_text = price_elem.get_text().strip()
-        price = parse_price(price_text)
-        if price and price > 50 and price < 10000:  # Reasonable range for Apple products
-            print(f"  → Found price from Apple: ${price}")
-            return price
+    def purge(self):
+        """Delete finished jobs older than JOB_KEEP_SECONDS"""
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                "DELETE FROM scrape_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - JOB_KEEP_SECONDS,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
     
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'\$[\s,]*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 100 < price < 10000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        price_counts = Counter(all_prices)
-        for p, count in price_counts.most_common(5):
-            if 100 < p < 10000:
-                print(f"  → Apple fallback price: ${p}")
-                return p
-    
-    print("  → No valid price found for Apple")
-    return None
+    def stats(self):
+        conn = get_db_connection()
+        try:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM scrape_jobs GROUP BY status').fetchall())
+        finally:
+            conn.close()
+        with self._lock:
+            return {
+                'by_status': counts,
+                'enqueued': self.enqueued,
+                'deduplicated': self.deduplicated,
+                'claimed': self.claimed,
+                'completed': self.completed,
+                'retried': self.retried,
+                'failed': self.failed,
+                'lost_leases': self.lost_leases,
+            }
 
-def scrape_mi_price(soup, url):
-    """Scrape price from Mi/Xiaomi pages"""
-    # Try multiple specific selectors for Mi/Xiaomi
-    price_elem = soup.select_one('[data-price]') or \
-                 soup.select_one('.price') or \
-                 soup.select_one('.product-price') or \
-                 soup.select_one('[itemprop="price"]') or \
-                 soup.select_one('[class*="price"]')
-    
-    if price_elem:
-        price_text = price_elem.get_text().strip()
-        price = parse_price(price_text)
-        if price and price > 20 and price < 5000:  # Reasonable range for Mi products
-            print(f"  → Found price from Mi: ${price}")
-            return price
-    
-    # Fallback: find most common reasonable price
-    all_prices = []
-    all_text = soup.get_text()
-    prices = re.findall(r'[\$€£₹][\s,]*([\d,]+\.?\d*)', all_text)
-    for price_str in prices:
-        price = parse_price(price_str)
-        if price and 30 < price < 5000:
-            all_prices.append(price)
-    
-    if all_prices:
-        from collections import Counter
-        price_counts = Counter(all_prices)
-        for p, count in price_counts.most_common(5):
-            if 30 < p < 5000:
-                print(f"  → Mi fallback price: ${p}")
-                return p
-    
-    print("  → No valid price found for Mi")
-    return None
+job_queue = JobQueue()
 
-def scrape_price(url):
-    """Main function to scrape price from a URL"""
-    site, currency, symbol = get_site_info(url)
+class ScrapeWorker:
+    """Claims jobs from job_queue and scrapes them, JOB_WORKER_CONCURRENCY at a time.
     
-    response = fetch_page_with_retry(url, site)
+    A new job is claimed as soon as a slot frees up, so one slow job never
+    holds the others back. Run one or more per box via worker.py; each
+    process is a separate worker.
+    """
     
-    if not response:
-        return None, site, currency, symbol, "Failed to fetch page after multiple attempts"
+    def __init__(self, queue=job_queue, concurrency=JOB_WORKER_CONCURRENCY):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._purged = 0.0
     
-    try:
-        soup = BeautifulSoup(response.content, 'html.parser')
-    except Exception as e:
-        return None, site, currency, symbol, f"Failed to parse page: {str(e)}"
-    
-    # Get product name
-    product_name = get_product_name(soup, site)
-    
-    # Scrape price based on site
-    price = None
-    
-    if site == 'amazon':
-        price = scrape_amazon_price(soup, url)
-    elif site == 'flipkart':
-        price = scrape_flipkart_price(soup, url)
-    elif site == 'myntra':
-        price = scrape_myntra_price(soup, url)
-    elif site == 'ajio':
-        price = scrape_ajio_price(soup, url)
-    elif site == 'meesho':
-        price = scrape_meesho_price(soup, url)
-    elif site == 'snapdeal':
-        price = scrape_snapdeal_price(soup, url)
-    elif site == 'tatacliq':
-        price = scrape_tatacliq_price(soup, url)
-    elif site == 'reliancedigital':
-        price = scrape_reliancedigital_price(soup, url)
-    elif site == 'croma':
-        price = scrape_croma_price(soup, url)
-    elif site == 'nykaa':
-        price = scrape_nykaa_price(soup, url)
-    elif site == 'shopsy':
-        price = scrape_shopsy_price(soup, url)
-    elif site == 'firstcry':
-        price = scrape_firstcry_price(soup, url)
-    elif site == 'pepperfry':
-        price = scrape_pepperfry_price(soup, url)
-    elif site == 'urbanladder':
-        price = scrape_urbanladder_price(soup, url)
-    elif site == 'bigbasket':
-        price = scrape_bigbasket_price(soup, url)
-    elif site == 'jiomart':
-        price = scrape_jiomart_price(soup, url)
-    elif site == 'oneplus':
-        price = scrape_oneplus_price(soup, url)
-    elif site == 'vijaysales':
-        price = scrape_vijaysales_price(soup, url)
-    elif site == 'ebay':
-        price = scrape_ebay_price(soup, url)
-    elif site == 'aliexpress':
-        price = scrape_aliexpress_price(soup, url)
-    elif site == 'walmart':
-        price = scrape_walmart_price(soup, url)
-    elif site == 'bestbuy':
-        price = scrape_bestbuy_price(soup, url)
-    elif site == 'target':
-        price = scrape_target_price(soup, url)
-    elif site == 'etsy':
-        price = scrape_etsy_price(soup, url)
-    elif site == 'newegg':
-        price = scrape_newegg_price(soup, url)
-    elif site == 'shein':
-        price = scrape_shein_price(soup, url)
-    elif site == 'zara':
-        price = scrape_zara_price(soup, url)
-    elif site == 'hm':
-        price = scrape_hm_price(soup, url)
-    elif site == 'adidas':
-        price = scrape_adidas_price(soup, url)
-    elif site == 'nike':
-        price = scrape_nike_price(soup, url)
-    elif site == 'samsung':
-        price = scrape_samsung_price(soup, url)
-    elif site == 'apple':
-        price = scrape_apple_price(soup, url)
-    elif site == 'mi':
-        price = scrape_mi_price(soup, url)
-    else:
-        # Generic scraping for unknown sites
-        all_text = soup.get_text()
-        prices = re.findall(r'[\₹$£€]\s*([\d,]+\.?\d*)', all_text)
-        for price_str in prices:
-            price = parse_price(price_str)
-            if price and 50 < price < 100000:
-                break
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await fetch_engine.run_blocking(self.queue.heartbeat, self.worker_id)
+            except Exception as e:
+                print(f"Scrape worker heartbeat failed: {str(e)}")
     
-    if price:
-        return price, site, currency, symbol, None
+    async def run_job(self, job):
+        try:
+            result = await scrape_price_async(job['url'], job['max_age'])
+        except Exception as e:
+            result = (None, None, None, None, str(e))
+        await fetch_engine.run_blocking(self.queue.finish, job, self.worker_id, result)
     
-    return None, site, currency, symbol, f"Could not extract price from {site}. The site may have changed its structure."
+    async def run_jobs(self, jobs):
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            await asyncio.gather(*(self.run_job(job) for job in jobs))
+        finally:
+            heartbeat.cancel()
+    
+    def run_once(self):
+        jobs = self.queue.claim(self.worker_id, self.concurrency)
+        if jobs:
+            fetch_engine.run(self.run_jobs(jobs))
+        return len(jobs)
+    
+    async def work(self, stop=None):
+        """Keep up to concurrency jobs running, claiming more as each one finishes.
+        
+        Runs until stop() returns true and the running jobs are done, or forever.
+        """
+        running = set()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            while running or not (stop and stop()):
+                free = self.concurrency - len(running)
+                if free and not (stop and stop()):
+                    try:
+                        if time.time() - self._purged > 3600:
+                            await fetch_engine.run_blocking(self.queue.purge)
+                            self._purged = time.time()
+                        jobs = await fetch_engine.run_blocking(self.queue.claim, self.worker_id, free)
+                    except Exception as e:
+                        print(f"Scrape worker error: {str(e)}")
+                        jobs = []
+                    running.update(asyncio.ensure_future(self.run_job(job)) for job in jobs)
+                if not running:
+                    await asyncio.sleep(JOB_IDLE_SLEEP)
+                    continue
+                # Wake for the first finished job, or after a while to look for new ones
+                done, running = await asyncio.wait(running, timeout=JOB_IDLE_SLEEP, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"Scrape worker error: {str(task.exception())}")
+        finally:
+            heartbeat.cancel()
+    
+    def run_forever(self):
+        print(f"Scrape worker {self.worker_id} started: {self.concurrency} jobs at a time, "
+              f"{self.queue.lease_seconds:.0f}s leases")
+        fetch_engine.run(self.work())
+
+# Batch requests to /get-price
+GET_PRICE_BATCH_LIMIT = int(os.environ.get('GET_PRICE_BATCH_LIMIT', '100'))
+GET_PRICE_BATCH_CONCURRENCY = int(os.environ.get('GET_PRICE_BATCH_CONCURRENCY', '16'))
+
+SCRAPE_ERROR_SUGGESTION = 'Try checking the URL directly in your browser. If the product exists, the site may be blocking automated access.'
+
+def parse_max_age(value):
+    """Seconds from a request's max_age field, or None; raises ValueError if it is not a number"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except TypeError:
+        raise ValueError(value)
+
+def job_result(job):
+    """A finished scrape_jobs row as a scrape_price result tuple"""
+    if job is None:
+        return None, None, None, None, 'Job not found'
+    error = (job['error'] or 'Could not fetch the price') if job['status'] == 'failed' else None
+    return job['price'], job['site_name'], job['currency'], job['currency_symbol'], error
+
+def price_response_body(result):
+    """The JSON body /get-price answers with for a scrape_price result"""
+    price, site, currency, currency_symbol, error = result
+    if error and price is not None:
+        # The site is blocking us; report the last price we saw as stale
+        return {
+            'price': price,
+            'currency': currency,
+            'currency_symbol': currency_symbol,
+            'productName': None,
+            'site': site,
+            'stale': True,
+            'notice': error
+        }
+    if error:
+        return {'error': error, 'suggestion': SCRAPE_ERROR_SUGGESTION}
+    return {
+        'price': price,
+        'currency': currency,
+        'currency_symbol': currency_symbol,
+        'productName': None,
+        'site': site
+    }
+
+def iter_batch_prices(urls, max_age):
+    """Yield one response line per URL, in the order the scrapes finish.
+    
+    At most GET_PRICE_BATCH_CONCURRENCY scrapes of the batch run at once on
+    the fetch engine, which still applies its per-host and per-site limits.
+    Each line carries the URL's index in the request, and an error of its own
+    if that URL failed.
+    """
+    todo = deque()
+    for index, url in enumerate(urls):
+        if isinstance(url, str) and url.strip():
+            todo.append((index, url.strip()))
+        else:
+            yield {'index': index, 'url': url, 'error': 'URL is required'}
+    
+    if SCRAPE_JOBS:
+        # URLs for one product share a job
+        jobs = {}
+        for index, url in todo:
+            jobs.setdefault(job_queue.enqueue(url, max_age), []).append((index, url))
+        for job_id, job in job_queue.wait_many(list(jobs), JOB_WAIT_SECONDS):
+            for index, url in jobs[job_id]:
+                if job is None:
+                    yield {'index': index, 'url': url, 'pending': True, 'job_id': job_id}
+                else:
+                    yield {'index': index, 'url': url, **price_response_body(job_result(job))}
+        return
+    
+    running = {}
+    try:
+        while todo or running:
+            while todo and len(running) < GET_PRICE_BATCH_CONCURRENCY:
+                index, url = todo.popleft()
+                running[fetch_engine.submit(scrape_price_async(url, max_age))] = (index, url)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, url = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = (None, None, None, None, str(e))
+                yield {'index': index, 'url': url, **price_response_body(result)}
+    finally:
+        # The client went away; stop scrapes nobody will read
+        for future in running:
+            future.cancel()
 
 # Flask Routes
 
@@ -1971,31 +3886,103 @@ def error_page():
 
 @app.route('/get-price', methods=['POST'])
 def get_price():
-    """API endpoint to get price from URL"""
+    """API endpoint to get price from URL.
+    
+    A body with a 'urls' list instead of 'url' scrapes them concurrently and
+    streams one NDJSON line per URL as soon as its price is ready.
+    """
     data = request.get_json()
     
-    if not data or 'url' not in data:
-        return jsonify({'error': 'URL is required'}), 400
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
     
-    url = data['url']
+    if 'urls' in data:
+        return get_price_batch(data)
     
-    if not url:
+    url = data.get('url')
+    
+    if not url or not isinstance(url, str):
         return jsonify({'error': 'URL is required'}), 400
     
-    price, site, currency, currency_symbol, error = scrape_price(url)
+    try:
+        max_age = parse_max_age(data.get('max_age'))
+    except ValueError:
+        return jsonify({'error': 'max_age must be a number of seconds'}), 400
+    
+    if SCRAPE_JOBS:
+        # A worker process scrapes; this request only waits for the result
+        job_id = job_queue.enqueue(url, max_age)
+        job = job_queue.wait(job_id, JOB_WAIT_SECONDS)
+        if job is None:
+            return jsonify({'pending': True, 'job_id': job_id}), 202
+        result = job_result(job)
+    else:
+        result = scrape_price(url, max_age)
     
-    if error:
-        return jsonify({
-            'error': error,
-            'suggestion': f'Try checking the URL directly in your browser. If the product exists, the site may be blocking automated access.'
-        }), 400
+    body = price_response_body(result)
+    return jsonify(body), 400 if 'error' in body else 200
+
+def get_price_batch(data):
+    """Stream /get-price results for a list of URLs as NDJSON"""
+    urls = data['urls']
+    
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'urls must be a non-empty list'}), 400
     
+    if len(urls) > GET_PRICE_BATCH_LIMIT:
+        return jsonify({'error': f'At most {GET_PRICE_BATCH_LIMIT} URLs per request'}), 400
+    
+    try:
+        max_age = parse_max_age(data.get('max_age'))
+    except ValueError:
+        return jsonify({'error': 'max_age must be a number of seconds'}), 400
+    
+    def generate():
+        for line in iter_batch_prices(urls, max_age):
+            yield json.dumps(line) + '\n'
+    
+    # Proxies must pass each line on as it is written
+    return Response(generate(), mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/scraper-stats')
+def scraper_stats():
+    """API endpoint exposing cache and fetch-layer counters"""
     return jsonify({
-        'price': price,
-        'currency': currency,
-        'currency_symbol': currency_symbol,
-        'productName': None,
-        'site': site
+        'success': True,
+        'cache': price_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'parse_pool': parse_pool.stats(),
+        'validators': validator_cache.stats(),
+        'extraction_memo': extraction_memo.stats(),
+        'streaming': body_reader.stats(),
+        'parsers': parser_backends.stats(),
+        'rules': rule_engine.stats(),
+        'structured_data': structured_data.stats(),
+        'prescan': price_prescan.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'circuits': circuit_breaker.stats(),
+        'sessions': session_pool.stats(),
+        'site_registry': resolve_site_host.cache_info()._asdict(),
+        'jobs': job_queue.stats(),
+    })
+
+@app.route('/api/jobs/<int:job_id>')
+def get_job(job_id):
+    """API endpoint reporting the state of a queued scrape"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'price': job['price'],
+        'currency': job['currency'],
+        'currency_symbol': job['currency_symbol'],
+        'site': job['site_name'],
+        'error': job['error'],
     })
 
 @app.route('/api/alerts', methods=['POST'])
@@ -2022,26 +4009,36 @@ def create_alert():
         # Get product info
         site_name, currency, currency_symbol = get_site_info(url)
         
-        # Get current price
-        current_price, _, _, _, error = scrape_price(url)
+        # Get current price, or leave it to a worker
+        if SCRAPE_JOBS:
+            current_price = None
+        else:
+            current_price, _, _, _, error = scrape_price(url)
+            if error:
+                # A last known price while the site blocks us is not a current price
+                current_price = None
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO alerts (user_id, url, target_price, site_name, current_price, currency, status)
-            VALUES (?, ?, ?, ?, ?, ?, 'active')
-        ''', (session['user_id'], url, target_price, site_name, current_price, currency))
+            INSERT INTO alerts (user_id, url, product_key, target_price, site_name, current_price, currency, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'active')
+        ''', (session['user_id'], url, product_key(url), target_price, site_name, current_price, currency))
         
         alert_id = cursor.lastrowid
         conn.commit()
         conn.close()
         
-        return jsonify({
+        response = {
             'success': True,
             'message': 'Alert created successfully!',
             'alert_id': alert_id
-        })
+        }
+        if SCRAPE_JOBS:
+            response['job_id'] = job_queue.enqueue(url)
+        
+        return jsonify(response)
         
     except Exception as e:
         print(f"Create alert error: {str(e)}")
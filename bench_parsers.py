@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark HTML parser backends on pages recorded with FETCH_MODE=record"""
+
+import io
+import sys
+import time
+from contextlib import redirect_stdout
+
+from app import FetchRecorder, ParserBackends, FETCH_CORPUS_DIR, get_site_info, scrape_site_price
+
+BACKENDS = ['html.parser', 'lxml', 'html5lib', 'stream']
+ROUNDS = 3
+
+def bench_page(content, url, site, backend):
+    """Return (parse_ms, extract_ms, price) for one page, best of ROUNDS"""
+    best_parse = best_extract = None
+    price = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        page = ParserBackends().page(content, backend, site)
+        parsed = time.perf_counter()
+        # The site scrapers print their progress; keep the report readable
+        with redirect_stdout(io.StringIO()):
+            price = scrape_site_price(page, url, site)
+        done = time.perf_counter()
+        parse_ms = (parsed - start) * 1000
+        extract_ms = (done - parsed) * 1000
+        best_parse = parse_ms if best_parse is None else min(best_parse, parse_ms)
+        best_extract = extract_ms if best_extract is None else min(best_extract, extract_ms)
+    return best_parse, best_extract, price
+
+def main(corpus_dir=FETCH_CORPUS_DIR):
+    recorder = FetchRecorder(mode='replay', corpus_dir=corpus_dir, latency=0, inject_status='')
+    urls = recorder.urls()
+    if not urls:
+        print(f"No recorded pages in {corpus_dir}. Run the app with FETCH_MODE=record first.")
+        return
+
+    backends = [backend for backend in BACKENDS if ParserBackends.is_available(backend)]
+    totals = {backend: [0.0, 0.0] for backend in backends}
+    mismatches = {backend: 0 for backend in backends}
+
+    print(f"Benchmarking {len(urls)} recorded pages with: {', '.join(backends)}")
+    print('=' * 60)
+    for url in urls:
+        response = recorder.replay(url, {})
+        if response.status_code != 200:
+            continue
+        site = get_site_info(url)[0]
+        print(f"{site:12} {len(response.content) // 1024:6} KB  {url[:60]}")
+
+        reference = None
+        for backend in backends:
+            parse_ms, extract_ms, price = bench_page(response.content, url, site, backend)
+            totals[backend][0] += parse_ms
+            totals[backend][1] += extract_ms
+            if backend == 'html.parser':
+                reference = price
+            elif price != reference:
+                mismatches[backend] += 1
+            print(f"    {backend:12} parse {parse_ms:8.1f} ms   extract {extract_ms:8.1f} ms   price {price}")
+
+    print('=' * 60)
+    for backend in backends:
+        parse_ms, extract_ms = totals[backend]
+        print(f"{backend:12} total parse {parse_ms:9.1f} ms   extract {extract_ms:9.1f} ms   price mismatches vs html.parser: {mismatches[backend]}")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
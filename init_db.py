@@ -11,6 +11,8 @@ def init_db():
     print(f"Creating database at: {DB_PATH}")
     
     conn = sqlite3.connect(DB_PATH)
+    # WAL lets the web, scheduler and worker processes read while one of them writes
+    conn.execute('PRAGMA journal_mode=WAL')
     cursor = conn.cursor()
     
     # Create users table
@@ -32,6 +34,7 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             url TEXT NOT NULL,
+            product_key TEXT,
             target_price REAL NOT NULL,
             site_name TEXT,
             product_name TEXT,
@@ -49,12 +52,50 @@ def init_db():
         CREATE TABLE IF NOT EXISTS price_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             alert_id INTEGER NOT NULL,
+            product_key TEXT,
             price REAL NOT NULL,
             recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (alert_id) REFERENCES alerts (id)
         )
     ''')
     
+    # Databases created before product keys get the column added
+    for table in ('alerts', 'price_history'):
+        columns = [column[1] for column in cursor.execute(f'PRAGMA table_info({table})')]
+        if 'product_key' not in columns:
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN product_key TEXT')
+            except sqlite3.OperationalError:
+                # Another worker process added it first
+                pass
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_product_key ON alerts (product_key)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_product_key ON price_history (product_key, recorded_at)')
+    
+    # Create scrape_jobs table (times are epoch seconds)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            product_key TEXT NOT NULL,
+            max_age REAL,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            run_after REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            price REAL,
+            site_name TEXT,
+            currency TEXT,
+            currency_symbol TEXT,
+            error TEXT,
+            finished_at REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, run_after)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_product_key ON scrape_jobs (product_key, status)')
+    
     conn.commit()
     conn.close()
     
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+"""Keep saved alerts' prices fresh in the background, independent of open dashboards"""
+
+from app import alert_scheduler
+
+if __name__ == '__main__':
+    alert_scheduler.run_forever()
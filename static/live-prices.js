@@ -563,50 +563,54 @@ async function refreshAllPrices() {
     let priceDrops = 0;
     let pending = 0;
     
-    for (const tracker of window.trackers) {
-        try {
-            const response = await fetch('/get-price', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ url: tracker.url })
+    // One request for every tracker; each price is applied as soon as it streams in
+    const refreshing = window.trackers.slice();
+    let answered = 0;
+    try {
+        // Background refresh: a price checked in the last few minutes is fresh enough
+        await fetchPricesBatch(refreshing.map(tracker => tracker.url), 240, (index, data) => {
+            answered++;
+            const tracker = refreshing[index];
+            
+            if (data.error || data.pending || data.stale) {
+                pending++;
+                return;
+            }
+            
+            const oldPrice = tracker.currentPrice;
+            tracker.currentPrice = data.price;
+            tracker.productName = data.productName || tracker.productName;
+            
+            // Track price history
+            if (!priceHistory[tracker.id]) {
+                priceHistory[tracker.id] = [];
+            }
+            priceHistory[tracker.id].push({
+                price: data.price,
+                timestamp: new Date().toISOString()
             });
             
-            const data = await response.json();
+            // Keep only last 30 price points
+            if (priceHistory[tracker.id].length > 30) {
+                priceHistory[tracker.id].shift();
+            }
             
-            if (response.ok) {
-                const oldPrice = tracker.currentPrice;
-                tracker.currentPrice = data.price;
-                tracker.productName = data.productName || tracker.productName;
-                
-                // Track price history
-                if (!priceHistory[tracker.id]) {
-                    priceHistory[tracker.id] = [];
-                }
-                priceHistory[tracker.id].push({
-                    price: data.price,
-                    timestamp: new Date().toISOString()
-                });
-                
-                // Keep only last 30 price points
-                if (priceHistory[tracker.id].length > 30) {
-                    priceHistory[tracker.id].shift();
-                }
-                
-                // Check for price drop
-                if (data.price < oldPrice) {
-                    priceDrops++;
-                    // Play notification sound
-                    playPriceDropSound();
-                }
-                
-                updated++;
-            } else {
-                pending++;
+            // Check for price drop
+            if (data.price < oldPrice) {
+                priceDrops++;
+                // Play notification sound
+                playPriceDropSound();
             }
-        } catch (error) {
-            pending++;
-        }
+            
+            updated++;
+            renderLiveProducts();
+            updateLiveStats(updated, priceDrops, pending);
+        });
+    } catch (error) {
+        console.log('Failed to refresh prices:', error.message);
     }
+    // Trackers the stream never reached
+    pending += refreshing.length - answered;
     
     // Save trackers and history
     localStorage.setItem('trackers', JSON.stringify(window.trackers));
@@ -692,15 +696,14 @@ async function refreshLivePrice(trackerId) {
     }
     
     try {
-        const response = await fetch('/get-price', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: tracker.url })
-        });
+        // fetchPrice is shared from script.js
+        const { ok, data } = await fetchPrice(tracker.url);
         
-        const data = await response.json();
-        
-        if (response.ok) {
+        if (ok && data.stale) {
+            // Only the last price we saw while the site blocks us; leave the price and history alone
+            if (card) card.classList.remove('updating');
+            showToast('info', data.notice || 'The site is blocking price checks right now. Try again later.');
+        } else if (ok) {
             const oldPrice = tracker.currentPrice;
             tracker.currentPrice = data.price;
             tracker.productName = data.productName || tracker.productName;
@@ -134,17 +134,15 @@ async function autoRefreshAllTrackers() {
     let targetReachedCount = 0;
     const results = [];
     
-    // Process trackers in batches to avoid overwhelming the server
-    const batchSize = 3;
-    for (let i = 0; i < trackers.length; i += batchSize) {
-        const batch = trackers.slice(i, i + batchSize);
-        const batchResults = await Promise.all(batch.map(tracker => refreshTrackerQuietly(tracker)));
-        results.push(...batchResults);
-        
-        // Small delay between batches
-        if (i + batchSize < trackers.length) {
-            await new Promise(resolve => setTimeout(resolve, 1000));
-        }
+    // One request for every tracker; each price is applied as soon as it streams in
+    const refreshing = trackers.slice();
+    try {
+        // Background refresh: a price checked in the last few minutes is fresh enough
+        await fetchPricesBatch(refreshing.map(tracker => tracker.url), 300, (index, data) => {
+            results.push(applyRefreshedPrice(refreshing[index], data));
+        });
+    } catch (error) {
+        console.log('Failed to refresh trackers:', error.message);
     }
     
     // Count how many trackers reached target
@@ -171,34 +169,95 @@ async function autoRefreshAllTrackers() {
     }
 }
 
-async function refreshTrackerQuietly(tracker) {
-    try {
+// Fetch prices for many URLs in one streamed request. onResult(index, data) runs
+// for each URL as soon as its price (or its own error) arrives, in any order.
+async function fetchPricesBatch(urls, maxAge, onResult) {
+    const batchLimit = 100;
+    for (let start = 0; start < urls.length; start += batchLimit) {
         const response = await fetch('/get-price', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: tracker.url })
+            body: JSON.stringify({ urls: urls.slice(start, start + batchLimit), max_age: maxAge })
         });
         
-        if (response.ok) {
-            const data = await response.json();
-            const oldPrice = tracker.currentPrice;
-            const wasActive = oldPrice > tracker.targetPrice;
-            
-            tracker.currentPrice = data.price;
-            tracker.productName = data.productName || tracker.productName;
-            
-            const isReached = tracker.currentPrice <= tracker.targetPrice;
-            
-            return {
-                trackerId: tracker.id,
-                justReached: wasActive && isReached,
-                newPrice: data.price
-            };
+        if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || 'Failed to fetch prices');
+        }
+        
+        // The body is NDJSON: one result per line
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let done = false;
+        while (!done) {
+            const chunk = await reader.read();
+            done = chunk.done;
+            buffered += decoder.decode(chunk.value || new Uint8Array(), { stream: !done });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const data = JSON.parse(line);
+                onResult(start + data.index, data);
+            }
+        }
+    }
+}
+
+// Fetch one URL's price, resolving to { ok, data }. With scrape workers on, /get-price
+// may answer 202 with a job id instead; the job is then polled until it finishes.
+async function fetchPrice(url) {
+    const response = await fetch('/get-price', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ url: url })
+    });
+    const data = await response.json();
+    if (response.status !== 202 || !data.pending) {
+        return { ok: response.ok, data: data };
+    }
+    
+    const deadline = Date.now() + 60000;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobResponse = await fetch('/api/jobs/' + data.job_id);
+        const job = await jobResponse.json();
+        if (!jobResponse.ok) {
+            return { ok: false, data: job };
+        }
+        if (job.status === 'done') {
+            return { ok: true, data: job };
+        }
+        if (job.status === 'failed') {
+            return { ok: false, data: { error: job.error || 'Failed to fetch price' } };
         }
-    } catch (error) {
-        console.log(`Failed to refresh tracker ${tracker.id}:`, error.message);
     }
-    return null;
+    return { ok: false, data: { error: 'The price check is still running. Try again in a minute.' } };
+}
+
+function applyRefreshedPrice(tracker, data) {
+    if (data.error) {
+        console.log(`Failed to refresh tracker ${tracker.id}:`, data.error);
+        return null;
+    }
+    // Still being scraped by a worker, or only the last known price while the
+    // site blocks us; the next refresh picks it up
+    if (data.pending || data.stale) return null;
+    
+    const oldPrice = tracker.currentPrice;
+    const wasActive = oldPrice > tracker.targetPrice;
+    
+    tracker.currentPrice = data.price;
+    tracker.productName = data.productName || tracker.productName;
+    
+    const isReached = tracker.currentPrice <= tracker.targetPrice;
+    
+    return {
+        trackerId: tracker.id,
+        justReached: wasActive && isReached,
+        newPrice: data.price
+    };
 }
 
 function showBrowserNotification(count) {
@@ -335,21 +394,19 @@ async function handleFlow() {
         }, 10000);
         
         try {
-            const response = await fetch('/get-price', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ url: url })
-            });
+            const { ok, data } = await fetchPrice(url);
             
             clearPriceFetchTimeout();
-            const data = await response.json();
             
-            if (response.ok) {
+            if (ok) {
                 priceStep.style.display = 'block';
                 priceStep.innerHTML = '<p><strong>Current Price: ' + data.currency_symbol + data.price + '</strong></p>' +
                     '<input type="number" id="targetPrice" class="product-input" style="width: 150px;" placeholder="Set target price" value="' + (data.price * 0.9).toFixed(2) + '">';
                 mainBtn.innerHTML = 'Create Tracker';
                 setLoadingState(false);
+                if (data.stale) {
+                    showToast('info', data.notice);
+                }
                 
                 // Store the product name and price data for later use
                 priceStep.dataset.productName = data.productName || 'Product';
@@ -399,13 +456,8 @@ async function createTracker(url, targetPrice, currentPrice, productName, curren
     
     try {
         // Fetch fresh price to ensure accuracy
-        const response = await fetch('/get-price', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: url })
-        });
-        const priceData = await response.json();
-        if (!response.ok) throw new Error(priceData.error || 'Failed to fetch price');
+        const { ok, data: priceData } = await fetchPrice(url);
+        if (!ok) throw new Error(priceData.error || 'Failed to fetch price');
         
         const finalProductName = priceData.productName || productName;
         
@@ -683,11 +735,7 @@ async function refreshPrice(trackerId) {
     }, 8000);
     
     try {
-        const response = await fetch('/get-price', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: tracker.url })
-        });
+        const { ok, data } = await fetchPrice(tracker.url);
         clearTimeout(refreshTimeout);
         
         if (refreshBtn) {
@@ -695,8 +743,10 @@ async function refreshPrice(trackerId) {
             refreshBtn.innerHTML = '<i class="fa fa-refresh"></i> Refresh';
         }
         
-        const data = await response.json();
-        if (response.ok) {
+        if (ok && data.stale) {
+            // Only the last price we saw while the site blocks us; keep the tracker as it is
+            showToast('info', data.notice || 'The site is blocking price checks right now. Try again later.');
+        } else if (ok) {
             tracker.currentPrice = data.price;
             tracker.productName = data.productName || tracker.productName;
             localStorage.setItem('trackers', JSON.stringify(trackers));
@@ -1452,11 +1502,7 @@ refreshPrice = async function(trackerId) {
     }, 8000);
     
     try {
-        const response = await fetch('/get-price', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: tracker.url })
-        });
+        const { ok, data } = await fetchPrice(tracker.url);
         clearTimeout(refreshTimeout);
         
         if (refreshBtn) {
@@ -1464,8 +1510,10 @@ refreshPrice = async function(trackerId) {
             refreshBtn.innerHTML = '<i class="fa fa-refresh"></i> Refresh';
         }
         
-        const data = await response.json();
-        if (response.ok) {
+        if (ok && data.stale) {
+            // Only the last price we saw while the site blocks us; keep the tracker as it is
+            showToast('info', data.notice || 'The site is blocking price checks right now. Try again later.');
+        } else if (ok) {
             const oldPrice = tracker.currentPrice;
             tracker.currentPrice = data.price;
             tracker.productName = data.productName || tracker.productName;
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests for how often the alert scheduler rechecks a product"""
+
+import pytest
+
+import app
+
+AMAZON = 'https://www.amazon.in/dp/B0TESTSCHD'
+BESTBUY = 'https://www.bestbuy.com/site/test-tv/6500000.p'
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'scheduler.db'))
+    app.init_db()
+    conn = app.get_db_connection()
+    yield conn
+    conn.close()
+
+def product(url, price=1000.0, target=500.0):
+    return {'key': app.product_key(url), 'url': url, 'alerts': [{'current_price': price, 'target_price': target}]}
+
+def add_history(conn, url, hours_ago, alerts=1):
+    """One price_history row per alert for each change, like store() writes them"""
+    for hours in hours_ago:
+        for alert_id in range(1, alerts + 1):
+            conn.execute("INSERT INTO price_history (alert_id, product_key, price, recorded_at) VALUES (?, ?, ?, datetime('now', ?))",
+                         (alert_id, app.product_key(url), 999.0, f'-{hours} hours'))
+    conn.commit()
+
+def test_quiet_product_far_from_its_target_uses_the_base_interval(conn):
+    scheduler = app.AlertScheduler(interval=900)
+    add_history(conn, AMAZON, [1])
+
+    # The first recorded price is not a change
+    assert scheduler.interval_for(product(AMAZON), conn) == 900
+
+def test_price_changes_shorten_the_interval(conn):
+    scheduler = app.AlertScheduler(interval=900)
+    # Eight recordings over the week are seven changes, one a day; rows older than the window do not count
+    add_history(conn, AMAZON, [1, 20, 40, 60, 80, 100, 120, 140] + [200, 300], alerts=2)
+
+    assert scheduler.interval_for(product(AMAZON), conn) == 450
+
+def test_volatility_counts_at_most_four_changes_a_day(conn):
+    scheduler = app.AlertScheduler(interval=3600)
+    add_history(conn, AMAZON, range(1, 150))
+
+    assert scheduler.interval_for(product(AMAZON), conn) == 720
+
+def test_prices_near_a_target_are_checked_more_often(conn):
+    scheduler = app.AlertScheduler(interval=3600)
+
+    # 5% above the target is halfway into the 10% band: urgency 2.5
+    assert scheduler.interval_for(product(AMAZON, price=1000.0, target=950.0), conn) == 1440
+    # At or below the target: the full urgency of 4
+    assert scheduler.interval_for(product(AMAZON, price=900.0, target=950.0), conn) == 900
+    # The most urgent of a product's alerts wins
+    near = product(AMAZON, price=1000.0, target=950.0)
+    near['alerts'].append({'current_price': 1000.0, 'target_price': 100.0})
+    assert scheduler.interval_for(near, conn) == 1440
+
+def test_costly_sites_wait_longer_within_the_bounds(conn):
+    assert app.get_site_info(BESTBUY)[0] in app.SITE_FETCH_COST
+
+    assert app.AlertScheduler(interval=900).interval_for(product(BESTBUY), conn) == 1800
+    assert app.AlertScheduler(interval=20000).interval_for(product(BESTBUY), conn) == app.ALERT_MAX_INTERVAL
+    add_history(conn, AMAZON, range(1, 150))
+    assert app.AlertScheduler(interval=900).interval_for(product(AMAZON, price=900.0, target=950.0), conn) == app.ALERT_MIN_INTERVAL
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Tests for the streamed body reader that stops once the price region has arrived"""
+
+import app
+
+class FakeResponse:
+    """Yields a body in fixed chunks and counts how many were read"""
+    
+    def __init__(self, body, chunk=10):
+        self.chunks = [body[i:i + chunk] for i in range(0, len(body), chunk)]
+        self.read_chunks = 0
+        self.closed = False
+    
+    def iter_content(self, chunk_size=None):
+        for chunk in self.chunks:
+            self.read_chunks += 1
+            yield chunk
+    
+    def close(self):
+        self.closed = True
+
+MARKERS = {'amazon': [b'priceblock_ourprice', b'a-offscreen']}
+
+def read(body, site='amazon', max_bytes=1000, tail=15, chunk=10):
+    reader = app.StreamingBodyReader(max_bytes=max_bytes, markers=MARKERS, tail=tail)
+    response = FakeResponse(body, chunk)
+    reader.read(response, site)
+    assert response.closed
+    return response, reader
+
+def test_stops_a_tail_margin_after_the_marker():
+    body = b'x' * 40 + b'<span id="priceblock_ourprice">' + b'y' * 200
+    response, reader = read(body)
+
+    end = body.index(b'priceblock_ourprice') + len(b'priceblock_ourprice') + 15
+    assert response._content == body[:end]
+    assert response.read_chunks == (end + 9) // 10
+    assert reader.stats()['stopped_early'] == 1
+
+def test_finds_a_marker_split_across_chunks():
+    body = b'x' * 45 + b'a-offscreen' + b'y' * 200
+    response, _ = read(body)
+
+    assert response._content == body[:45 + len(b'a-offscreen') + 15]
+
+def test_reads_a_short_page_without_markers_whole():
+    body = b'<html>' + b'z' * 300 + b'</html>'
+    response, reader = read(body)
+
+    assert response._content == body
+    assert response.read_chunks == len(response.chunks)
+    assert reader.stats()['stopped_early'] == 0
+
+def test_caps_the_body_at_max_bytes():
+    body = b'z' * 500 + b'priceblock_ourprice' + b'z' * 500
+    response, reader = read(body, max_bytes=123)
+
+    assert response._content == body[:123]
+    assert response.read_chunks == 13
+    stats = reader.stats()
+    assert (stats['pages'], stats['stopped_early'], stats['avg_bytes']) == (1, 1, 123)
+
+def test_sites_without_markers_read_up_to_the_cap():
+    body = b'priceblock_ourprice' + b'z' * 500
+    response, _ = read(body, site='ebay', max_bytes=200)
+
+    assert response._content == body[:200]
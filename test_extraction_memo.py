@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Tests that page fingerprints ignore per-request tokens but not price changes"""
+
+import app
+
+AMAZON = ('<html><head><meta name="csrf-token" content="{csrf}"><script nonce="{nonce}">ue_id = \'{ue}\'; '
+          'var s = {{"sessionId": "{ue}", "requestId": "{ue}"}};</script></head>'
+          '<body><span id="priceblock_ourprice">{price}</span></body></html>')
+MYNTRA = ('<html><body><script nonce="{nonce}">window.__myx = {{"serverTime": {time}, "x-request-id": "{ue}", '
+          '"pdpData": {{"price": {{"sellingPrice": {price}}}}}}}</script></body></html>')
+
+def fingerprint(memo, template, site, **fields):
+    values = dict(csrf='a1', nonce='n1', ue='REQ1', time='1760000000', price='₹1,299')
+    values.update(fields)
+    return memo.fingerprint(template.format(**values).encode(), site)
+
+def test_per_request_tokens_do_not_change_the_fingerprint():
+    memo = app.ExtractionMemo()
+    base = fingerprint(memo, AMAZON, 'amazon')
+
+    assert fingerprint(memo, AMAZON, 'amazon', csrf='b2', nonce='n2', ue='REQ2') == base
+    assert fingerprint(memo, MYNTRA, 'myntra', price='1299', nonce='n2', ue='REQ2', time='1760000999') == \
+        fingerprint(memo, MYNTRA, 'myntra', price='1299')
+
+def test_price_changes_change_the_fingerprint():
+    memo = app.ExtractionMemo()
+
+    assert fingerprint(memo, AMAZON, 'amazon', price='₹1,199') != fingerprint(memo, AMAZON, 'amazon')
+    assert fingerprint(memo, MYNTRA, 'myntra', price='1199') != fingerprint(memo, MYNTRA, 'myntra', price='1299')
+    # Markup around an unchanged number counts too
+    moved = AMAZON.replace('priceblock_ourprice', 'priceblock_dealprice')
+    assert fingerprint(memo, moved, 'amazon') != fingerprint(memo, AMAZON, 'amazon')
+
+def test_site_tokens_only_apply_to_their_site():
+    memo = app.ExtractionMemo()
+
+    # ue_id is only blanked on Amazon pages
+    assert fingerprint(memo, AMAZON, 'ebay', ue='REQ2') != fingerprint(memo, AMAZON, 'ebay')
+    assert fingerprint(memo, AMAZON, 'amazon', ue='REQ2') == fingerprint(memo, AMAZON, 'amazon')
+
+def test_only_found_prices_are_remembered():
+    memo = app.ExtractionMemo(size=2)
+    first, second, third = (fingerprint(memo, AMAZON, 'amazon', price=price) for price in ('₹1', '₹2', '₹3'))
+
+    memo.put(first, (None, 'amazon', 'INR', '₹', 'Could not extract price from amazon.'))
+    assert memo.get(first) is None
+    memo.put(first, (1.0, 'amazon', 'INR', '₹', None))
+    memo.put(second, (2.0, 'amazon', 'INR', '₹', None))
+    assert memo.get(first)[0] == 1.0
+    memo.put(third, (3.0, 'amazon', 'INR', '₹', None))
+    # Least recently used goes first
+    assert memo.get(second) is None and memo.get(first)[0] == 1.0
+    assert memo.stats()['sites']['amazon'] == {'hits': 2, 'misses': 2, 'hit_rate': 0.5}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Tests that recorded fetches replay with the same status, headers and body"""
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import app
+
+URL = 'https://www.amazon.in/dp/B0TESTRECO'
+
+class FakeSession:
+    """Answers every GET with a canned response"""
+    
+    def __init__(self, status, headers, body):
+        self.status, self.headers, self.body = status, headers, body
+        self.requests = []
+    
+    def get(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        response = requests.Response()
+        response.url = url
+        response.status_code = self.status
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        return response
+
+def test_record_then_replay(tmp_path):
+    headers = {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"abc"', 'Content-Encoding': 'gzip', 'Content-Length': '99'}
+    session = FakeSession(200, headers, '<html>₹1,299</html>'.encode())
+    recorded = app.FetchRecorder(mode='record', corpus_dir=str(tmp_path)).get(session, URL, timeout=5)
+
+    replayed = app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path)).get(None, URL, headers={})
+
+    assert session.requests == [(URL, {'timeout': 5})]
+    assert replayed.status_code == recorded.status_code == 200
+    assert replayed.content == recorded.content
+    assert replayed.headers['Content-Type'] == 'text/html; charset=utf-8' and replayed.headers['ETag'] == '"abc"'
+    # The body is stored decoded, so the wire-format headers are dropped
+    assert 'Content-Encoding' not in replayed.headers and 'Content-Length' not in replayed.headers
+    assert app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path)).urls() == [URL]
+
+def test_replay_reproduces_error_statuses(tmp_path):
+    app.FetchRecorder(mode='record', corpus_dir=str(tmp_path)).get(FakeSession(404, {'Retry-After': '5'}, b'gone'), URL)
+
+    replayed = app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path)).get(None, URL)
+
+    assert replayed.status_code == 404 and replayed.headers['Retry-After'] == '5'
+    assert replayed.content == b''
+
+def test_replay_injects_statuses_repeatably(tmp_path):
+    app.FetchRecorder(mode='record', corpus_dir=str(tmp_path)).get(FakeSession(200, {}, b'<html>ok</html>'), URL)
+
+    def statuses(inject):
+        recorder = app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path), inject_status=inject, seed=7)
+        return [recorder.get(None, URL).status_code for _ in range(50)]
+
+    assert statuses('429:1.0') == [429] * 50
+    mixed = statuses('429:0.3,503:0.3')
+    assert mixed == statuses('429:0.3,503:0.3')
+    assert {429, 503, 200} == set(mixed)
+    # An injected error has no body, like the real one would
+    assert app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path), inject_status='503:1.0').get(None, URL).content == b''
+
+def test_replay_of_an_unrecorded_url_fails_like_the_network(tmp_path):
+    recorder = app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        recorder.get(None, URL)
+    assert recorder.urls() == []
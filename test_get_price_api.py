@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Tests for the /get-price endpoint's request handling and NDJSON batch output"""
+
+import json
+
+import app
+
+PRICES = {
+    'https://www.amazon.in/dp/B0TESTAPI1': (499.0, 'amazon', 'INR', '₹', None),
+    'https://www.flipkart.com/phone/p/itmtestapi2': (None, 'flipkart', 'INR', '₹', 'Could not extract price from flipkart.'),
+    'https://www.amazon.in/dp/B0TESTAPI3': (899.0, 'amazon', 'INR', '₹', 'amazon is temporarily blocking price checks; this is the last price we saw.'),
+}
+
+def fake_scrapes(monkeypatch):
+    async def scrape_price_async(url, max_age=None):
+        return PRICES[url]
+    monkeypatch.setattr(app, 'scrape_price_async', scrape_price_async)
+    monkeypatch.setattr(app, 'SCRAPE_JOBS', False)
+
+def test_batch_streams_one_line_per_url(monkeypatch):
+    fake_scrapes(monkeypatch)
+    urls = list(PRICES) + ['', 42]
+
+    response = app.app.test_client().post('/get-price', json={'urls': urls, 'max_age': 300})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    by_index = {line['index']: line for line in lines}
+    assert sorted(by_index) == [0, 1, 2, 3, 4]
+    assert by_index[0]['price'] == 499.0 and 'error' not in by_index[0]
+    assert by_index[1]['error'].startswith('Could not extract price')
+    assert by_index[2]['stale'] is True and by_index[2]['price'] == 899.0
+    assert by_index[3] == {'index': 3, 'url': '', 'error': 'URL is required'}
+    assert by_index[4] == {'index': 4, 'url': 42, 'error': 'URL is required'}
+    assert all(line['url'] == urls[line['index']] for line in lines)
+
+def test_batch_rejects_bad_requests():
+    client = app.app.test_client()
+    for body in ({'urls': []}, {'urls': 'https://www.amazon.in/dp/B0TESTAPI1'},
+                 {'urls': ['x'] * (app.GET_PRICE_BATCH_LIMIT + 1)}, {'urls': ['x'], 'max_age': 'soon'}):
+        response = client.post('/get-price', json=body)
+        assert response.status_code == 400, body
+        assert 'error' in response.get_json()
+
+def test_non_object_bodies_are_rejected():
+    client = app.app.test_client()
+    for body in (['https://www.amazon.in/dp/B0TESTAPI1'], 'https://www.amazon.in/dp/B0TESTAPI1', 5, None):
+        response = client.post('/get-price', data=json.dumps(body), content_type='application/json')
+        assert response.status_code == 400, body
+        assert 'error' in response.get_json()
+    for body in ({}, {'url': ''}, {'url': 123}):
+        response = client.post('/get-price', json=body)
+        assert response.status_code == 400 and response.get_json()['error'] == 'URL is required', body
+
+def test_single_url_answers_202_while_a_worker_scrapes(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'jobs.db'))
+    app.init_db()
+    queue = app.JobQueue()
+    monkeypatch.setattr(app, 'job_queue', queue)
+    monkeypatch.setattr(app, 'SCRAPE_JOBS', True)
+    monkeypatch.setattr(app, 'JOB_WAIT_SECONDS', 0)
+    client = app.app.test_client()
+
+    response = client.post('/get-price', json={'url': 'https://www.amazon.in/dp/B0TESTAPI1'})
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['pending'] is True
+    assert client.get(f"/api/jobs/{body['job_id']}").get_json()['status'] == 'queued'
+
+    job, = queue.claim('worker', 1)
+    queue.finish(job, 'worker', PRICES['https://www.amazon.in/dp/B0TESTAPI1'])
+
+    status = client.get(f"/api/jobs/{body['job_id']}").get_json()
+    assert status['status'] == 'done' and status['price'] == 499.0 and status['currency_symbol'] == '₹'
+    # A caller that accepts a recent price gets the finished job straight away
+    response = client.post('/get-price', json={'url': 'https://www.amazon.in/dp/B0TESTAPI1', 'max_age': 60})
+    assert response.status_code == 200 and response.get_json()['price'] == 499.0
+
+def test_new_alert_does_not_store_a_stale_price(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'alerts.db'))
+    app.init_db()
+    monkeypatch.setattr(app, 'SCRAPE_JOBS', False)
+    monkeypatch.setattr(app, 'scrape_price', lambda url: PRICES[url])
+    client = app.app.test_client()
+    with client.session_transaction() as user_session:
+        user_session['user_id'] = 1
+
+    for url in ('https://www.amazon.in/dp/B0TESTAPI1', 'https://www.amazon.in/dp/B0TESTAPI3'):
+        response = client.post('/api/alerts', json={'url': url, 'target_price': 100})
+        assert response.get_json()['success'] is True
+
+    conn = app.get_db_connection()
+    stored = dict(conn.execute('SELECT url, current_price FROM alerts').fetchall())
+    conn.close()
+    assert stored == {'https://www.amazon.in/dp/B0TESTAPI1': 499.0, 'https://www.amazon.in/dp/B0TESTAPI3': None}
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Tests for the durable scrape job queue"""
+
+import threading
+import time
+
+import pytest
+
+import app
+
+URL = 'https://www.amazon.in/dp/B0TESTJOBQ'
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'jobs.db'))
+    app.init_db()
+    queue = app.JobQueue(lease_seconds=60, max_attempts=2, retry_base=30)
+    monkeypatch.setattr(app, 'job_queue', queue)
+    return queue
+
+def add_alert(url=URL):
+    conn = app.get_db_connection()
+    conn.execute(
+        "INSERT INTO alerts (user_id, url, product_key, target_price, status) VALUES (1, ?, ?, 100, 'active')",
+        (url, app.product_key(url))
+    )
+    conn.commit()
+    conn.close()
+
+def expire_leases(worker_id):
+    conn = app.get_db_connection()
+    conn.execute('UPDATE scrape_jobs SET lease_expires = 0 WHERE lease_owner = ?', (worker_id,))
+    conn.commit()
+    conn.close()
+
+def test_connections_use_wal(queue):
+    conn = app.get_db_connection()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.close()
+
+def test_enqueue_deduplicates_a_product(queue):
+    job_id = queue.enqueue(URL)
+    assert queue.enqueue('https://www.amazon.in/Some-Name/dp/B0TESTJOBQ?tag=aff-21') == job_id
+    assert queue.stats()['by_status'] == {'queued': 1}
+    assert queue.stats()['deduplicated'] == 1
+
+    # A finished job is only reused within max_age
+    queue.claim('A', 1)
+    queue.finish(queue.get(job_id), 'A', (499.0, 'amazon', 'INR', '₹', None))
+    assert queue.enqueue(URL, max_age=60) == job_id
+    assert queue.enqueue(URL) != job_id
+
+def test_concurrent_enqueues_share_one_job(queue):
+    ids = []
+    def enqueue():
+        ids.append(queue.enqueue(URL))
+    threads = [threading.Thread(target=enqueue) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 1
+    assert queue.stats()['by_status'] == {'queued': 1}
+
+def test_claim_leases_each_job_once(queue):
+    for n in range(3):
+        queue.enqueue(f'https://www.amazon.in/dp/B0TESTJOB{n}')
+
+    first = queue.claim('A', 2)
+    second = queue.claim('B', 10)
+
+    assert len(first) == 2 and len(second) == 1
+    assert not {job['id'] for job in first} & {job['id'] for job in second}
+    assert queue.claim('C', 10) == []
+
+def test_expired_lease_is_claimed_again(queue):
+    add_alert()
+    job_id = queue.enqueue(URL)
+    queue.claim('A', 1)
+    expire_leases('A')
+
+    job, = queue.claim('B', 1)
+    assert job['id'] == job_id and job['attempts'] == 2
+
+    # The first worker finishing late does not overwrite the new owner's work
+    queue.finish(job, 'A', (1.0, 'amazon', 'INR', '₹', None))
+    assert queue.stats()['lost_leases'] == 1
+    queue.finish(job, 'B', (499.0, 'amazon', 'INR', '₹', None))
+    assert queue.get(job_id)['price'] == 499.0
+
+    conn = app.get_db_connection()
+    assert conn.execute('SELECT current_price FROM alerts').fetchone()[0] == 499.0
+    conn.close()
+
+def test_failed_scrapes_retry_with_backoff_then_fail(queue):
+    job_id = queue.enqueue(URL)
+    job, = queue.claim('A', 1)
+    queue.finish(job, 'A', (None, 'amazon', 'INR', '₹', 'Failed to fetch'))
+
+    retried = queue.get(job_id)
+    assert retried['status'] == 'queued' and retried['error'] == 'Failed to fetch'
+    assert retried['run_after'] >= time.time() + 30 * 0.5 - 1
+    assert queue.claim('A', 1) == []
+
+    conn = app.get_db_connection()
+    conn.execute('UPDATE scrape_jobs SET run_after = 0')
+    conn.commit()
+    conn.close()
+    job, = queue.claim('A', 1)
+    queue.finish(job, 'A', (None, 'amazon', 'INR', '₹', 'Failed to fetch'))
+
+    assert queue.get(job_id)['status'] == 'failed'
+    assert queue.stats()['retried'] == 1 and queue.stats()['failed'] == 1
+
+def test_lease_expiry_with_no_attempts_left_fails_the_job(queue):
+    job_id = queue.enqueue(URL)
+    queue.claim('A', 1)
+    expire_leases('A')
+    queue.claim('B', 1)
+    expire_leases('B')
+
+    assert queue.claim('C', 1) == []
+    assert queue.get(job_id)['status'] == 'failed'
+
+def test_scheduler_queues_checks_with_scrape_jobs(queue, monkeypatch):
+    monkeypatch.setattr(app, 'SCRAPE_JOBS', True)
+    add_alert()
+    scheduler = app.AlertScheduler(fetches_per_minute=10)
+    scheduler.refresh()
+    for product in scheduler._products.values():
+        scheduler._schedule(product, 0)
+
+    assert scheduler.run_once() == 1
+    assert queue.stats()['by_status'] == {'queued': 1}
+    assert scheduler.queued == 1 and scheduler.checked == 0
+
+def test_worker_refills_slots_while_a_slow_job_runs(queue, monkeypatch):
+    finished = []
+
+    async def scrape_price_async(url, max_age=None):
+        await app.asyncio.sleep(0.6 if url.endswith('SLOW') else 0.05)
+        finished.append(url[-4:])
+        return (499.0, 'amazon', 'INR', '₹', None)
+
+    monkeypatch.setattr(app, 'scrape_price_async', scrape_price_async)
+    monkeypatch.setattr(app, 'JOB_IDLE_SLEEP', 0.05)
+    queue.enqueue('https://www.amazon.in/dp/B0TESTSLOW')
+    for n in range(4):
+        queue.enqueue(f'https://www.amazon.in/dp/B0TESTJOB{n}')
+
+    worker = app.ScrapeWorker(queue=queue, concurrency=2)
+    app.fetch_engine.run(worker.work(stop=lambda: len(finished) == 5))
+
+    # The second slot ran every fast job while the slow one held the first
+    assert finished == ['JOB0', 'JOB1', 'JOB2', 'JOB3', 'SLOW']
+    assert queue.stats()['by_status'] == {'done': 5}
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Tests that page extraction gives the same answers in parse worker processes"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import app
+from test_rule_engine import CASES
+
+PAGES = [(page.encode(), f'https://example.com/{site}/{i}', site, 'INR', '₹') for i, (site, page, _) in enumerate(CASES)]
+
+def in_process(pages):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [app.extract_price(*page) for page in pages]
+
+def through(pool, pages):
+    async def run_all():
+        # One at a time, so the worker's rule engine sees the pages in the same order
+        return [await pool.run(app.extract_price, *page) for page in pages]
+    with contextlib.redirect_stdout(io.StringIO()):
+        return asyncio.run(run_all())
+
+def test_worker_processes_match_in_process_extraction(monkeypatch):
+    pool = app.ParsePool(processes=1, queue_limit=2)
+    try:
+        found = through(pool, PAGES)
+    finally:
+        pool._executor.shutdown()
+    # A fresh engine here too, like the one in the new worker
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+
+    assert found == in_process(PAGES)
+    assert pool.stats()['submitted'] == len(PAGES) and pool.stats()['failures'] == 0
+
+def test_disabled_pool_parses_on_the_engine_threads(monkeypatch):
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+    pool = app.ParsePool(processes=0)
+    found = through(pool, PAGES[:3])
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+
+    assert found == in_process(PAGES[:3])
+    assert pool._executor is None and pool.stats()['submitted'] == 0
+
+class BrokenExecutor(concurrent.futures.Executor):
+    """Fails every page as if its worker had been killed"""
+    
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        future.set_exception(BrokenProcessPool('A process in the process pool was terminated abruptly'))
+        return future
+
+def test_broken_pool_falls_back_to_in_process_parsing(monkeypatch):
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+    pool = app.ParsePool(processes=1)
+    broken = BrokenExecutor()
+
+    async def run_broken():
+        pool._pid, pool._executor, pool._slots = os.getpid(), broken, asyncio.Semaphore(pool.queue_limit)
+        return await pool.run(app.extract_price, *PAGES[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        found = asyncio.run(run_broken())
+
+    assert found == (12499.0, 'amazon', 'INR', '₹', None)
+    assert pool.stats()['failures'] == 1
+    # The next page starts a fresh pool instead of reusing the broken one
+    assert pool._executor is None
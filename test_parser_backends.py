@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Tests for falling back to html.parser when a faster parser misses the price element"""
+
+import contextlib
+import io
+
+from bs4 import BeautifulSoup
+
+import app
+
+class LossyBackends(app.ParserBackends):
+    """An lxml stand-in whose tree loses the .prod-sp element, as a real parser can on broken markup"""
+    
+    def page(self, content, backend, site):
+        if backend == app.PARSER_FALLBACK:
+            return super().page(content, backend, site)
+        with self._lock:
+            self._parses[backend] = self._parses.get(backend, 0) + 1
+        return app.PageView(BeautifulSoup(content.replace(b'prod-sp', b'gone'), 'html.parser'))
+
+TARGETED = '<html><head><meta charset="utf-8"></head><body><div class="prod-sp">₹1,450</div><p>₹999</p><p>₹999</p></body></html>'
+PAGE_WIDE = '<html><head><meta charset="utf-8"></head><body><p>₹50</p><p>₹899</p><p>₹899</p></body></html>'
+PRICE_ELEMENT = '<html><head><meta charset="utf-8"></head><body><div class="price">₹1,450</div><p>₹999</p><p>₹999</p></body></html>'
+
+def extract(monkeypatch, backends, page):
+    monkeypatch.setattr(app, 'parser_backends', backends)
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.extract_price(page.encode(), 'https://www.ajio.com/p/1', 'ajio', 'INR', '₹')[0]
+
+def test_page_wide_guess_is_checked_against_html_parser(monkeypatch):
+    backends = LossyBackends(default='lxml')
+
+    # lxml's tree only yields the most common price; html.parser still finds .prod-sp
+    assert extract(monkeypatch, backends, TARGETED) == 1450.0
+    assert backends.stats()['rescues'] == {'ajio': 1}
+    for _ in range(app.PARSER_DEMOTE_AFTER - 1):
+        extract(monkeypatch, backends, TARGETED)
+    assert backends.choose('ajio') == app.PARSER_FALLBACK
+
+def test_agreeing_page_wide_guesses_are_not_rescues(monkeypatch):
+    backends = LossyBackends(default='lxml')
+
+    assert extract(monkeypatch, backends, PAGE_WIDE) == 899.0
+    assert backends.stats()['parses'] == {'lxml': 1, 'html.parser': 1}
+    assert backends.stats()['rescues'] == {}
+
+def test_targeted_hits_are_trusted(monkeypatch):
+    backends = LossyBackends(default='lxml')
+
+    assert extract(monkeypatch, backends, PRICE_ELEMENT) == 1450.0
+    assert backends.stats()['parses'] == {'lxml': 1}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Tests for site detection and product keys"""
+
+import app
+
+# (URL shapes of one product, the key they all share)
+SHAPES = [
+    (['https://www.amazon.in/Some-Name/dp/B09G9HD6GF/ref=sr_1_1?tag=aff-21',
+      'https://amazon.in/gp/product/b09g9hd6gf',
+      'www.amazon.in/gp/aw/d/B09G9HD6GF?psc=1'], 'amazon.in:B09G9HD6GF'),
+    (['https://www.amazon.com/dp/B09G9HD6GF'], 'amazon.com:B09G9HD6GF'),
+    (['https://www.flipkart.com/apple-iphone-15/p/itm6ac6485515ae4?pid=MOBGTAGPTB3VS24W&lid=LSTMOB&marketplace=FLIPKART',
+      'https://dl.flipkart.com/dl/apple-iphone-15/p/itm6ac6485515ae4?pid=MOBGTAGPTB3VS24W'], 'flipkart.com:itm6ac6485515ae4:MOBGTAGPTB3VS24W'),
+    # Without a pid, the itm id alone
+    (['https://dl.flipkart.com/dl/apple-iphone-15/p/itm6ac6485515ae4',
+      'https://www.flipkart.com/apple-iphone-15/p/itm6ac6485515ae4?otracker=search'], 'flipkart.com:itm6ac6485515ae4'),
+    (['https://www.shopsy.in/cotton-kurta/p/itmf3b2a1c0d9e8?pid=KTAG7ZZZZZZZZZZZ',
+      'https://shopsy.in/cotton-kurta/p/itmf3b2a1c0d9e8?srsltid=x&pid=KTAG7ZZZZZZZZZZZ'], 'shopsy.in:itmf3b2a1c0d9e8:KTAG7ZZZZZZZZZZZ'),
+    (['https://www.myntra.com/tshirts/roadster/roadster-men-tshirt/12345678/buy',
+      'https://www.myntra.com/12345678?utm_source=share'], 'myntra.com:12345678'),
+    (['https://www.ajio.com/some-shirt/p/469581234_blue'], 'ajio.com:469581234_blue'),
+    (['https://www.snapdeal.com/product/usb-cable/123456789'], 'snapdeal.com:123456789'),
+    (['https://www.ebay.com/itm/Some-Thing/1234567890', 'https://www.ebay.com/itm/1234567890'], 'ebay.com:1234567890'),
+    (['https://www.walmart.com/ip/Some-Name/123456', 'https://www.walmart.com/ip/123456'], 'walmart.com:123456'),
+    (['https://www.bestbuy.com/site/some-tv/6505727.p?skuId=6505727'], 'bestbuy.com:6505727'),
+    # No recognised id: the canonical URL, without tracking parameters
+    (['https://shop.example/item/1?utm_source=x&b=2&a=1', 'https://SHOP.example/item/1/?a=1&b=2&gclid=z'],
+     'https://shop.example/item/1?a=1&b=2'),
+]
+
+def test_url_shapes_share_a_product_key():
+    for urls, key in SHAPES:
+        for url in urls:
+            assert app.product_key(url) == key, url
+
+def test_malformed_urls_are_unknown_sites():
+    for url in ('http://[abc', 'https://[::1/dp/B0TESTCACH'):
+        assert app.get_site_info(url)[0] == 'unknown'
+        assert app.product_key(url) == url
+        assert app.limit_key(url, 'unknown') == 'unknown'
+
+def test_sites_are_resolved_by_their_registered_domain():
+    for url, site in [
+        ('https://www.amazon.in/dp/B0TESTCACH', 'amazon'),
+        ('https://smile.amazon.co.uk/dp/B0TESTCACH', 'amazon'),
+        ('https://www.amazon.com.au/dp/B0TESTCACH', 'amazon'),
+        ('https://dl.flipkart.com/s/abc', 'flipkart'),
+        ('https://amzn.to/3abcdef', 'amazon'),
+        ('https://www2.hm.com/en_in/productpage.0970819001.html', 'hm'),
+        # A retailer's name elsewhere in the host does not make it the retailer
+        ('https://amazon.evil.com/dp/B0TESTCACH', 'unknown'),
+        ('https://apple.stackexchange.com/questions/1', 'unknown'),
+        ('https://www.amazon.com.evil.net/dp/B0TESTCACH', 'unknown'),
+        ('https://target.shop.co.uk/item/1', 'unknown'),
+        ('https://amazon/dp/B0TESTCACH', 'unknown'),
+    ]:
+        assert app.get_site_info(url)[0] == site, url
+
+def test_flipkart_variants_get_their_own_keys():
+    # Colours and storage sizes share an itm id and differ by pid, each with its own price
+    black = app.product_key('https://www.flipkart.com/apple-iphone-15/p/itm6ac6485515ae4?pid=MOBGTAGPTB3VS24W')
+    blue = app.product_key('https://www.flipkart.com/apple-iphone-15/p/itm6ac6485515ae4?pid=MOBGTAGPAAAAAAAA')
+    assert black != blue
+
+def test_migration_rekeys_stored_alerts_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DB_PATH', str(tmp_path / 'test.db'))
+    app.init_db()
+    url = 'https://www.flipkart.com/apple-iphone-15/p/itm6ac6485515ae4?pid=MOBGTAGPTB3VS24W'
+    conn = app.get_db_connection()
+    for key in ('flipkart.com:itm6ac6485515ae4', None, 'amazon.in:B09G9HD6GF'):
+        conn.execute('INSERT INTO alerts (user_id, url, product_key, target_price) VALUES (1, ?, ?, 100)',
+                     (url if key != 'amazon.in:B09G9HD6GF' else 'https://www.amazon.in/dp/B09G9HD6GF', key))
+    conn.execute("INSERT INTO price_history (alert_id, product_key, price) VALUES (1, 'flipkart.com:itm6ac6485515ae4', 500)")
+    conn.commit()
+    conn.close()
+
+    app.migrate_db()
+
+    conn = app.get_db_connection()
+    keys = [row[0] for row in conn.execute('SELECT product_key FROM alerts ORDER BY id')]
+    assert keys == [app.product_key(url)] * 2 + ['amazon.in:B09G9HD6GF']
+    assert conn.execute('SELECT product_key FROM price_history').fetchone()[0] == app.product_key(url)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(app.DB_MIGRATIONS)
+    # Applied migrations are not run again
+    conn.execute("UPDATE alerts SET product_key = 'kept' WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    app.migrate_db()
+
+    conn = app.get_db_connection()
+    assert conn.execute('SELECT product_key FROM alerts WHERE id = 3').fetchone()[0] == 'kept'
+    conn.close()
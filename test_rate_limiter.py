@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Tests for the per-site token bucket and its Retry-After handling, on a fake clock"""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import app
+
+class FakeClock:
+    """Stands in for the time module inside app; sleeping just moves the clock on"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(app, 'time', fake)
+    return fake
+
+def test_burst_then_refill(clock):
+    limiter = app.SiteRateLimiter(rate_per_minute=60, burst=3)
+
+    assert [limiter.reserve('amazon') for _ in range(5)] == [0.0, 0.0, 0.0, 1.0, 2.0]
+    # Other sites have their own bucket
+    assert limiter.reserve('flipkart') == 0.0
+
+    clock.now += 2.5
+    assert limiter.reserve('amazon') == pytest.approx(0.5)
+    # An idle site refills up to the burst, not beyond it
+    clock.now += 60
+    assert [limiter.reserve('amazon') for _ in range(4)] == [0.0, 0.0, 0.0, 1.0]
+
+def test_wait_gives_up_past_max_wait(clock):
+    limiter = app.SiteRateLimiter(rate_per_minute=60, burst=1)
+
+    assert limiter.reserve('amazon', max_wait=5) == 0.0
+    assert limiter.wait('amazon') is True
+    assert clock.now == 1001.0
+    for _ in range(5):
+        limiter.reserve('amazon')
+    # The next slot is 6s away
+    assert limiter.reserve('amazon', max_wait=5) is None
+    assert limiter.reserve('amazon', max_wait=6) == pytest.approx(6.0)
+
+def test_throttling_halves_the_rate_and_success_restores_it(clock):
+    limiter = app.SiteRateLimiter(rate_per_minute=60, burst=1)
+
+    limiter.record('amazon', 429)
+    limiter.record('amazon', None)
+    assert limiter.stats()['amazon']['rate_per_minute'] == 15.0
+    limiter.record('amazon', 200)
+    assert limiter.stats()['amazon']['rate_per_minute'] == 21.0
+    assert limiter.stats()['amazon']['throttled'] == 2
+
+@pytest.mark.parametrize('retry_after', ['120', 'date'])
+def test_retry_after_pushes_back_the_next_slot(clock, retry_after):
+    if retry_after == 'date':
+        retry_after = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=120), usegmt=True)
+    limiter = app.SiteRateLimiter(rate_per_minute=60, burst=3)
+
+    limiter.record('amazon', 429, retry_after)
+
+    # The 429 halves the rate, and the bucket owes 120s worth of tokens at it
+    delay = limiter.reserve('amazon', max_wait=None)
+    assert 119 + 2 <= delay <= 120 + 2
+    assert limiter.reserve('flipkart') == 0.0
+    clock.now += delay
+    assert limiter.reserve('amazon', max_wait=None) == pytest.approx(2.0)
+
+def test_parse_retry_after():
+    assert app.parse_retry_after('30') == 30.0
+    assert app.parse_retry_after('-5') == 0.0
+    assert 59 <= app.parse_retry_after(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)) <= 60
+    assert app.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert app.parse_retry_after('soon') is None
+    assert app.parse_retry_after(None) is None
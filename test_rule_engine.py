@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Tests that the SITE_RULES engine finds the same prices as the per-site scrapers it replaced"""
+
+import contextlib
+import io
+
+from bs4 import BeautifulSoup
+
+import app
+
+FILLER = '<p>Free delivery over ₹499</p><p>Protect promise fee ₹99</p>'
+
+# (site, page, price the old scrape_<site>_price function returned for it)
+CASES = [
+    ('amazon', '<html><body><h1 id="title">Phone</h1><span id="priceblock_ourprice">₹12,499.00</span></body></html>', 12499.0),
+    ('amazon', '<html><body><h1 id="title">Cable</h1><span id="priceblock_dealprice">₹200.00</span></body></html>', 200.0),
+    ('amazon', '<html><body><span id="priceblock_ourprice">₹150</span><span class="a-price"><span class="a-offscreen">₹1,299.00</span></span></body></html>', 1299.0),
+    ('amazon', '<html><body><div id="ppd"><p>₹350 delivery</p><p>Deal ₹200</p><p>M.R.P. ₹999</p></div></body></html>', 200.0),
+    ('amazon', '<html><body><div id="centerCol"><p>Only ₹100000</p></div></body></html>', 100000.0),
+    ('amazon', '<html><body>' + FILLER + '<p>₹2,345</p><p>₹2,345</p><p>₹5,000</p></body></html>', 2345.0),
+    ('flipkart', '<html><body><div class="_30jeq3 _16Jk6d">₹8,999</div></body></html>', 8999.0),
+    ('flipkart', '<html><body><div class="_30jeq3">₹200</div></body></html>', 200.0),
+    ('flipkart', '<html><body><div class="_30jeq3">₹199</div><div data-testid="price">₹1,049</div></body></html>', 1049.0),
+    ('flipkart', '<html><body><div class="_1Yok6V"><span>₹450</span><span>₹200</span></div></body></html>', 200.0),
+    ('flipkart', '<html><body>' + FILLER + '<p>₹3,299</p><p>₹3,299</p><p>₹7,999</p></body></html>', 3299.0),
+    ('myntra', '<html><body><script>window.__myx = {"pdpData": {"price": {"mrp": 1999, "sellingPrice": 1299}}}</script></body></html>', 1299.0),
+    ('myntra', '<html><body><script>var x = {"sellingPrice": 200, "sp": 899}</script></body></html>', 899.0),
+    ('myntra', '<html><body><div class="pdp-pricing-container-x"><span>₹100</span><span>₹749</span></div></body></html>', 749.0),
+    ('myntra', '<html><body><span class="pdp-selling-price">Rs. 1499</span></body></html>', 1499.0),
+    ('myntra', '<html><body><p>FREE DELIVERY ₹99</p><p>Now ₹2,199</p><p>₹2,199 only</p></body></html>', 2199.0),
+    ('ajio', '<html><body><div class="prod-sp">₹1,450</div></body></html>', 1450.0),
+    ('ajio', '<html><body><p>₹50</p><p>₹899</p><p>₹899</p></body></html>', 899.0),
+    ('meesho', '<html><body><h4 class="ProductPrice">₹349</h4></body></html>', 349.0),
+    ('snapdeal', '<html><body><span class="pdp-final-price">₹599</span></body></html>', 599.0),
+    ('bestbuy', '<html><body><div class="priceView-customer-price"><span>$199.99</span></div></body></html>', 199.99),
+    ('bestbuy', '<html><body><div class="priceView-customer-price"><span>$10</span></div><p>$49.99</p><p>$49.99</p></body></html>', None),
+    ('ebay', '<html><body><p>$12.50</p><p>$129.99</p><p>$129.99</p></body></html>', 129.99),
+    ('walmart', '<html><body><p>$5,000</p><p>$24.97</p><p>$24.97</p></body></html>', 24.97),
+    ('apple', '<html><body><p>$999</p><p>$999</p><p>$1,199</p></body></html>', 999.0),
+    ('unknown', '<html><body><p>₹1,234</p><p>₹1,234</p><p>$20</p></body></html>', 1234.0),
+]
+
+def scrape(page, site):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.scrape_site_price(app.PageView(BeautifulSoup(page, 'html.parser')), 'https://example.com/p', site)
+
+def test_rules_match_old_scrapers():
+    for site, page, expected in CASES:
+        assert scrape(page, site) == expected, (site, page)
+
+def test_price_in_range_bounds():
+    assert not app.price_in_range(200, (200, None))
+    assert app.price_in_range(200, (200, None), inclusive=True)
+    assert app.price_in_range(100000, (200, 100000), inclusive=True)
+    assert not app.price_in_range(100000.01, (200, 100000), inclusive=True)
+    assert not app.price_in_range(None, (None, None))
+
+# Pages where a prescan that trusted its first matching marker would disagree with the rules
+AMBIGUOUS = [
+    # The deal block comes first in the page, but the rules prefer ourprice
+    ('amazon', '<html><body><span id="priceblock_dealprice">₹899</span><span id="priceblock_ourprice">₹999</span></body></html>', 999.0),
+    ('amazon', '<html><body><span id="priceblock_saleprice">₹799</span><span id="priceblock_dealprice">₹150</span></body></html>', 799.0),
+    # The rules read the first .a-price .a-offscreen, nested or not
+    ('amazon', '<html><body><span class="a-price"><span class="a-text-price"><span class="a-offscreen">₹1,499.00</span></span></span>'
+               '<span class="a-price"><span class="a-offscreen">₹1,299.00</span></span></body></html>', 1499.0),
+    # Scripts run in document order and the first in-range value wins, whatever the key
+    ('myntra', '<html><body><script>var a = {"sp": 999}</script><script>var b = {"sellingPrice": 1299}</script></body></html>', 999.0),
+    ('myntra', '<html><body><script>var a = {"sellingPrice":150,"discountedPrice":899}</script>'
+               '<script>var b = {"sellingPrice": 1299}</script></body></html>', 899.0),
+]
+
+def test_prescan_agrees_with_rules(monkeypatch):
+    prescan = app.PricePrescan()
+    pages = [(site, page) for site, page, _ in CASES + AMBIGUOUS]
+    for site, page in pages:
+        found = prescan.scan(page.encode(), site)
+        if found is not None:
+            # A fresh engine, so selectors run in rule order rather than by recent hit rate
+            monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+            assert found == scrape(page, site), (site, page)
+    for site, page, expected in CASES[:1] + CASES[6:7] + CASES[11:12] + CASES[20:21]:
+        assert prescan.scan(page.encode(), site) == expected, (site, page)
+
+def test_prescan_leaves_ambiguous_pages_to_the_rules(monkeypatch):
+    prescan = app.PricePrescan()
+    for site, page, expected in AMBIGUOUS:
+        monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+        assert scrape(page, site) == expected, (site, page)
+        assert prescan.scan(page.encode(), site) is None, (site, page)
+
+def test_prescan_ignores_markers_the_rules_would_skip():
+    prescan = app.PricePrescan()
+    # Outside a <script>, and with child markup the selector's text would include
+    assert prescan.scan(b'<html><body><p data-x=\'{"sellingPrice": 1299}\'></p></body></html>', 'myntra') is None
+    assert prescan.scan('<html><body><span id="priceblock_ourprice">₹1,299<sup>.50</sup></span></body></html>'.encode(), 'amazon') is None
+
+def test_prescan_does_not_depend_on_selector_order(monkeypatch):
+    engine = app.SiteRuleEngine()
+    monkeypatch.setattr(app, 'rule_engine', engine)
+    both = ('<html><body><span id="priceblock_ourprice">₹999</span>'
+            '<span class="a-price"><span class="a-offscreen">₹1,299.00</span></span></body></html>')
+    # Teach the engine that .a-price .a-offscreen is where Amazon prices are
+    for _ in range(5):
+        scrape('<html><body><span class="a-price"><span class="a-offscreen">₹1,299.00</span></span></body></html>', 'amazon')
+    assert scrape(both, 'amazon') == 1299.0
+    assert app.PricePrescan().scan(both.encode(), 'amazon') is None
+
+SHOP_RULES = {'shop': {'steps': [{'type': 'selectors', 'selectors': ['.a', '.b', '.c']}]}, 'unknown': {'steps': []}}
+
+def shop_page(selector):
+    return app.PageView(BeautifulSoup(f'<html><body><p class="{selector[1:]}">₹499</p></body></html>', 'html.parser'))
+
+def shop_order(engine):
+    return engine.ordered_selectors('shop', engine.rules['shop']['steps'][0])
+
+def test_selectors_with_hits_move_ahead_and_misses_are_demoted(monkeypatch):
+    monkeypatch.setattr(app, 'SELECTOR_DEMOTE_AFTER', 2)
+    engine = app.SiteRuleEngine(SHOP_RULES)
+    assert shop_order(engine) == ['.a', '.b', '.c']
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert engine.extract(shop_page('.b'), 'shop') == 499.0
+        # .a missed once, .b hit; untried .c keeps its place behind .a
+        assert shop_order(engine) == ['.b', '.a', '.c']
+
+        engine.extract(shop_page('.c'), 'shop')
+        # .a has now missed twice in a row and goes to the back
+        assert shop_order(engine) == ['.c', '.b', '.a']
+
+        engine.extract(shop_page('.a'), 'shop')
+        # A hit brings .a back; .b is the one that keeps missing now
+        assert shop_order(engine) == ['.c', '.a', '.b']
+
+def test_equal_hit_rates_keep_the_rule_order():
+    engine = app.SiteRuleEngine(SHOP_RULES)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine.extract(shop_page('.c'), 'shop')
+        assert shop_order(engine) == ['.c', '.a', '.b']
+        engine.extract(shop_page('.a'), 'shop')
+
+    # .a and .c have both hit one of their two tries
+    assert shop_order(engine) == ['.a', '.c', '.b']
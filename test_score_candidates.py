@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Tests that candidate price scoring ranks the same with and without NumPy"""
+
+import random
+
+import pytest
+
+import app
+
+def random_candidates(rng):
+    prices = [rng.choice([199.0, 499.0, 1299.0, 1499.0, 2345.5, 89999.0]) for _ in range(rng.randint(1, 40))]
+    return [
+        (price, rng.randint(1, 30), rng.random() < 0.2, None if rng.random() < 0.1 else rng.randint(0, 20000))
+        for price in prices
+    ]
+
+def test_numpy_and_pure_python_rank_the_same(monkeypatch):
+    if app.np is None:
+        pytest.skip('NumPy is not installed')
+    rng = random.Random(20)
+    cases = [
+        ([], None),
+        ([(499.0, 3, False, 10)], 0),
+        # Equal scores fall back to document order
+        ([(1299.0, 4, False, 50), (999.0, 4, False, 60), (999.0, 4, False, 70), (1299.0, 4, False, 80)], None),
+        ([(1299.0, 4, True, 100), (999.0, 6, False, None), (1299.0, 4, True, 5000)], 120),
+    ] + [(random_candidates(rng), rng.choice([None, 0, 3000, 15000])) for _ in range(200)]
+    with_numpy = [app.score_candidates(candidates, title_offset) for candidates, title_offset in cases]
+    monkeypatch.setattr(app, 'np', None)
+    without_numpy = [app.score_candidates(candidates, title_offset) for candidates, title_offset in cases]
+    assert with_numpy == without_numpy
+    assert with_numpy[2][0][0] == 1299.0
+    assert with_numpy[3][0][0] == 999.0
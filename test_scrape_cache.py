@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Tests for the scrape result cache, request coalescing and the circuit breaker fallback"""
+
+import time
+
+import app
+
+URL = 'https://www.amazon.in/dp/B0TESTCACH'
+
+def blocked_site(monkeypatch, site='amazon'):
+    """Make every fetch fail with the site's circuit breaker open"""
+    async def no_response(*args, **kwargs):
+        return None
+    breaker = app.SiteCircuitBreaker(threshold=1)
+    breaker.record(site, 403)
+    monkeypatch.setattr(app, 'fetch_page_async', no_response)
+    monkeypatch.setattr(app, 'circuit_breaker', breaker)
+    return breaker
+
+def test_breaker_fallback_is_marked_stale(monkeypatch):
+    cache = app.PriceCache()
+    monkeypatch.setattr(app, 'price_cache', cache)
+    cache.put(URL, (499.0, 'amazon', 'INR', '₹', None))
+    key = app.product_key(URL)
+    result, _ = cache._entries[key]
+    cache._entries[key] = (result, time.time() - 3600)
+    blocked_site(monkeypatch)
+
+    price, site, currency, symbol, error = app.scrape_price(URL, 0)
+
+    assert price == 499.0
+    assert error and 'blocking' in error
+    body = app.price_response_body((price, site, currency, symbol, error))
+    assert body['stale'] is True and body['price'] == 499.0
+
+def test_breaker_fallback_is_not_written_back_to_cache(monkeypatch):
+    cache = app.PriceCache()
+    monkeypatch.setattr(app, 'price_cache', cache)
+    cache.put(URL, (499.0, 'amazon', 'INR', '₹', None))
+    key = app.product_key(URL)
+    result, _ = cache._entries[key]
+    cache._entries[key] = (result, time.time() - 3600)
+    blocked_site(monkeypatch)
+
+    app.scrape_price(URL, 0)
+
+    assert time.time() - cache._entries[key][1] >= 3600
+    assert cache.get(URL, 60) is None
+
+def test_breaker_without_last_price_reports_error(monkeypatch):
+    monkeypatch.setattr(app, 'price_cache', app.PriceCache())
+    blocked_site(monkeypatch)
+
+    price, _, _, _, error = app.scrape_price(URL, 0)
+
+    assert price is None
+    assert 'blocking' in error
+
+def test_unknown_sites_are_limited_per_host():
+    assert app.limit_key('https://shop-a.example/item/1', 'unknown') == 'shop-a.example'
+    assert app.limit_key('https://shop-b.example/item/1', 'unknown') == 'shop-b.example'
+    assert app.limit_key('https://www.amazon.in/dp/B0TESTCACH', 'amazon') == 'amazon'
+
+    breaker = app.SiteCircuitBreaker(threshold=1)
+    breaker.record(app.limit_key('https://shop-a.example/item/1', 'unknown'), 403)
+    assert breaker.is_open('shop-a.example')
+    assert not breaker.is_open('shop-b.example')
+
+def test_price_cache_uses_site_ttl():
+    cache = app.PriceCache(default_ttl=900, site_ttl={'amazon': 300})
+    cache.put(URL, (499.0, 'amazon', 'INR', '₹', None))
+    key = app.product_key(URL)
+    result, _ = cache._entries[key]
+
+    cache._entries[key] = (result, time.time() - 200)
+    assert cache.get(URL) == result
+
+    cache._entries[key] = (result, time.time() - 400)
+    assert cache.get(URL) is None
+    # A caller may accept an older price than the site's TTL
+    assert cache.get(URL, max_age=600) == result
+    assert cache.get(URL, max_age=0) is None
+
+def test_price_cache_shares_entries_across_url_shapes():
+    cache = app.PriceCache()
+    cache.put('https://www.amazon.in/Some-Name/dp/B0TESTCACH/ref=sr_1_1?tag=aff-21', (499.0, 'amazon', 'INR', '₹', None))
+    assert cache.get('https://www.amazon.in/dp/B0TESTCACH')[0] == 499.0
+
+def test_price_cache_skips_failures_and_evicts_oldest():
+    cache = app.PriceCache(size=2)
+    cache.put(URL, (None, 'amazon', 'INR', '₹', 'Failed'))
+    assert cache.stats()['entries'] == 0
+
+    for n in range(3):
+        cache.put(f'https://www.amazon.in/dp/B0TESTCAC{n}', (100.0 + n, 'amazon', 'INR', '₹', None))
+    assert cache.get('https://www.amazon.in/dp/B0TESTCAC0') is None
+    assert cache.get('https://www.amazon.in/dp/B0TESTCAC2')[0] == 102.0
+    assert cache.stats()['evictions'] == 1
+
+def test_single_flight_merges_concurrent_scrapes():
+    flight = app.SingleFlight()
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await app.asyncio.sleep(0.05)
+        return (499.0, 'amazon', 'INR', '₹', None)
+
+    async def check_many():
+        return await app.asyncio.gather(*(flight.run('amazon.in:B0TESTCACH', scrape) for _ in range(5)))
+
+    results = app.fetch_engine.run(check_many())
+
+    assert len(calls) == 1
+    assert all(result[0] == 499.0 for result in results)
+    assert flight.stats() == {'started': 1, 'merged': 4, 'in_flight': 0}
+
+    # Once finished, the next scrape of the key starts afresh
+    app.fetch_engine.run(flight.run('amazon.in:B0TESTCACH', scrape))
+    assert len(calls) == 2
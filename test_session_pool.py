@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Tests for the per-host session pool and its cookie warm-ups"""
+
+import asyncio
+
+import app
+
+def test_sessions_are_pooled_per_host():
+    pool = app.SiteSessionPool(size=1)
+    com = pool.checkout(app.session_key('https://www.amazon.com/dp/B0TEST0001', 'amazon'), 'amazon')
+    pool.checkin(com)
+
+    india = pool.checkout(app.session_key('https://www.amazon.in/dp/B0TEST0001', 'amazon'), 'amazon')
+    assert india is not com and india['key'] == 'www.amazon.in'
+    assert pool.checkout('www.amazon.com', 'amazon') is com
+
+def test_checkout_hands_out_a_one_off_session_when_the_host_is_busy():
+    pool = app.SiteSessionPool(size=1)
+    first = pool.checkout('shop.example.com', 'unknown')
+    second = pool.checkout('shop.example.com', 'unknown')
+
+    assert second['pooled'] is False
+    pool.checkin(second)
+    pool.checkin(first)
+    assert pool.stats()['shop.example.com'] == {'sessions': 1, 'idle': 1, 'one_off': 1}
+
+def test_warm_up_waits_for_the_limiter_on_the_loop(monkeypatch):
+    events = []
+    pool = app.SiteSessionPool()
+    monkeypatch.setattr(app, 'session_pool', pool)
+    monkeypatch.setattr(app.fetch_recorder, 'mode', 'live')
+    monkeypatch.setattr(app, 'circuit_breaker', app.SiteCircuitBreaker())
+
+    async def wait_async(key):
+        events.append(('limiter', key))
+        return True
+    monkeypatch.setattr(app.rate_limiter, 'wait_async', wait_async)
+    monkeypatch.setattr(app.rate_limiter, 'wait', lambda key: events.append(('blocking limiter', key)))
+    monkeypatch.setattr(app, 'warm_up_session', lambda http_session, site, host: events.append(('warm up', host)))
+    monkeypatch.setattr(app, 'fetch_attempt', lambda url, site, pooled, *args: events.append(('fetch', pooled['key'])) or 'page')
+
+    url = 'https://www.bestbuy.ca/en-ca/product/123'
+    assert asyncio.run(app.fetch_page_async(url, 'bestbuy')) == 'page'
+    assert asyncio.run(app.fetch_page_async(url, 'bestbuy')) == 'page'
+
+    assert events == [
+        ('limiter', 'bestbuy'), ('warm up', 'www.bestbuy.ca'), ('limiter', 'bestbuy'), ('fetch', 'www.bestbuy.ca'),
+        ('limiter', 'bestbuy'), ('fetch', 'www.bestbuy.ca'),
+    ]
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Tests that the streaming scanner reads pages the same way html.parser does"""
+
+import contextlib
+import io
+
+import app
+from test_rule_engine import CASES
+
+TEMPLATE_PAGES = [
+    ('amazon', '<html><body><template id="productTitle">Saved Title Text</template><h1>Heading Name</h1><p>₹1,299</p></body></html>'),
+    ('amazon', '<html><body><template><h1 id="productTitle">Hidden Title</h1><span id="priceblock_ourprice">₹999</span></template>'
+               '<h1 id="productTitle">Real Product Title</h1><span id="priceblock_ourprice">₹1,499</span></body></html>'),
+    ('amazon', '<html><body><div id="productTitle"><template>Draft</template>Real Name Here</div><p>₹2,345</p><p>₹2,345</p></body></html>'),
+    ('flipkart', '<html><body><template class="_30jeq3">₹4,321</template><div class="_30jeq3">₹1,234</div></body></html>'),
+    ('flipkart', '<html><body><h1>Some Phone Name</h1><template><p>₹5,555</p><p>₹5,555</p></template><p>₹3,299</p></body></html>'),
+]
+
+def read(page, site, backend, monkeypatch):
+    # A fresh engine, so both backends try selectors in the same order
+    monkeypatch.setattr(app, 'rule_engine', app.SiteRuleEngine())
+    # The scanner always decodes UTF-8; tell html.parser too rather than have it guess
+    view = app.parser_backends.page(('<meta charset="utf-8">' + page).encode(), backend, site)
+    selectors = list(app.rule_engine.name_selectors(site)) + ['h1']
+    names = [view.select_one(selector) for selector in selectors]
+    with contextlib.redirect_stdout(io.StringIO()):
+        price = app.scrape_site_price(view, 'https://example.com/p', site)
+    return [name and name.get_text() for name in names], view.title_offset(selectors), price
+
+def test_stream_matches_html_parser(monkeypatch):
+    for site, page in [(site, page) for site, page, _ in CASES] + TEMPLATE_PAGES:
+        expected = read(page, site, app.PARSER_FALLBACK, monkeypatch)
+        assert read(page, site, app.STREAM_BACKEND, monkeypatch) == expected, (site, page)
+
+def test_template_text_stays_out_of_the_page(monkeypatch):
+    names, offset, price = read(TEMPLATE_PAGES[1][1], 'amazon', app.STREAM_BACKEND, monkeypatch)
+    assert names[0] == ''
+    assert price == 1499.0
+    names, offset, price = read(TEMPLATE_PAGES[0][1], 'amazon', app.STREAM_BACKEND, monkeypatch)
+    assert names[0] == 'Saved Title Text' and offset is None
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Tests for conditional rechecks: stored ETag/Last-Modified validators and 304 answers"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import app
+
+URL = 'https://www.amazon.in/dp/B0TESTVALI'
+PAGE = '<html><body><span id="priceblock_ourprice">₹12,499.00</span>' + '<p>filler</p>' * 100 + '</body></html>'
+NO_PRICE = '<html><body><p>Currently unavailable.</p>' + '<p>filler</p>' * 100 + '</body></html>'
+
+def record(recorder, url, body, headers):
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body.encode()
+    recorder.save(url, response)
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """Serve recorded pages, keeping the request headers each fetch sent and counting parses"""
+    recorder = app.FetchRecorder(mode='replay', corpus_dir=str(tmp_path))
+    sent = []
+    parses = []
+    replay_page = recorder.replay
+    def replay_and_keep_headers(url, request_headers):
+        sent.append(dict(request_headers))
+        return replay_page(url, request_headers)
+    monkeypatch.setattr(recorder, 'replay', replay_and_keep_headers)
+    extract_price = app.extract_price
+    def counted_extract_price(*args):
+        parses.append(args[1])
+        return extract_price(*args)
+    monkeypatch.setattr(app, 'extract_price', counted_extract_price)
+    for name, component in [('fetch_recorder', recorder), ('validator_cache', app.ValidatorCache()),
+                            ('extraction_memo', app.ExtractionMemo()), ('parse_pool', app.ParsePool(processes=0)),
+                            ('rate_limiter', app.SiteRateLimiter(burst=100)), ('circuit_breaker', app.SiteCircuitBreaker()),
+                            ('session_pool', app.SiteSessionPool())]:
+        monkeypatch.setattr(app, name, component)
+    return SimpleNamespace(recorder=recorder, sent=sent, parses=parses)
+
+def check(url=URL):
+    return asyncio.run(app.fetch_and_extract_price(url))
+
+def test_304_reuses_the_stored_result_without_parsing(replay):
+    record(replay.recorder, URL, PAGE, {'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2026 07:28:00 GMT'})
+
+    first = check()
+    second = check()
+
+    assert first[0] == 12499.0 and second == first
+    assert 'If-None-Match' not in replay.sent[0]
+    assert replay.sent[1]['If-None-Match'] == '"v1"'
+    assert replay.sent[1]['If-Modified-Since'] == 'Wed, 21 Oct 2026 07:28:00 GMT'
+    assert replay.parses == [URL]
+    assert app.validator_cache.stats() == {'entries': 1, 'not_modified': 1, 'full_fetches': 1}
+
+def test_changed_etag_means_a_full_fetch(replay):
+    record(replay.recorder, URL, PAGE, {'ETag': '"v1"'})
+    check()
+    record(replay.recorder, URL, PAGE.replace('12,499', '11,999'), {'ETag': '"v2"'})
+
+    assert check()[0] == 11999.0
+    assert replay.sent[1]['If-None-Match'] == '"v1"'
+    assert app.validator_cache.get(URL)['headers'] == {'If-None-Match': '"v2"'}
+    assert app.validator_cache.stats()['not_modified'] == 0
+
+def test_validators_are_only_kept_for_successful_extractions(replay):
+    record(replay.recorder, URL, NO_PRICE, {'ETag': '"v1"'})
+
+    assert check()[0] is None
+    assert check()[0] is None
+    assert app.validator_cache.get(URL) is None
+    assert all('If-None-Match' not in headers for headers in replay.sent)
+
+def test_pages_without_validators_are_not_stored(replay):
+    record(replay.recorder, URL, PAGE, {})
+
+    check()
+    check()
+    assert app.validator_cache.get(URL) is None
+    assert all('If-None-Match' not in headers and 'If-Modified-Since' not in headers for headers in replay.sent)
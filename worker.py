@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+"""Run queued scrape jobs; start as many of these processes as the box can take"""
+
+from app import ScrapeWorker
+
+if __name__ == '__main__':
+    ScrapeWorker().run_forever()